@@ -3,8 +3,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from routes.movie_routes import router as movie_router
 from routes.user_routes import router as user_router
 from routes.health_routes import router as health_router
+from routes.admin_routes import router as admin_router
+from utils.payloads import FastJSONResponse
+from utils.metrics import TimingMiddleware
+from utils.profiler import install_profiler
 
-app = FastAPI(title="TMDb Movie Recommender", version="1.0.0")
+app = FastAPI(title="TMDb Movie Recommender", version="1.0.0", default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,3 +22,8 @@ app.add_middleware(
 app.include_router(movie_router)
 app.include_router(user_router)
 app.include_router(health_router)
+app.include_router(admin_router)
+
+# Instrumentation: request timing (METRICS_ENABLED) and the opt-in profiler (PROFILE_DIR)
+app.add_middleware(TimingMiddleware, routes=app.router.routes)
+install_profiler(app)
@@ -0,0 +1,37 @@
+import os
+import argparse
+import uvicorn
+
+# ----------------------------
+# Multi-worker entry point
+# ----------------------------
+# Builds (or catches up) the catalog snapshot once in this process, then has
+# uvicorn spawn the workers. They are fresh interpreters, not forks: each one
+# imports the app and attaches to the snapshot that is already on disk, mapping
+# its files read-only, so workers start in seconds and share one copy of the
+# catalog through the page cache; each adds a few MB of its own however large
+# the catalog is.
+#
+#   python -m app.serve --workers 4 --port 8000
+#
+# Keep ARTIFACT_DIR on tmpfs (e.g. /dev/shm/tmdb-artifacts) to hold snapshots in
+# RAM instead of the page cache of a disk. To really fork the workers from a
+# process that already holds the catalog, use gunicorn with `--preload` and the
+# uvicorn worker class.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with N workers sharing one catalog snapshot")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    # importing the loader builds/publishes the snapshot for the current CSVs and ingest log
+    from utils.data_loader import current_store
+    print(f"Catalog snapshot {os.path.basename(current_store().path)} ready; starting {args.workers} workers")
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import sys
+import json
+import argparse
+
+# ----------------------------
+# Compare two bench.run reports
+# ----------------------------
+#   python -m bench.compare before.json after.json --threshold 0.15
+# Prints per-endpoint p50/p99/throughput changes and exits 1 if any endpoint's
+# p50 or p99 got slower (or throughput dropped) by more than the threshold.
+
+METRICS = (("p50_ms", 1), ("p99_ms", 1), ("throughput_rps", -1))
+
+
+def compare(before, after, threshold):
+    rows, regressions = [], []
+    for name in sorted(set(before["endpoints"]) & set(after["endpoints"])):
+        old, new = before["endpoints"][name], after["endpoints"][name]
+        row = [name]
+        for metric, direction in METRICS:
+            a, b = old.get(metric), new.get(metric)
+            if not a or b is None:
+                row.append("n/a")
+                continue
+            change = (b - a) / a
+            row.append(f"{a:.2f} -> {b:.2f} ({change:+.0%})")
+            if change * direction > threshold:
+                regressions.append(f"{name} {metric}")
+        rows.append(row)
+    for key in ("cold_s", "warm_s"):
+        a, b = before.get("startup", {}).get(key), after.get("startup", {}).get(key)
+        if a and b:
+            rows.append([f"startup {key}", f"{a:.2f} -> {b:.2f} ({(b - a) / a:+.0%})", "", ""])
+    a, b = before.get("peak_rss_mb"), after.get("peak_rss_mb")
+    if a and b:
+        rows.append(["peak_rss_mb", f"{a:.0f} -> {b:.0f} ({(b - a) / a:+.0%})", "", ""])
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    rows, regressions = compare(before, after, args.threshold)
+    header = ["endpoint", "p50_ms", "p99_ms", "throughput_rps"]
+    widths = [max(len(str(r[i])) for r in rows + [header]) for i in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
+    if regressions:
+        print("\nRegressions over {:.0%}: {}".format(args.threshold, ", ".join(regressions)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
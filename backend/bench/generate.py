@@ -0,0 +1,133 @@
+import os
+import csv
+import json
+import random
+import argparse
+
+# ----------------------------
+# Synthetic TMDb-shaped catalog
+# ----------------------------
+# Writes tmdb_5000_movies.csv / tmdb_5000_credits.csv with the same columns and
+# JSON encodings as the Kaggle TMDb 5000 dump. Cast and crew list lengths follow
+# a long-tailed distribution around the real averages (~23 cast, ~22 crew
+# entries, a few KB of JSON per movie), so parsing and memory costs scale like
+# the real data. Output is deterministic for a given --rows/--seed.
+#
+#   python -m bench.generate --rows 50000 --out /tmp/tmdb-bench/50000
+
+SIZES = {"5k": 5000, "50k": 50000, "500k": 500000}
+
+GENRES = [
+    (28, "Action"), (12, "Adventure"), (16, "Animation"), (35, "Comedy"), (80, "Crime"),
+    (99, "Documentary"), (18, "Drama"), (10751, "Family"), (14, "Fantasy"), (36, "History"),
+    (27, "Horror"), (10402, "Music"), (9648, "Mystery"), (10749, "Romance"),
+    (878, "Science Fiction"), (10770, "TV Movie"), (53, "Thriller"), (10752, "War"), (37, "Western"),
+]
+WORDS = (
+    "love war family friend secret city world life journey death killer police revenge dream "
+    "island king queen ship space alien robot ghost detective heist school night summer future "
+    "past river mountain hero villain escape prison soldier mission brother sister father mother "
+    "wedding monster vampire treasure empire rebel storm fire ocean desert forest train road "
+    "music band dance artist writer doctor lawyer spy agent hunter magic witch dragon kingdom"
+).split()
+JOBS = [
+    ("Directing", "Director"), ("Writing", "Screenplay"), ("Writing", "Writer"), ("Production", "Producer"),
+    ("Production", "Executive Producer"), ("Production", "Casting"), ("Sound", "Original Music Composer"),
+    ("Camera", "Director of Photography"), ("Editing", "Editor"), ("Art", "Production Design"),
+    ("Costume & Make-Up", "Costume Design"), ("Visual Effects", "Visual Effects Supervisor"),
+]
+LANGUAGES = ["en", "en", "en", "en", "fr", "es", "de", "ja", "it", "hi", "ko", "zh"]
+MOVIE_COLUMNS = [
+    "budget", "genres", "homepage", "id", "keywords", "original_language", "original_title", "overview",
+    "popularity", "production_companies", "production_countries", "release_date", "revenue", "runtime",
+    "spoken_languages", "status", "tagline", "title", "vote_average", "vote_count",
+]
+
+
+def _list_length(rng, mean, cap):
+    # long tail: most movies have a modest credit list, blockbusters have hundreds
+    return min(cap, int(rng.expovariate(1 / mean)))
+
+
+def _sentence(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def generate(rows, out_dir, seed=0, cast_mean=23, crew_mean=22):
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    n_people = max(1000, rows * 4)
+    n_keywords = max(500, rows // 4)
+    keyword_names = [f"{rng.choice(WORDS)} {rng.choice(WORDS)}" for _ in range(n_keywords)]
+
+    movies_path = os.path.join(out_dir, "tmdb_5000_movies.csv")
+    credits_path = os.path.join(out_dir, "tmdb_5000_credits.csv")
+    with open(movies_path, "w", newline="") as mf, open(credits_path, "w", newline="") as cf:
+        movies, credits = csv.writer(mf), csv.writer(cf)
+        movies.writerow(MOVIE_COLUMNS)
+        credits.writerow(["movie_id", "title", "cast", "crew"])
+        for i in range(rows):
+            movie_id = 5 + i * 7 + rng.randrange(7)
+            title = f"{_sentence(rng, rng.randint(1, 4)).title()} {i}"
+            genres = [{"id": g, "name": n} for g, n in rng.sample(GENRES, rng.randint(1, 4))]
+            keywords = [
+                {"id": k, "name": keyword_names[k]}
+                for k in rng.sample(range(n_keywords), min(n_keywords, _list_length(rng, 8, 60)))
+            ]
+            year = rng.randint(1916, 2017)
+            release = "" if rng.random() < 0.01 else f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            overview = "" if rng.random() < 0.01 else _sentence(rng, rng.randint(20, 80)).capitalize() + "."
+            vote_count = int(rng.expovariate(1 / 700))
+            movies.writerow([
+                rng.choice([0, 0, rng.randint(10_000, 300_000_000)]),
+                json.dumps(genres),
+                f"http://www.example.com/{movie_id}" if rng.random() < 0.35 else "",
+                movie_id,
+                json.dumps(keywords),
+                rng.choice(LANGUAGES),
+                title,
+                overview,
+                round(rng.expovariate(1 / 21), 6),
+                json.dumps([{"name": f"Studio {rng.randrange(5000)}", "id": rng.randrange(100000)}
+                            for _ in range(rng.randint(0, 4))]),
+                json.dumps([{"iso_3166_1": "US", "name": "United States of America"}]),
+                release,
+                rng.choice([0, rng.randint(10_000, 2_000_000_000)]),
+                rng.randint(70, 200),
+                json.dumps([{"iso_639_1": "en", "name": "English"}]),
+                "Released",
+                _sentence(rng, rng.randint(3, 9)).capitalize() if rng.random() < 0.8 else "",
+                title,
+                round(min(10.0, max(0.0, rng.gauss(6.1, 1.2))), 1) if vote_count else 0.0,
+                vote_count,
+            ])
+            cast = [{
+                "cast_id": j, "character": _sentence(rng, 2).title(), "credit_id": f"{rng.getrandbits(96):024x}",
+                "gender": rng.randint(0, 2), "id": rng.randrange(n_people),
+                "name": f"Actor {rng.randrange(n_people)}", "order": j,
+            } for j in range(_list_length(rng, cast_mean, 220))]
+            crew = []
+            for _ in range(_list_length(rng, crew_mean, 430)):
+                department, job = rng.choice(JOBS)
+                crew.append({
+                    "credit_id": f"{rng.getrandbits(96):024x}", "department": department,
+                    "gender": rng.randint(0, 2), "id": rng.randrange(n_people), "job": job,
+                    "name": f"Crew {rng.randrange(n_people)}",
+                })
+            credits.writerow([movie_id, title, json.dumps(cast), json.dumps(crew)])
+    return movies_path, credits_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic TMDb-shaped catalog")
+    parser.add_argument("--rows", default="5k", help="row count, or one of " + ", ".join(SIZES))
+    parser.add_argument("--out", required=True, help="output directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rows = SIZES.get(args.rows) or int(args.rows)
+    for path in generate(rows, args.out, args.seed):
+        print(f"{path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from bench.generate import SIZES, generate
+from bench.stubs import start_openai, start_tmdb
+
+# ----------------------------
+# Endpoint benchmark
+# ----------------------------
+# Generates (or reuses) a synthetic catalog, starts the TMDb/OpenAI stubs,
+# launches uvicorn against them, and measures for every route:
+# latency percentiles, throughput and error count. Also records cold start
+# (artifacts built from the CSVs), warm start (cached artifacts) and the peak
+# RSS of the server. Results are written as JSON; compare two runs with
+# python -m bench.compare.
+#
+#   python -m bench.run --rows 5k --requests 200 --concurrency 8 --out bench-5k.json
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_WORK_DIR = os.path.join(tempfile.gettempdir(), "tmdb-bench")
+
+
+def scenarios(ids, titles, users):
+    """name -> (method, path template, request factory). Factories get a Random."""
+    words = [w for t in titles[:2000] for w in t.lower().split() if w.isalpha()] or ["love"]
+    genres = ["Action", "Drama", "Comedy", "Thriller", "Science Fiction"]
+
+    def movie(r):
+        return int(r.choice(ids))
+
+    return {
+        "health": ("GET", "/health", lambda r: {}),
+        "genres": ("GET", "/genres", lambda r: {}),
+        "metrics": ("GET", "/metrics", lambda r: {}),
+        "catalog": ("GET", "/catalog", lambda r: {"params": {"page": r.randint(1, 20), "size": 50}}),
+        "catalog_search": ("GET", "/catalog", lambda r: {"params": {"q": r.choice(words), "size": 50}}),
+        "catalog_semantic": ("GET", "/catalog", lambda r: {"params": {
+            "q": f"{r.choice(words)} {r.choice(words)}", "size": 50, "semantic": "true"}}),
+        "autocomplete": ("GET", "/search/autocomplete", lambda r: {"params": {"q": r.choice(words)[:3]}}),
+        "similar_ai": ("GET", "/recommend/similar/ai", lambda r: {"params": {"movie_id": movie(r), "top_n": 5}}),
+        "similar_batch": ("POST", "/recommend/similar/batch",
+                          lambda r: {"json": {"movie_ids": [movie(r) for _ in range(20)], "top_n": 10}}),
+        "similar_batch_stream": ("POST", "/recommend/similar/batch", lambda r: {"json": {
+            "movie_ids": [movie(r) for _ in range(500)], "top_n": 10, "stream": True}}),
+        "popular": ("GET", "/recommend/popular", lambda r: {"params": {"top_n": 10, "genre": r.choice(genres)}}),
+        "popular_ai": ("GET", "/recommend/popular",
+                       lambda r: {"params": {"top_n": 5, "genre": r.choice(genres), "ai": "true"}}),
+        "by_form_v2": ("POST", "/recommend/by_form_v2", lambda r: {"json": {
+            "min_rating": r.choice([0, 5, 6, 7]), "genre": r.choice(genres + [""]),
+            "year_from": r.randint(1950, 2000), "year_to": r.randint(2000, 2017),
+        }}),
+        "recommend": ("GET", "/recommend", lambda r: {"params": {"top_n": 10}}),
+        "movie": ("GET", "/movie/{movie_id}", lambda r: {"url": f"/movie/{movie(r)}"}),
+        "chat": ("GET", "/recommend/chat", lambda r: {"params": {"query": f"{r.choice(words)} {r.choice(words)}"}}),
+        "chat_semantic": ("GET", "/recommend/chat", lambda r: {"params": {
+            "query": f"{r.choice(words)} {r.choice(words)}", "semantic": "true"}}),
+        "chat_stream": ("GET", "/recommend/chat", lambda r: {"params": {
+            "query": f"{r.choice(words)} {r.choice(words)}", "stream": "true"}}),
+        "like": ("POST", "/user/{user_id}/like", lambda r: {"url": f"/user/{r.choice(users)}/like",
+                                                            "json": {"movie_id": movie(r)}}),
+        "dislike": ("POST", "/user/{user_id}/dislike", lambda r: {"url": f"/user/{r.choice(users)}/dislike",
+                                                                  "json": {"movie_id": movie(r)}}),
+        "watch": ("POST", "/user/{user_id}/watch", lambda r: {"url": f"/user/{r.choice(users)}/watch",
+                                                              "json": {"movie_id": movie(r)}}),
+        "watchlist": ("POST", "/user/{user_id}/watchlist", lambda r: {"url": f"/user/{r.choice(users)}/watchlist",
+                                                                      "json": {"movie_id": movie(r)}}),
+        "rate": ("POST", "/user/{user_id}/rate", lambda r: {"url": f"/user/{r.choice(users)}/rate",
+                                                            "json": {"movie_id": movie(r), "rating": r.randint(1, 5)}}),
+        "recommend_user": ("GET", "/recommend/user/{user_id}",
+                           lambda r: {"url": f"/recommend/user/{r.choice(users)}", "params": {"top_n": 10}}),
+        "user_profile": ("GET", "/user/profile", lambda r: {"params": {"user_id": r.choice(users)}}),
+        "movies_by_ids": ("GET", "/movies/by_ids",
+                          lambda r: {"params": {"ids": ",".join(str(movie(r)) for _ in range(10))}}),
+    }
+
+
+# ----------------------------
+# Server process
+# ----------------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mb(pid):
+    """VmHWM of pid and its children (uvicorn workers), Linux only."""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    total = 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+    return round(total / 1024, 1)
+
+
+class Server:
+    def __init__(self, env, workers=1):
+        self.port = free_port()
+        self.env = env
+        self.workers = workers
+        self.proc = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout=3600):
+        """Launch uvicorn and return seconds until /health answers."""
+        start = time.perf_counter()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(self.port),
+             "--workers", str(self.workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=self.env,
+        )
+        while time.perf_counter() - start < timeout:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {self.proc.returncode}")
+            try:
+                if httpx.get(f"{self.url}/health", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.05)
+        raise TimeoutError("server did not become healthy")
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(30)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+# ----------------------------
+# Load generation
+# ----------------------------
+def percentiles(latencies):
+    ms = np.asarray(latencies) * 1000
+    if not len(ms):
+        return {}
+    p50, p90, p95, p99 = np.percentile(ms, [50, 90, 95, 99])
+    return {"p50_ms": round(p50, 3), "p90_ms": round(p90, 3), "p95_ms": round(p95, 3),
+            "p99_ms": round(p99, 3), "max_ms": round(ms.max(), 3), "mean_ms": round(ms.mean(), 3)}
+
+
+def run_scenario(client, method, path, factory, requests, concurrency, seed):
+    rng = random.Random(seed)
+    calls = [factory(rng) for _ in range(requests)]
+
+    def one(call):
+        call = dict(call)
+        url = call.pop("url", path)
+        start = time.perf_counter()
+        try:
+            ok = client.request(method, url, **call).status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, calls))
+    wall = time.perf_counter() - start
+    latencies = [t for t, _ in results]
+    return {
+        "method": method, "path": path, "requests": requests, "concurrency": concurrency,
+        "errors": sum(1 for _, ok in results if not ok),
+        "throughput_rps": round(requests / wall, 2) if wall else None,
+        **percentiles(latencies),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every API route against stubbed services")
+    parser.add_argument("--rows", default="5k", help="catalog size: row count or one of " + ", ".join(SIZES))
+    parser.add_argument("--data-dir", help="use existing CSVs instead of generating")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--tmdb-latency", type=float, default=0.05)
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--only", help="comma-separated scenario names")
+    parser.add_argument("--skip-cold", action="store_true", help="do not measure a cold (artifact build) start")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="-", help="JSON output file, - for stdout")
+    args = parser.parse_args()
+
+    rows = SIZES.get(args.rows) or int(args.rows)
+    data_dir = args.data_dir or os.path.join(args.work_dir, f"data-{rows}")
+    if not args.data_dir and not os.path.exists(os.path.join(data_dir, "tmdb_5000_credits.csv")):
+        print(f"Generating {rows} movies into {data_dir}", file=sys.stderr)
+        generate(rows, data_dir, args.seed)
+
+    run_dir = tempfile.mkdtemp(prefix="run-", dir=args.work_dir)
+    tmdb = start_tmdb(latency=args.tmdb_latency)
+    openai = start_openai(latency=args.openai_latency)
+    env = {
+        **os.environ,
+        "MOVIES_DATA_DIR": data_dir,
+        "ARTIFACT_DIR": os.path.join(run_dir, "artifacts"),
+        "CACHE_DIR": os.path.join(run_dir, "cache"),
+        "USER_DB_PATH": os.path.join(run_dir, "users.sqlite"),
+        "TMDB_API_BASE": tmdb.url,
+        "TMDB_API_KEY": "bench",
+        "OPENAI_API_TYPE": "open_ai",
+        "OPENAI_API_BASE": f"{openai.url}/v1",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_DEPLOYMENT_NAME": "bench",
+        "OPENAI_API_EMBEDDING": "bench-embedding",
+    }
+    if args.skip_cold:
+        env["ARTIFACT_DIR"] = os.path.join(args.work_dir, f"artifacts-{rows}")
+
+    frame = pd.read_csv(os.path.join(data_dir, "tmdb_5000_movies.csv"), usecols=["id", "title"])
+    ids, titles = frame["id"].tolist(), frame["title"].fillna("").tolist()
+    users = [f"bench-user-{i}" for i in range(50)]
+    selected = scenarios(ids, titles, users)
+    if args.only:
+        selected = {k: v for k, v in selected.items() if k in args.only.split(",")}
+
+    report = {
+        "meta": {
+            "commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "rows": len(ids),
+            "python": platform.python_version(), "cpus": os.cpu_count(), "workers": args.workers,
+            "requests": args.requests, "concurrency": args.concurrency,
+            "tmdb_latency": args.tmdb_latency, "openai_latency": args.openai_latency,
+        },
+        "startup": {},
+        "endpoints": {},
+    }
+
+    server = Server(env, args.workers)
+    try:
+        if not args.skip_cold:
+            report["startup"]["cold_s"] = round(server.start(), 3)
+            server.stop()
+            server = Server(env, args.workers)
+        report["startup"]["warm_s"] = round(server.start(), 3)
+        if any("semantic" in name for name in selected):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-m", "utils.embeddings"], cwd=BACKEND_DIR, env=env, check=True)
+            report["startup"]["embed_s"] = round(time.perf_counter() - start, 3)
+
+        with httpx.Client(base_url=server.url, timeout=60,
+                          limits=httpx.Limits(max_connections=args.concurrency)) as client:
+            # seed some history so the per-user endpoints have work to do
+            rng = random.Random(args.seed)
+            for user in users:
+                for _ in range(10):
+                    client.post(f"/user/{user}/watch", json={"movie_id": int(rng.choice(ids))})
+            for i, (name, (method, path, factory)) in enumerate(selected.items()):
+                print(f"{name} ...", file=sys.stderr)
+                report["endpoints"][name] = run_scenario(
+                    client, method, path, factory, args.requests, args.concurrency, args.seed + i
+                )
+        report["peak_rss_mb"] = peak_rss_mb(server.proc.pid)
+        covered = {(m, p) for m, p, _ in selected.values()}
+        spec = httpx.get(f"{server.url}/openapi.json").json()
+        report["uncovered_routes"] = sorted(
+            f"{m.upper()} {p}" for p, ops in spec["paths"].items() for m in ops if (m.upper(), p) not in covered
+        )
+    finally:
+        server.stop()
+        tmdb.shutdown()
+        openai.shutdown()
+
+    text = json.dumps(report, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        print(f"Wrote {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
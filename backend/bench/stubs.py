@@ -0,0 +1,194 @@
+import re
+import json
+import math
+import base64
+import hashlib
+import time
+import random
+import argparse
+import threading
+from array import array
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ----------------------------
+# Local stand-ins for TMDb and OpenAI
+# ----------------------------
+# StubTMDb answers GET .../movie/{id} like TMDb (a poster for most ids, no poster
+# or 404 for some). StubOpenAI answers any POST ending in /chat/completions with
+# a ChatCompletion body: a JSON array for batched explanation prompts, a
+# {"refined_query", "results"} object for the chat prompt, plain text otherwise.
+# Both sleep latency +- jitter seconds per request; with "stream": true the
+# reply is sent as chunk events spread over a further `latency` seconds.
+# POSTs ending in /embeddings get deterministic hashed bag-of-words vectors.
+# Each server counts its requests, in total and per path.
+#
+#   python -m bench.stubs --tmdb-port 8765 --openai-port 8766 --tmdb-latency 0.05
+
+
+EMBEDDING_DIM = 64
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "bench-stub"
+
+    def log_message(self, *args):
+        pass
+
+    def _sleep(self):
+        server = self.server
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        server.calls += 1
+        server.paths[self.path.split("?")[0]] += 1
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _TMDbHandler(_Handler):
+    def do_GET(self):
+        self._sleep()
+        match = re.search(r"/movie/(\d+)", self.path)
+        if not match:
+            return self._send_json(404, {"status_message": "not found"})
+        movie_id = int(match.group(1))
+        if movie_id % 17 == 0:
+            return self._send_json(404, {"status_message": "The resource you requested could not be found."})
+        poster = None if movie_id % 11 == 0 else f"/bench{movie_id}.jpg"
+        self._send_json(200, {"id": movie_id, "poster_path": poster})
+
+
+class _OpenAIHandler(_Handler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self._sleep()
+        if self.path.rstrip("/").endswith("/embeddings"):
+            return self._embeddings(request)
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        if request.get("stream"):
+            return self._stream(request, self.reply(prompt))
+        self._send_json(200, {
+            "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model", "bench"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply(prompt)},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 40, "total_tokens": len(prompt) // 4 + 40},
+        })
+
+    def _embeddings(self, request):
+        texts = request.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        data = []
+        for i, text in enumerate(texts):
+            vector = self.embedding(text)
+            if request.get("encoding_format") == "base64":
+                vector = base64.b64encode(array("f", vector).tobytes()).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(len(t) // 4 for t in texts)
+        self._send_json(200, {"object": "list", "data": data, "model": request.get("model", "bench"),
+                              "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    @staticmethod
+    def embedding(text, dim=EMBEDDING_DIM):
+        """Deterministic bag-of-hashed-words vector: texts sharing words get similar vectors."""
+        vector = [0.0] * dim
+        for word in re.findall(r"[a-z0-9]+", text.lower()) or [text]:
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vector[h % dim] += 1.0 if h >> 63 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def _stream(self, request, content, pieces=20):
+        """The reply as chat.completion.chunk server-sent events, spread over another latency."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        size = max(1, -(-len(content) // pieces))
+        delay = self.server.latency / pieces
+        chunk = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()),
+                 "model": request.get("model", "bench")}
+        for i in range(0, len(content), size):
+            time.sleep(delay)
+            delta = {"role": "assistant", "content": content[i:i + size]} if i == 0 else {"content": content[i:i + size]}
+            body = {**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(body)}\n\n".encode())
+            self.wfile.flush()
+        body = {**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(body)}\n\ndata: [DONE]\n\n".encode())
+        self.wfile.flush()
+        self.close_connection = True
+
+    @staticmethod
+    def reply(prompt):
+        batch = re.search(r"JSON array of (\d+) strings", prompt)
+        if batch:
+            return json.dumps([f"Stub explanation {i + 1}." for i in range(int(batch.group(1)))])
+        if '"refined_query"' in prompt:
+            query = re.search(r'User query: "(.*)"', prompt)
+            movies = re.findall(r"^- (.*?) \((\d+)\) \|", prompt, re.MULTILINE)
+            results = [{"title": t, "year": int(y), "vote_average": 7.0, "overview": "",
+                        "explanation": "Stub match."} for t, y in movies[:5]]
+            return json.dumps({"refined_query": query.group(1) if query else "", "results": results})
+        return "Stub explanation: " + " ".join(prompt.split()[:12])
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, port, latency=0.0, jitter=0.0, host="127.0.0.1"):
+        super().__init__((host, port), handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self.paths = Counter()      # request path (no query string) -> calls
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name=f"stub-{self.server_address[1]}", daemon=True).start()
+        return self
+
+
+def start_tmdb(port=0, latency=0.05, jitter=0.0):
+    return StubServer(_TMDbHandler, port, latency, jitter).start()
+
+
+def start_openai(port=0, latency=0.5, jitter=0.0):
+    return StubServer(_OpenAIHandler, port, latency, jitter).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run stub TMDb and OpenAI servers")
+    parser.add_argument("--tmdb-port", type=int, default=8765)
+    parser.add_argument("--openai-port", type=int, default=8766)
+    parser.add_argument("--tmdb-latency", type=float, default=0.05)
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+    tmdb = start_tmdb(args.tmdb_port, args.tmdb_latency, args.jitter)
+    openai = start_openai(args.openai_port, args.openai_latency, args.jitter)
+    print(f"TMDB_API_BASE={tmdb.url}")
+    print(f"OPENAI_API_BASE={openai.url}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
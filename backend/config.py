@@ -1,15 +1,17 @@
+import os
 import openai
 
 # ----------------------------
 # OpenAI / Azure Setup
 # ----------------------------
-OPENAI_API_TYPE = ""
-OPENAI_API_BASE = ""
-OPENAI_API_VERSION = ""
-OPENAI_DEPLOYMENT_NAME = ""
-AZURE_DEPLOYMENT_NAME = ""
-OPENAI_API_KEY = ""
-OPENAI_API_EMBEDDING = ""
+# Fill these in, or set the environment variables of the same name
+OPENAI_API_TYPE = os.getenv("OPENAI_API_TYPE", "")
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "")
+OPENAI_API_VERSION = os.getenv("OPENAI_API_VERSION", "")
+OPENAI_DEPLOYMENT_NAME = os.getenv("OPENAI_DEPLOYMENT_NAME", "")
+AZURE_DEPLOYMENT_NAME = os.getenv("AZURE_DEPLOYMENT_NAME", "")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_API_EMBEDDING = os.getenv("OPENAI_API_EMBEDDING", "")
 
 openai.api_type = OPENAI_API_TYPE
 openai.api_base = OPENAI_API_BASE
@@ -1,13 +1,22 @@
+from typing import List, Literal
 from pydantic import BaseModel
 
 class FormRequest(BaseModel):
     min_rating: float = 0
-    genre: str = ""
+    genre: str = ""          # one genre or a comma-separated list
+    genre_match: Literal["any", "all"] = "any"
     year_from: int = 1900
     year_to: int = 2100
     budget_min: float = 0
     budget_max: float = 1e12
 
+class SimilarBatchRequest(BaseModel):
+    movie_ids: List[int]
+    top_n: int = 10
+    explain: bool = False    # LLM explanations, one call per pair: keep off for large batches
+    posters: bool = True
+    stream: bool = False     # newline-delimited JSON, one line per seed movie
+
 class MovieAction(BaseModel):
     movie_id: int
     action: str   # "like", "dislike", "watchlist"
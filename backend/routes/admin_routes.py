@@ -0,0 +1,45 @@
+from typing import Any, Dict, List
+from fastapi import APIRouter, Header, HTTPException
+from utils.data_loader import get_catalog
+from utils.embeddings import semantic_index
+from utils.ingest import INGEST_TOKEN, ingest, needs_refit, schedule_refit
+
+router = APIRouter(prefix="/admin")
+
+def check_token(token):
+    # disabled unless INGEST_TOKEN is set
+    if not INGEST_TOKEN or token != INGEST_TOKEN:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+def catalog_status(cat):
+    return {
+        "snapshot": cat.store.path.rsplit("/", 1)[-1],
+        "movies": cat.n_rows,
+        **cat.meta,
+        "needs_refit": needs_refit(cat.meta),
+    }
+
+# ------------------------------
+# Catalog ingestion
+# ------------------------------
+@router.post("/movies")
+def add_movies(movies: List[Dict[str, Any]], x_admin_token: str = Header(None)):
+    """Add or update movies (merged CSV layout; list fields may be JSON arrays)."""
+    check_token(x_admin_token)
+    try:
+        cat = ingest(movies)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if semantic_index.available():
+        semantic_index.schedule_top_up()
+    return catalog_status(cat)
+
+@router.post("/refit")
+def refit_catalog(x_admin_token: str = Header(None)):
+    check_token(x_admin_token)
+    return {"scheduled": schedule_refit()}
+
+@router.get("/catalog")
+def catalog_info(x_admin_token: str = Header(None)):
+    check_token(x_admin_token)
+    return catalog_status(get_catalog())
@@ -1,21 +1,18 @@
 from fastapi import APIRouter
-from utils.helpers import sanitize_for_json
-from utils.data_loader import movies_df, cosine_sim  
-from ast import literal_eval
+from fastapi.responses import PlainTextResponse
+from utils.data_loader import get_catalog
+from utils.metrics import registry
 
 router = APIRouter()
 
 @router.get("/health")
 def health():
-    return {"status":"ok", "movies": int(movies_df.shape[0])}
+    return {"status":"ok", "movies": get_catalog().n_rows}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @router.get("/genres")
 def get_genres():
-    genres_set = set()
-    for g_list in movies_df['genres']:
-        try:
-            for g in literal_eval(g_list):
-                genres_set.add(g['name'])
-        except:
-            continue
-    return sorted(list(genres_set))
+    return get_catalog().genre_index.vocabulary
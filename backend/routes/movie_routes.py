@@ -1,13 +1,19 @@
 from fastapi import APIRouter, Query
-from models.schemas import FormRequest
-from utils.helpers import sanitize_for_json
-from utils.ai_helpers import explain_popularity, explain_similarity
-from utils.data_loader import movies_df, cosine_sim  
-import openai
+from fastapi.responses import Response, StreamingResponse
+from models.schemas import FormRequest, SimilarBatchRequest
+from utils.explanations import explanation_service
+from utils.data_loader import get_catalog
+from utils.inverted_index import split_terms
 import json
 import numpy as np
 from pydantic import BaseModel
-from utils.tmdb import get_poster_url,enrich_with_poster_urls
+from utils.tmdb import get_poster_url, poster_resolver, poster_urls
+from utils.user_store import user_store
+from utils.user_recommendations import user_recommendations
+from utils.recommender import similar_for_movies
+from utils.embeddings import semantic_index
+from utils.chat import CHAT_CANDIDATES, ResultParser, acomplete_chat, astream_chat, build_context, chat_prompt
+from utils.metrics import stage
 
 
 router = APIRouter()
@@ -16,131 +22,150 @@ router = APIRouter()
 # Helper functions
 # ------------------------------
 
-def get_movie_index(movie_id: int):
-    match = movies_df.index[movies_df['id'] == movie_id]
-    return int(match[0]) if len(match) > 0 else None
-
-def sort_and_sanitize(df, columns, top_n=None):
-    if top_n:
-        df = df.head(top_n)
-    return sanitize_for_json(df[columns]).to_dict(orient='records')
+def movies_response(cat, projection, positions, **extras):
+    """Pre-serialized rows of `projection` plus per-row extras, with poster URLs appended."""
+    extras["poster_url"] = poster_urls(cat.payloads.ids[positions])
+    return cat.payloads.response(projection, positions, extras)
 
 def get_user_history(user_id: str):
-    if user_id not in user_history:
-        user_history[user_id] = {
-            "watched": set(),
-            "ratings": {},
-            "likes": set(),
-            "dislikes": set(),
-            "watchlist": set()
-        }
-    return user_history[user_id]
+    return user_store.get(user_id)
+
+def record_action(user_id: str, action: str, movie_id: int, rating: float = None):
+    user_store.record(user_id, action, movie_id, rating)
+    get_catalog().user_profiles.update(user_id, user_store.get(user_id))
+    user_recommendations.invalidate(user_id, action)
 
 # ------------------------------
 # Catalog
 # ------------------------------
 @router.get("/catalog")
-def catalog(page: int = 1, size: int = 50, q: str = None):
-    df = movies_df.copy()
-    if q:
-        df = df[df['title'].str.lower().str.contains(q.lower())]
+def catalog(page: int = 1, size: int = 50, q: str = None, semantic: bool = False):
+    cat = get_catalog()
     start, end = (page - 1) * size, page * size
-    result = sanitize_for_json(df.iloc[start:end]).to_dict(orient='records')
-    return enrich_with_poster_urls(result)
+    if q:
+        # embedding search when asked for and available, else BM25
+        positions = semantic_index.search(cat, q, end) if semantic else None
+        if positions is None:
+            with stage("candidate_filtering"):
+                positions = cat.search_index.search(q, top_n=end)
+        positions = positions[start:end]
+    else:
+        positions = np.arange(cat.n_rows)[start:end]
+    return movies_response(cat, "full", positions)
+
+@router.get("/search/autocomplete")
+def autocomplete(q: str, limit: int = 10):
+    cat = get_catalog()
+    with stage("candidate_filtering"):
+        positions = cat.search_index.autocomplete(q, top_n=limit)
+    return cat.payloads.response("suggest", positions)
 
 # ------------------------------
 # Similar Movies with AI
 # ------------------------------
 @router.get("/recommend/similar/ai")
 def recommend_similar_ai(movie_id: int, top_n: int = 5):
-    idx = get_movie_index(movie_id)
+    cat = get_catalog()
+    idx = cat.movie_index.position(movie_id)
     if idx is None:
         return []
-    sims = sorted(enumerate(cosine_sim[idx]), key=lambda x: x[1], reverse=True)[1:top_n+1]
-    indices = [i for i, _ in sims]
-    out = movies_df.iloc[indices][
-        ["id","title","genres","vote_average","overview","year","cast_clean","crew_clean"]
-    ].copy()
-    out["score"] = [float(s) for _, s in sims]
-    movie_a = movies_df.iloc[idx]
-    out["similarity_explanation"] = out.apply(lambda row: explain_similarity(movie_a, row), axis=1)
-    result = sanitize_for_json(out).to_dict(orient='records')
-    return enrich_with_poster_urls(result)
+    indices, scores = cat.retriever.similar(idx, top_n)
+    movie_a = cat.payloads.records("similar", [idx])[0]
+    explanations = explanation_service.explain_similar(movie_a, cat.payloads.records("similar", indices))
+    return movies_response(cat, "similar", indices, score=scores, similarity_explanation=explanations)
+
+# ------------------------------
+# Similar Movies for many seeds (carousels, offline jobs)
+# ------------------------------
+STREAM_CHUNK_SEEDS = 256
+
+def similar_batch_rows(cat, seeds, request, chunk_seeds=None):
+    """Yield (movie_id, JSON array of cards) per seed; posters are resolved once per chunk of seeds."""
+    chunk_seeds = chunk_seeds or max(len(seeds), 1)
+    for start in range(0, len(seeds), chunk_seeds):
+        chunk = seeds[start:start + chunk_seeds]
+        urls = {}
+        if request.posters and chunk:
+            unique_ids = np.unique(cat.payloads.ids[np.concatenate([positions for _, _, positions, _ in chunk])])
+            urls = dict(zip(unique_ids.tolist(), poster_urls(unique_ids)))
+        for movie_id, idx, positions, scores in chunk:
+            extras = {"score": scores}
+            if request.posters:
+                extras["poster_url"] = [urls[i] for i in cat.payloads.ids[positions].tolist()]
+            if request.explain:
+                movie_a = cat.payloads.records("similar", [idx])[0]
+                extras["similarity_explanation"] = explanation_service.explain_similar(
+                    movie_a, cat.payloads.records("similar", positions))
+            with stage("serialization"):
+                body = cat.payloads.render("card", positions, extras)
+            yield movie_id, body
+
+@router.post("/recommend/similar/batch")
+def recommend_similar_batch(request: SimilarBatchRequest):
+    """Top-N similar movies for every id in one call; unknown ids are reported, not fatal."""
+    cat = get_catalog()
+    seeds, missing = similar_for_movies(request.movie_ids, cat.retriever, cat.movie_index, request.top_n)
+
+    if request.stream:
+        def lines():
+            for movie_id in missing:
+                yield b'{"movie_id":%d,"error":"Movie not found"}\n' % movie_id
+            for movie_id, body in similar_batch_rows(cat, seeds, request, STREAM_CHUNK_SEEDS):
+                yield b'{"movie_id":%d,"similar":%s}\n' % (movie_id, body)
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    results = [b'{"movie_id":%d,"similar":%s}' % (movie_id, body)
+               for movie_id, body in similar_batch_rows(cat, seeds, request)]
+    body = b'{"results":[%s],"missing":%s}' % (b",".join(results), json.dumps(missing).encode())
+    return Response(body, media_type="application/json")
 
 # ------------------------------
 # Popular Movies
 # ------------------------------
 @router.get("/recommend/popular")
-def recommend_popular(top_n: int = 10, genre: str = None, ai: bool = Query(False)):
-    df = movies_df.copy()
-    if genre:
-        df = df[df['genres'].str.contains(genre, case=False, na=False)]
-    df['popularity_score'] = df['vote_average'] * np.log1p(df['vote_count'])
-    df = df.sort_values('popularity_score', ascending=False).head(top_n)
-    result = sanitize_for_json(df[
-        ["id","title","genres","vote_average","overview","year","popularity_score"]
-    ]).to_dict(orient='records')
-
+def recommend_popular(top_n: int = 10, genre: str = None, ai: bool = Query(False),
+                      match: str = Query("any", pattern="^(any|all)$")):
+    # genre may list several comma-separated genres, combined with match=any|all
+    cat = get_catalog()
+    popularity = cat.popularity
+    genres = split_terms(genre)
+    if len(genres) > 1:
+        positions = popularity.top_all(genres, top_n) if match == "all" else popularity.top_any(genres, top_n)
+    else:
+        positions = popularity.top(top_n, genres[0] if genres else None)
+    extras = {"popularity_score": popularity.scores[positions]}
     if ai:
-        for movie in result:
-            movie['ai_explanation'] = explain_popularity(movie)
-    return enrich_with_poster_urls(result)
+        extras["ai_explanation"] = explanation_service.explain_popular(cat.payloads.records("card", positions))
+    return movies_response(cat, "card", positions, **extras)
 
 # ------------------------------
 # Form-based Recommendation (Hybrid)
 # ------------------------------
 @router.post("/recommend/by_form_v2")
 def recommend_by_form_v2(form: FormRequest):
-    df = movies_df[
-        (movies_df['vote_average'] >= form.min_rating) &
-        (movies_df['year'] >= form.year_from) & (movies_df['year'] <= form.year_to) &
-        (movies_df['budget'] >= form.budget_min) & (movies_df['budget'] <= form.budget_max)
-    ].copy()
-
-    if form.genre:
-        df = df[df['genres'].str.contains(form.genre, case=False, na=False)]
-
-    df['popularity_score'] = df['vote_average'] * np.log1p(df['vote_count'])
-
-    if not df.empty:
-        top_idx = df['vote_average'].idxmax()
-        sim_scores = cosine_sim[top_idx]
-        hybrid_score = 0.6 * sim_scores[df.index] + 0.4 * (df['popularity_score'] / df['popularity_score'].max())
-        df['hybrid_score'] = hybrid_score
-        df = df.sort_values('hybrid_score', ascending=False).head(20)
-    else:
-        df = df.head(0)
-
-    result = sanitize_for_json(
-        df[["id","title","genres","vote_average","overview","year","popularity_score"]]
-    ).to_dict(orient='records')
-
-    return enrich_with_poster_urls(result)
+    cat = get_catalog()
+    positions, popularity_scores = cat.form_filter.recommend(form, top_n=20)
+    return movies_response(cat, "card", positions, popularity_score=popularity_scores)
 
 # ------------------------------
 # Default Recommendation
 # ------------------------------
 @router.get("/recommend")
 def recommend_default(top_n: int = 10):
-    df = movies_df.copy()
-    df['popularity_score'] = df['vote_average'] * np.log1p(df['vote_count'])
-    df = df.sort_values('popularity_score', ascending=False).head(top_n)
-    return sanitize_for_json(
-        df[["id","title","genres","vote_average","overview","year","popularity_score"]]
-    ).to_dict(orient='records')
+    cat = get_catalog()
+    positions = cat.popularity.top(top_n)
+    return cat.payloads.response("card", positions, {"popularity_score": cat.popularity.scores[positions]})
 
 # ------------------------------
 # Movie Details
 # ------------------------------
 @router.get("/movie/{movie_id}")
 def get_movie(movie_id: int):
-    movie = movies_df[movies_df['id'] == movie_id]
-    if movie.empty:
+    cat = get_catalog()
+    idx = cat.movie_index.position(movie_id)
+    if idx is None:
         return {"error": "Movie not found"}
-    result = sanitize_for_json(
-        movie[["id","title","genres","vote_average","overview","year","popularity"]]
-    ).to_dict(orient="records")[0]
-
+    result = cat.payloads.records("detail", [idx])[0]
     result["poster_url"] = get_poster_url(movie_id)
     return result
 
@@ -148,55 +173,24 @@ def get_movie(movie_id: int):
 # Conversational Movie Search
 # ------------------------------
 @router.get("/recommend/chat")
-def recommend_chat(query: str, top_n: int = 5):
-    query_lower = query.lower()
-    filtered = movies_df[
-        movies_df["title"].str.lower().str.contains(query_lower, na=False) |
-        movies_df["overview"].str.lower().str.contains(query_lower, na=False) |
-        movies_df["keywords"].str.lower().str.contains(query_lower, na=False)
-    ].head(20)
-
-    movies_context = filtered[["title", "overview", "genres", "year", "vote_average"]].to_dict(orient="records")
-
-    user_prompt = f"""
-You are a movie recommendation assistant.
-
-Task:
-1. Pick the {top_n} most relevant movies from the dataset below based on the user's query.
-2. Include a short explanation why each movie matches the query.
-3. Respond ONLY in this JSON format:
-
-{{
-  "refined_query": "string",
-  "results": [
-    {{
-      "title": "string",
-      "year": "int",
-      "vote_average": "float",
-      "overview": "string",
-      "explanation": "string"
-    }}
-  ]
-}}
-
-User query: "{query}"
-
-Movies (truncated):
-{movies_context}
-    """
+async def recommend_chat(query: str, top_n: int = 5, stream: bool = False, semantic: bool = False):
+    """LLM-picked matches for a free-text query; `stream=true` sends them as server-sent events."""
+    cat = get_catalog()
+    # Top matches by embedding similarity (semantic=true) or BM25 relevance over title, keywords and overview
+    positions = await semantic_index.asearch(cat, query, CHAT_CANDIDATES) if semantic else None
+    if positions is None:
+        with stage("candidate_filtering"):
+            positions = cat.search_index.search(query, top_n=CHAT_CANDIDATES)
+    context = build_context(cat.payloads.records("chat", positions))
+    prompt = chat_prompt(query, top_n, context)
+
+    if stream:
+        return StreamingResponse(chat_events(cat, query, prompt), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
     try:
-        response = openai.ChatCompletion.create(
-            engine="gpt_35_turbo_16k_navicade",
-            messages=[
-                {"role": "system", "content": "You are a helpful movie recommendation assistant."},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=1000,
-            temperature=0.7
-        )
-
-        reply = response["choices"][0]["message"]["content"]
+        with stage("llm_call"):
+            reply = await acomplete_chat(prompt)
 
         try:
             parsed = json.loads(reply)
@@ -204,26 +198,46 @@ Movies (truncated):
             parsed = {"refined_query": query, "results": []}
 
         # Enrich with poster URLs by matching movie title + year to find local ID
-        for movie in parsed["results"]:
-            match = movies_df[
-                (movies_df["title"].str.lower() == movie["title"].lower()) &
-                (movies_df["year"] == movie["year"])
-            ]
-            if not match.empty:
-                movie_id = int(match.iloc[0]["id"])
-                movie["poster_url"] = get_poster_url(movie_id)
-            else:
-                movie["poster_url"] = None
+        ids = [chat_movie_id(cat, movie) for movie in parsed["results"]]
+        posters = await poster_resolver.resolve_many_async(ids)
+        for movie, movie_id in zip(parsed["results"], ids):
+            movie["poster_url"] = posters.get(movie_id)
 
         return parsed
 
     except Exception as e:
         return {"error": str(e)}
 
-# ------------------------------
-# User history storage
-# ------------------------------
-user_history = {}  # { user_id: {"watched": set(), "ratings": {movie_id: rating}, "likes": set(), "dislikes": set(), "watchlist": set()} }
+def chat_movie_id(cat, movie):
+    return cat.movie_index.id_for_title(movie.get("title", ""), movie.get("year"))
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def chat_events(cat, query, prompt):
+    """query, then one movie event per result as soon as it is parsed (poster included), then done."""
+    parser = ResultParser()
+    sent_query = False
+    count = 0
+    try:
+        with stage("llm_call"):
+            async for text in astream_chat(prompt):
+                movies = parser.feed(text)
+                if not sent_query and (parser.refined_query is not None or movies):
+                    sent_query = True
+                    yield sse("query", {"refined_query": parser.refined_query or query})
+                for movie in movies:
+                    # the model keeps generating meanwhile; its output waits in the socket buffer
+                    movie_id = chat_movie_id(cat, movie)
+                    movie["poster_url"] = (await poster_resolver.resolve_many_async([movie_id])).get(movie_id)
+                    count += 1
+                    yield sse("movie", movie)
+    except Exception as e:
+        yield sse("error", {"error": str(e)})
+        return
+    if not sent_query:
+        yield sse("query", {"refined_query": query})
+    yield sse("done", {"count": count})
 
 # Pydantic models for request bodies
 class MovieAction(BaseModel):
@@ -234,40 +248,32 @@ class RateAction(BaseModel):
     rating: float
 
 # ------------------------------
-# User actions
+# User actions (persisted through utils.user_store)
 # ------------------------------
 
 @router.post("/user/{user_id}/like")
 def like_movie(user_id: str, data: MovieAction):
-    history = get_user_history(user_id)
-    history["likes"].add(data.movie_id)
-    history["dislikes"].discard(data.movie_id)
+    record_action(user_id, "like", data.movie_id)
     return {"message": f"Movie {data.movie_id} liked by {user_id}"}
 
 @router.post("/user/{user_id}/dislike")
 def dislike_movie(user_id: str, data: MovieAction):
-    history = get_user_history(user_id)
-    history["dislikes"].add(data.movie_id)
-    history["likes"].discard(data.movie_id)
+    record_action(user_id, "dislike", data.movie_id)
     return {"message": f"Movie {data.movie_id} disliked by {user_id}"}
 
 @router.post("/user/{user_id}/watch")
 def watch_movie(user_id: str, data: MovieAction):
-    history = get_user_history(user_id)
-    history["watched"].add(data.movie_id)
+    record_action(user_id, "watch", data.movie_id)
     return {"message": f"Movie {data.movie_id} marked as watched by {user_id}"}
 
 @router.post("/user/{user_id}/watchlist")
 def add_watchlist(user_id: str, data: MovieAction):
-    history = get_user_history(user_id)
-    history["watchlist"].add(data.movie_id)
+    record_action(user_id, "watchlist", data.movie_id)
     return {"message": f"Movie {data.movie_id} added to watchlist by {user_id}"}
 
 @router.post("/user/{user_id}/rate")
 def rate_movie(user_id: str, data: RateAction):
-    history = get_user_history(user_id)
-    history["ratings"][data.movie_id] = data.rating
-    history["watched"].add(data.movie_id)
+    record_action(user_id, "rate", data.movie_id, data.rating)
     return {"message": f"Movie {data.movie_id} rated {data.rating} by {user_id}"}
 
 # ------------------------------
@@ -275,37 +281,14 @@ def rate_movie(user_id: str, data: RateAction):
 # ------------------------------
 @router.get("/recommend/user/{user_id}")
 def recommend_for_user(user_id: str, top_n: int = 10):
-    history = get_user_history(user_id)
-    watched = list(history["watched"])
-    rated = history["ratings"]
-
-    print(f"Watched movies for {user_id}: {watched}")
-    print(f"Ratings for {user_id}: {rated}")
-
-    if not watched:
+    cat = get_catalog()
+    # stored list with posters resolved (see utils.user_recommendations); computed only on a miss
+    stored = user_recommendations.get(user_id, cat, top_n)
+    if stored is None:
         return {"error": "No history found for this user."}
 
-    sim_scores = np.zeros(len(movies_df))
-    for movie_id in watched:
-        idx = get_movie_index(movie_id)
-        if idx is None:
-            continue
-        weight = rated.get(movie_id, 3)
-        sim_scores += weight * cosine_sim[idx]
-
-    watched_indices = movies_df[movies_df["id"].isin(watched)].index
-    sim_scores[watched_indices] = -1
-
-    top_indices = sim_scores.argsort()[::-1][:top_n]
-    print(f"Recommended movies indices: {top_indices}")
-    print(f"Recommended movie IDs: {movies_df.iloc[top_indices]['id'].tolist()}")
-    out = movies_df.iloc[top_indices][["id","title","genres","vote_average","overview","year"]].copy()
-    out["score"] = sim_scores[top_indices]
-
-    print(f"Recommended movies indices: {top_indices}")
-
-    result = sanitize_for_json(out).to_dict(orient="records")
-    return enrich_with_poster_urls(result)
+    positions, scores, posters = stored
+    return cat.payloads.response("card", positions, {"score": scores, "poster_url": posters})
 
 # ------------------------------
 # User profile
@@ -1,18 +1,16 @@
 from fastapi import APIRouter
-from utils.data_loader import movies_df, cosine_sim  
-from utils.tmdb import get_poster_url,enrich_with_poster_urls
+from utils.data_loader import get_catalog
+from utils.tmdb import poster_urls
 
 router = APIRouter()
 
 @router.get("/movies/by_ids")
 def get_movies_by_ids(ids: str):
-    df = movies_df.copy()
-    id_list = [int(x) for x in ids.split(",") if x.isdigit()]
-    df = movies_df[movies_df["id"].isin(id_list)]
-    results = df[["id","title","overview","vote_average","year","genres"]].to_dict(orient="records")
-    
-    # Enrich each movie with its poster url
-    for movie in results:
-        movie["poster_url"] = get_poster_url(movie["id"]) 
-    
-    return results
\ No newline at end of file
+    cat = get_catalog()
+    # each movie once, in the order it was first asked for
+    id_list = list(dict.fromkeys(int(x) for x in ids.split(",") if x.isdigit()))
+    positions = cat.movie_index.positions(id_list)
+
+    # Enrich all movies with their poster urls in one batch
+    urls = poster_urls(cat.payloads.ids[positions])
+    return cat.payloads.response("by_ids", positions, {"poster_url": urls})
@@ -0,0 +1,70 @@
+import os
+import sys
+import shutil
+import tempfile
+import openai
+import pytest
+
+# ----------------------------
+# Test session setup
+# ----------------------------
+# App modules read their configuration (and build the catalog) at import, so
+# everything is pointed at a throwaway directory with a small synthetic catalog
+# and at the bench TMDb / OpenAI stubs before any of them is imported.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from bench.generate import generate
+from bench.stubs import start_openai, start_tmdb
+
+TEST_ROWS = 300
+
+WORK_DIR = tempfile.mkdtemp(prefix="tmdb-tests-")
+DATA_DIR = os.path.join(WORK_DIR, "data")
+generate(TEST_ROWS, DATA_DIR, seed=0)
+
+_tmdb = start_tmdb(latency=0.0)
+_openai = start_openai(latency=0.0)
+
+os.environ.update({
+    "MOVIES_DATA_DIR": DATA_DIR,
+    "ARTIFACT_DIR": os.path.join(WORK_DIR, "artifacts"),
+    "CACHE_DIR": os.path.join(WORK_DIR, "cache"),
+    "USER_DB_PATH": os.path.join(WORK_DIR, "users.sqlite"),
+    "CATALOG_POLL_INTERVAL": "0",
+    "TMDB_API_BASE": _tmdb.url,
+    "TMDB_API_KEY": "test",
+})
+
+
+def _reset(stub):
+    stub.latency = 0.0
+    stub.calls = 0
+    stub.paths.clear()
+    return stub
+
+
+@pytest.fixture
+def tmdb_stub():
+    yield _reset(_tmdb)
+    _reset(_tmdb)
+
+
+@pytest.fixture
+def openai_stub(monkeypatch):
+    from utils import ai_helpers
+
+    monkeypatch.setattr(openai, "api_type", "open_ai")
+    monkeypatch.setattr(openai, "api_base", f"{_openai.url}/v1")
+    monkeypatch.setattr(openai, "api_version", None)
+    monkeypatch.setattr(openai, "api_key", "test")
+    monkeypatch.setattr(ai_helpers, "OPENAI_DEPLOYMENT_NAME", "test")
+    yield _reset(_openai)
+    _reset(_openai)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    _tmdb.shutdown()
+    _openai.shutdown()
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
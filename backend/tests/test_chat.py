@@ -0,0 +1,106 @@
+import json
+import time
+import asyncio
+import openai
+import pytest
+from utils import chat
+from utils.chat import ResultParser, build_context, estimate_tokens
+from utils.metrics import EXTERNAL_FIRST_CHUNK_SECONDS, EXTERNAL_SECONDS
+
+SENTENCE = "A retired spy is pulled back for one last mission across the desert. "
+
+
+def movies(n, overview_sentences=12):
+    genres = json.dumps([{"id": 18, "name": "Drama"}, {"id": 53, "name": "Thriller"}])
+    return [{"title": f"Movie {i}", "year": 2000 + i, "genres": genres, "vote_average": 6.5,
+             "overview": SENTENCE * overview_sentences} for i in range(n)]
+
+
+@pytest.mark.parametrize("n, budget", [(1, 1500), (20, 1500), (20, 300), (200, 1500), (5, 20)])
+def test_context_fits_the_budget_whatever_the_overviews(n, budget):
+    context = build_context(movies(n), budget=budget, overview_tokens=80)
+    lines = context.split("\n") if context else []
+
+    assert sum(estimate_tokens(line) + 1 for line in lines) <= budget
+    assert [line.split(" (")[0] for line in lines] == [f"- Movie {i}" for i in range(len(lines))]
+    for line in lines:
+        if line.count(" | ") == 3:
+            overview = line.rsplit(" | ", 1)[1]
+            assert estimate_tokens(overview) <= 80
+            assert overview.endswith(".") or overview.endswith("…")
+
+
+def test_context_keeps_every_candidate_when_overviews_are_short():
+    context = build_context(movies(20, overview_sentences=1), budget=1500)
+    assert len(context.split("\n")) == 20
+    assert all(line.endswith(SENTENCE.strip()) for line in context.split("\n"))
+
+
+REPLY = json.dumps({
+    "refined_query": "tense \"spy\" thrillers",
+    "results": [
+        {"title": "Movie {1}", "year": 2001, "overview": "braces } and ] inside \\\" strings", "explanation": "x"},
+        {"title": "Movie 2", "year": 2002, "tags": {"nested": [1, 2]}, "explanation": "y"},
+        {"title": "Movie 3", "year": 2003, "explanation": "z"},
+    ],
+    "trailing": [{"title": "not a result"}],
+}, indent=1)
+
+
+@pytest.mark.parametrize("step", [1, 3, 17, len(REPLY)])
+def test_parser_returns_each_result_once_its_brace_closes(step):
+    parser = ResultParser()
+    found, seen_at = [], []
+    for start in range(0, len(REPLY), step):
+        for result in parser.feed(REPLY[start:start + step]):
+            found.append(result)
+            seen_at.append(start + step)
+
+    assert parser.refined_query == 'tense "spy" thrillers'
+    assert found == json.loads(REPLY)["results"]
+    # no later than the chunk carrying the object's closing brace
+    ends = [REPLY.index('"explanation": "%s"' % e) for e in "xyz"]
+    for end, seen in zip(ends, seen_at):
+        assert seen <= (REPLY.index("}", end) // step + 1) * step
+
+
+class SlowStream:
+    """Stands in for an OpenAI stream: each chunk takes `delay` seconds to arrive."""
+
+    def __init__(self, texts, delay):
+        self.texts, self.delay = list(texts), delay
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.texts:
+            raise StopAsyncIteration
+        await asyncio.sleep(self.delay)
+        return {"choices": [{"delta": {"content": self.texts.pop(0)}}]}
+
+
+def test_stream_timing_leaves_out_the_consumer(monkeypatch):
+    async def acreate(**kwargs):
+        await asyncio.sleep(0.05)
+        return SlowStream(["a", "b", "c"], 0.02)
+
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+
+    async def consume():
+        texts = []
+        async for text in chat.astream_chat("prompt"):
+            texts.append(text)
+            await asyncio.sleep(0.2)          # slow client
+        return texts
+
+    total_before = EXTERNAL_SECONDS.values.get(("openai",), [0])[-1]
+    first_before = EXTERNAL_FIRST_CHUNK_SECONDS.values.get(("openai",), [0])[-1]
+    start = time.perf_counter()
+    assert asyncio.run(consume()) == ["a", "b", "c"]
+    elapsed = time.perf_counter() - start
+
+    waited = EXTERNAL_SECONDS.values[("openai",)][-1] - total_before
+    first_chunk = EXTERNAL_FIRST_CHUNK_SECONDS.values[("openai",)][-1] - first_before
+    assert 0.05 + 3 * 0.02 <= waited < 0.3 < elapsed
+    assert 0.07 <= first_chunk < 0.2
@@ -0,0 +1,105 @@
+import types
+import pytest
+from fastapi.testclient import TestClient
+
+import utils.embeddings as embeddings
+from app.main import app
+from routes import movie_routes
+from utils.data_loader import get_catalog
+from utils.embeddings import SemanticIndex, movie_text, text_hash
+
+DEPLOYMENT = "test-embedding"
+
+
+def embedding_requests(openai_stub):
+    return sum(n for path, n in openai_stub.paths.items() if path.endswith("/embeddings"))
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SemanticIndex(DEPLOYMENT, root=str(tmp_path / "embeddings"))
+
+
+def test_top_up_embeds_every_movie_once(openai_stub, index):
+    cat = get_catalog()
+    assert not index.available()
+
+    assert index.top_up(cat, batch_size=64) == (cat.n_rows, 0)
+    assert embedding_requests(openai_stub) == -(-cat.n_rows // 64)
+    assert index.available()
+    assert index.store.meta()["count"] == cat.n_rows
+
+    assert index.top_up(cat, batch_size=64) == (0, cat.n_rows)
+    assert embedding_requests(openai_stub) == -(-cat.n_rows // 64)
+
+
+def test_changed_overview_is_re_embedded(openai_stub, index):
+    cat = get_catalog()
+    index.top_up(cat)
+
+    movies = cat.movies_df.copy()
+    movies.loc[movies.index[0], "overview"] = "A brand new overview about a lighthouse keeper."
+    edited = types.SimpleNamespace(movies_df=movies)
+    assert index.top_up(edited) == (1, cat.n_rows - 1)
+
+    movie_id = int(movies["id"].iloc[0])
+    new_hash = text_hash(movie_text(movies.iloc[0].to_dict()))
+    assert index.store.latest_hashes()[movie_id] == new_hash
+    assert index.store.meta()["count"] == cat.n_rows + 1
+    # the newest row wins: the search sees one row per movie
+    rows = index.row_positions(cat, index.store.view())
+    assert (rows >= 0).sum() == cat.n_rows
+
+
+def test_repeated_query_hits_the_cache(openai_stub, index):
+    cat = get_catalog()
+    index.top_up(cat)
+    calls = embedding_requests(openai_stub)
+
+    first = index.search(cat, "space robot mission", 10)
+    again = index.search(cat, "  Space robot   MISSION ", 10)
+    assert len(first) == 10
+    assert list(again) == list(first)
+    assert embedding_requests(openai_stub) == calls + 1
+    assert index.stats == {"query_hits": 1, "query_misses": 1, "errors": 0}
+
+
+def _no_deployment(tmp_path, monkeypatch):
+    return SemanticIndex("", root=str(tmp_path / "embeddings"))
+
+
+def _no_vectors(tmp_path, monkeypatch):
+    return SemanticIndex(DEPLOYMENT, root=str(tmp_path / "embeddings"))
+
+
+def _failing_requests(tmp_path, monkeypatch):
+    index = SemanticIndex(DEPLOYMENT, root=str(tmp_path / "embeddings"))
+    index.top_up(get_catalog())
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("embedding deployment unavailable")
+
+    async def afail(*args, **kwargs):
+        fail()
+
+    monkeypatch.setattr(embeddings, "embed_texts", fail)
+    monkeypatch.setattr(embeddings, "aembed_texts", afail)
+    return index
+
+
+@pytest.mark.parametrize("unavailable", [_no_deployment, _no_vectors, _failing_requests])
+def test_semantic_routes_fall_back_to_keyword_search(openai_stub, tmdb_stub, tmp_path, monkeypatch, unavailable):
+    monkeypatch.setattr(movie_routes, "semantic_index", unavailable(tmp_path, monkeypatch))
+    client = TestClient(app)
+
+    params = {"q": "love war", "size": 20}
+    keyword = client.get("/catalog", params=params)
+    semantic = client.get("/catalog", params={**params, "semantic": "true"})
+    assert semantic.status_code == 200
+    assert keyword.json() and semantic.json() == keyword.json()
+
+    params = {"query": "love war", "top_n": 3}
+    keyword = client.get("/recommend/chat", params=params)
+    semantic = client.get("/recommend/chat", params={**params, "semantic": "true"})
+    assert semantic.status_code == 200
+    assert keyword.json()["results"] and semantic.json() == keyword.json()
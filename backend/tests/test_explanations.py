@@ -0,0 +1,53 @@
+import time
+from utils.explanations import PENDING, ExplanationService
+
+MOVIES = [
+    {"id": 101, "title": "First Movie", "genres": "Drama", "overview": "A family drama.", "cast_clean": "A"},
+    {"id": 102, "title": "Second Movie", "genres": "Comedy", "overview": "A road trip.", "cast_clean": "B"},
+    {"id": 103, "title": "Third Movie", "genres": "Horror", "overview": "A haunted house.", "cast_clean": "C"},
+]
+
+
+def wait_idle(service, timeout=10):
+    deadline = time.monotonic() + timeout
+    while service._inflight and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert not service._inflight
+
+
+def test_slow_completion_returns_placeholder_then_fills_cache(openai_stub, tmp_path):
+    openai_stub.latency = 1.0
+    service = ExplanationService(batched=False, cache_path=str(tmp_path / "explanations.sqlite"))
+
+    start = time.perf_counter()
+    assert service.explain_popular(MOVIES, deadline=0.1) == [PENDING] * len(MOVIES)
+    assert time.perf_counter() - start < 0.5
+    # asking again while the requests are running joins them instead of sending new ones
+    assert service.explain_popular(MOVIES, deadline=0.1) == [PENDING] * len(MOVIES)
+
+    wait_idle(service)
+    texts = service.explain_popular(MOVIES, deadline=0.1)
+    assert all(text.startswith("Stub explanation:") for text in texts)
+    assert "First Movie" in texts[0] and "Third Movie" in texts[2]
+    assert openai_stub.calls == len(MOVIES)
+    assert service.stats["hits"] == len(MOVIES)
+
+    # the answers were persisted too
+    restarted = ExplanationService(batched=False, cache_path=str(tmp_path / "explanations.sqlite"))
+    assert restarted.explain_popular(MOVIES, deadline=0.1) == texts
+    assert openai_stub.calls == len(MOVIES)
+
+
+def test_batched_mode_sends_one_request_and_maps_answers_back(openai_stub, tmp_path):
+    service = ExplanationService(batched=True, cache_path=str(tmp_path / "explanations.sqlite"))
+
+    texts = service.explain_similar(MOVIES[0], MOVIES[1:], deadline=5)
+    assert openai_stub.calls == 1
+    # the stub answers item i with "Stub explanation {i}."
+    assert texts == ["Stub explanation 1.", "Stub explanation 2."]
+
+    texts = service.explain_popular(MOVIES, deadline=5)
+    assert openai_stub.calls == 2
+    assert texts == ["Stub explanation 1.", "Stub explanation 2.", "Stub explanation 3."]
+    assert service.explain_popular(MOVIES[::-1], deadline=5) == texts[::-1]
+    assert openai_stub.calls == 2
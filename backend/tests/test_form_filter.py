@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from models.schemas import FormRequest
+from utils.data_loader import get_catalog
+from utils.form_filter import POPULARITY_WEIGHT, SIMILARITY_WEIGHT
+from utils.inverted_index import parse_names
+
+FORMS = [
+    {},
+    {"min_rating": 6.5},
+    {"genre": "Drama", "year_from": 1990, "year_to": 2005},
+    {"genre": "Action, Comedy", "genre_match": "any", "budget_min": 1e6, "budget_max": 5e7},
+    {"genre": "action,COMEDY", "genre_match": "all", "min_rating": 5},
+    {"genre": "Nope", "min_rating": 1},
+    {"year_from": 2030},
+]
+
+
+def brute_force_mask(movies_df, form):
+    wanted = {g.strip().casefold() for g in form.genre.split(",") if g.strip()}
+    row_genres = [{n.casefold() for n in parse_names(raw)} for raw in movies_df["genres"]]
+    if form.genre_match == "all":
+        genre_ok = [wanted <= names for names in row_genres]
+    else:
+        genre_ok = [not wanted or bool(wanted & names) for names in row_genres]
+    return (np.asarray(genre_ok)
+            & (movies_df["vote_average"] >= form.min_rating).to_numpy()
+            & movies_df["year"].between(form.year_from, form.year_to).to_numpy()
+            & movies_df["budget"].between(form.budget_min, form.budget_max).to_numpy())
+
+
+def brute_force_rank(cat, positions, top_n):
+    if not len(positions):
+        return []
+    votes = cat.movies_df["vote_average"].to_numpy()[positions]
+    anchor = cat.tfidf_matrix[positions[np.argmax(votes)]]
+    sims = (cat.tfidf_matrix[positions] @ anchor.T).toarray().ravel()
+    pop = cat.popularity.scores[positions]
+    hybrid = SIMILARITY_WEIGHT * sims + (POPULARITY_WEIGHT * pop / pop.max() if pop.max() > 0 else 0)
+    return positions[np.lexsort((positions, -hybrid))][:top_n].tolist()
+
+
+@pytest.mark.parametrize("fields", FORMS)
+def test_filters_match_pandas_masks(fields):
+    cat = get_catalog()
+    form = FormRequest(**fields)
+    expected = np.flatnonzero(brute_force_mask(cat.movies_df, form))
+
+    assert cat.form_filter.select(form).tolist() == expected.tolist()
+    positions, scores = cat.form_filter.recommend(form, top_n=20)
+    assert positions.tolist() == brute_force_rank(cat, expected, 20)
+    np.testing.assert_array_equal(scores, cat.popularity.scores[positions])
+
+
+def test_by_form_route_returns_the_ranked_rows(tmdb_stub):
+    cat = get_catalog()
+    fields = {"genre": "Drama", "min_rating": 4}
+    expected = brute_force_rank(cat, np.flatnonzero(brute_force_mask(cat.movies_df, FormRequest(**fields))), 20)
+
+    response = TestClient(app).post("/recommend/by_form_v2", json=fields)
+    assert response.status_code == 200
+    assert [m["id"] for m in response.json()] == cat.payloads.ids[expected].tolist()
@@ -0,0 +1,89 @@
+import gc
+import os
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from utils import data_loader, ingest as ingest_module
+from utils.data_loader import get_catalog, load_catalog
+
+NEW_ID = 990001
+
+
+def movie(movie_id, title, **fields):
+    return {"id": movie_id, "title": title, "overview": "A detective and a robot escape the city.",
+            "genres": [{"id": 18, "name": "Drama"}], "release_date": "2024-05-01", "vote_average": 7.0,
+            "vote_count": 100, "cast": [{"name": "Some Actor"}], "crew": [{"name": "Some Director"}], **fields}
+
+
+@pytest.fixture
+def serial_only(monkeypatch):
+    """Fail if ingestion would hand cast/crew parsing to a process pool."""
+    clean_names = data_loader.clean_names
+
+    def serial(values, workers):
+        assert workers == 1
+        return clean_names(values, workers)
+
+    monkeypatch.setattr(data_loader, "clean_names", serial)
+
+
+def test_ingest_publishes_the_next_generation(serial_only):
+    before = get_catalog()
+    existing = int(before.payloads.ids[0])
+
+    after = ingest_module.ingest([movie(NEW_ID, "Brand New Movie"), movie(existing, "Renamed Movie")])
+
+    assert get_catalog() is after
+    assert after.meta["generation"] == before.meta["generation"] + 1
+    assert after.store.path.endswith(f".g{after.meta['generation']}")
+    assert data_loader.current_store().path == after.store.path
+    assert after.n_rows == before.n_rows + 1
+    assert after.payloads.records("card", [after.movie_index.position(NEW_ID)])[0]["title"] == "Brand New Movie"
+    assert after.payloads.records("card", [after.movie_index.position(existing)])[0]["title"] == "Renamed Movie"
+    # the old catalog is untouched and can still open its lazily read files
+    assert before.movie_index.position(NEW_ID) is None
+    assert before.store.load_frame("movies")["title"].iloc[0] != "Renamed Movie"
+
+
+def test_admin_route_ingests_and_reports_the_snapshot(monkeypatch, serial_only):
+    monkeypatch.setattr("routes.admin_routes.INGEST_TOKEN", "secret")
+    client = TestClient(app)
+
+    assert client.post("/admin/movies", json=[movie(NEW_ID + 1, "Route Movie")]).status_code == 403
+    assert client.post("/admin/movies", json=[{"id": NEW_ID + 2}],
+                       headers={"X-Admin-Token": "secret"}).status_code == 400
+
+    response = client.post("/admin/movies", json=[movie(NEW_ID + 1, "Route Movie")],
+                           headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    status = response.json()
+    assert status["snapshot"] == os.path.basename(get_catalog().store.path)
+    assert status["generation"] == get_catalog().meta["generation"]
+    assert status["movies"] == get_catalog().n_rows
+    assert get_catalog().movie_index.position(NEW_ID + 1) is not None
+
+
+def test_old_generations_are_kept_while_attached(monkeypatch, serial_only):
+    monkeypatch.setattr(ingest_module, "KEEP_SNAPSHOTS", 1)
+    monkeypatch.setattr(ingest_module, "SNAPSHOT_GRACE", 0)
+    held = load_catalog(get_catalog().store)             # nothing read lazily yet
+    ingest_module.ingest([movie(NEW_ID + 10, "Second")])
+    dropped = get_catalog().store.path
+    ingest_module.ingest([movie(NEW_ID + 11, "Third")])
+    gc.collect()
+    ingest_module.ingest([movie(NEW_ID + 12, "Fourth")])
+
+    assert not os.path.exists(dropped)                   # superseded and unused
+    assert os.path.exists(held.store.path)
+    assert len(held.movies_df) == held.n_rows
+
+    # within the grace period even an unused generation stays
+    path = held.store.path
+    del held
+    gc.collect()
+    monkeypatch.setattr(ingest_module, "SNAPSHOT_GRACE", 3600)
+    ingest_module.ingest([movie(NEW_ID + 13, "Fifth")])
+    assert os.path.exists(path)
+    monkeypatch.setattr(ingest_module, "SNAPSHOT_GRACE", 0)
+    ingest_module.ingest([movie(NEW_ID + 14, "Sixth")])
+    assert not os.path.exists(path)
@@ -0,0 +1,52 @@
+import json
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+from utils.data_loader import get_catalog
+from utils.inverted_index import TermIndex, parse_names
+
+
+def genres(*names):
+    return json.dumps([{"id": i, "name": n} for i, n in enumerate(names)])
+
+
+COLUMN = [
+    genres("Action"),
+    genres("Action & Adventure", "Drama"),
+    genres("Drama", "action"),
+    "[{'id': 1, 'name': 'Animation'}, {'id': 2, 'name': 'Action'}]",  # python-literal rows still parse
+    genres("Action", "Action"),
+    "",
+    "not a list",
+]
+
+
+def test_terms_match_by_exact_case_insensitive_name():
+    index = TermIndex.from_column(COLUMN)
+
+    assert index.postings("Action").tolist() == [0, 2, 3, 4]  # not "Action & Adventure"
+    assert index.postings(" ACTION ").tolist() == [0, 2, 3, 4]
+    assert index.postings("Action & Adventure").tolist() == [1]
+    assert index.postings("Act").tolist() == []
+    assert "drama" in index and "Act" not in index
+    assert index.vocabulary == ["Action", "Action & Adventure", "Animation", "Drama"]
+
+
+def test_any_and_all_agree_with_a_row_by_row_scan():
+    index = TermIndex.from_column(COLUMN)
+    rows = [{n.casefold() for n in parse_names(raw)} for raw in COLUMN]
+    for terms in (["Action"], ["Action", "Drama"], ["Drama", "Animation"], ["Action", "Nope"], []):
+        wanted = {t.casefold() for t in terms}
+        any_rows = [p for p, names in enumerate(rows) if not wanted or names & wanted]
+        all_rows = [p for p, names in enumerate(rows) if wanted <= names]
+        assert index.select(terms, "any").tolist() == any_rows
+        assert index.select(terms, "all").tolist() == all_rows
+        assert np.flatnonzero(index.mask(terms, "any")).tolist() == any_rows
+        assert np.flatnonzero(index.mask(terms, "all")).tolist() == all_rows
+
+
+def test_genres_route_lists_the_parsed_vocabulary():
+    names = {n for raw in get_catalog().movies_df["genres"] for n in parse_names(raw)}
+    response = TestClient(app).get("/genres")
+    assert response.status_code == 200
+    assert response.json() == sorted(names)
@@ -0,0 +1,48 @@
+import orjson
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+from app.main import app
+from utils.data_loader import get_catalog
+from utils.helpers import sanitize_for_json
+from utils.payloads import PROJECTIONS, MoviePayloads
+
+
+def expected_rows(movies_df, columns, positions):
+    """What the routes returned before payloads: sanitize the rows and encode them per request."""
+    df = movies_df.iloc[positions]
+    return orjson.loads(orjson.dumps(sanitize_for_json(df if columns is None else df[columns]).to_dict(orient="records")))
+
+
+def test_every_projection_matches_sanitizing_the_frame():
+    cat = get_catalog()
+    positions = [5, 0, 17, cat.n_rows - 1, 5]
+    for name, columns in PROJECTIONS.items():
+        rendered = orjson.loads(cat.payloads.render(name, positions))
+        assert rendered == expected_rows(cat.movies_df, columns, positions), name
+        assert cat.payloads.records(name, positions) == rendered
+    assert cat.payloads.ids.tolist() == cat.movies_df["id"].tolist()
+
+
+def test_extras_are_spliced_into_each_row():
+    df = pd.DataFrame({"id": [1, 2, 3], "title": ["a", None, "c"], "vote_average": [7.5, np.nan, 6.0]})
+    payloads = MoviePayloads.build(df, {"small": ["id", "title", "vote_average"]})
+
+    body = payloads.render("small", np.array([2, 1]), {"score": np.array([0.5, 0.25], dtype=np.float32),
+                                                       "poster_url": ["x.jpg", None]})
+    assert orjson.loads(body) == [
+        {"id": 3, "title": "c", "vote_average": 6.0, "score": 0.5, "poster_url": "x.jpg"},
+        {"id": 2, "title": "", "vote_average": 0.0, "score": 0.25, "poster_url": None},
+    ]
+    assert payloads.render("small", []) == b"[]"
+
+
+def test_catalog_pages_are_the_sanitized_rows_plus_posters(tmdb_stub):
+    cat = get_catalog()
+    client = TestClient(app)
+    response = client.get("/catalog", params={"page": 2, "size": 7})
+    assert response.status_code == 200
+    movies = response.json()
+    posters = [m.pop("poster_url") for m in movies]
+    assert movies == expected_rows(cat.movies_df, None, list(range(7, 14)))
+    assert any(posters)
@@ -0,0 +1,43 @@
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+from utils.data_loader import get_catalog
+from utils.popularity import popularity_scores
+
+
+def ranked(scores, mask, top_n):
+    """Brute force: positions in mask, best score first, ties by position."""
+    positions = np.flatnonzero(mask)
+    return positions[np.argsort(-scores[positions], kind="stable")][:top_n].tolist()
+
+
+def test_top_n_matches_a_full_sort_globally_and_per_genre():
+    cat = get_catalog()
+    scores = popularity_scores(cat.movies_df)
+    np.testing.assert_allclose(cat.popularity.scores, scores)
+
+    everything = np.ones(cat.n_rows, dtype=bool)
+    assert cat.popularity.top(25).tolist() == ranked(scores, everything, 25)
+    for genre in cat.genre_index.names:
+        mask = cat.genre_index.mask([genre])
+        assert cat.popularity.top(10, genre).tolist() == ranked(scores, mask, 10)
+        assert cat.popularity.top(10, genre.upper()).tolist() == ranked(scores, mask, 10)
+    assert len(cat.popularity.top(10, "No Such Genre")) == 0
+
+
+def test_genre_union_and_intersection_stay_in_popularity_order():
+    cat = get_catalog()
+    scores = cat.popularity.scores
+    genres = cat.genre_index.names[:3]
+
+    union = cat.genre_index.mask(genres, "any")
+    assert cat.popularity.top_any(genres, 20).tolist() == ranked(scores, union, 20)
+    both = cat.genre_index.mask(genres[:2], "all")
+    assert cat.popularity.top_all(genres[:2], 20).tolist() == ranked(scores, both, 20)
+
+    client = TestClient(app)
+    response = client.get("/recommend/popular", params={"top_n": 20, "genre": ", ".join(genres[:2]), "match": "all"})
+    assert response.status_code == 200
+    movies = response.json()
+    assert [m["id"] for m in movies] == cat.payloads.ids[ranked(scores, both, 20)].tolist()
+    assert [m["popularity_score"] for m in movies] == sorted((m["popularity_score"] for m in movies), reverse=True)
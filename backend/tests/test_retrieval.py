@@ -0,0 +1,31 @@
+import numpy as np
+from utils.data_loader import get_catalog
+
+
+def test_exact_similar_past_the_neighbor_index_scans_every_row():
+    cat = get_catalog()
+    retriever = cat.retriever
+    k = retriever.neighbor_index.k
+    top_n = k + 70
+
+    positions, scores = retriever.similar(0, top_n)
+    assert len(positions) == top_n
+    assert 0 not in positions.tolist()
+    assert np.all(np.diff(scores) <= 0)
+    # the first K agree with the stored neighbor lists
+    indexed_positions, indexed_scores = retriever.similar(0, k)
+    assert len(indexed_positions) == k
+    np.testing.assert_allclose(scores[:k], indexed_scores, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(retriever.similarity_to(0, positions), scores, rtol=1e-5, atol=1e-6)
+
+
+def test_exact_similar_many_past_the_neighbor_index():
+    retriever = get_catalog().retriever
+    top_n = retriever.neighbor_index.k + 70
+
+    lists = retriever.similar_many([0, 1, 2], top_n)
+    assert [len(positions) for positions, _ in lists] == [top_n] * 3
+    for idx, (positions, scores) in zip([0, 1, 2], lists):
+        _, single_scores = retriever.similar(idx, top_n)
+        np.testing.assert_allclose(scores, single_scores)
+        assert idx not in positions.tolist()
@@ -0,0 +1,73 @@
+import math
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from utils.data_loader import get_catalog
+from utils.search import B, K1, BM25Index, tokenize
+
+DOCS = {
+    "title": ["Space Pirates", "Pirate Queen", "The Space Between Us", "Ocean Queen", "Spaceballs"],
+    "overview": ["pirates raid a space station", "a queen of pirates", "love in space", "the sea", "parody"],
+}
+WEIGHTS = {"title": 3.0, "overview": 1.0}
+
+
+def reference_scores(query):
+    """Textbook BM25 over weighted term frequencies, one document at a time."""
+    docs = []
+    for pos in range(len(DOCS["title"])):
+        tf = {}
+        for field, texts in DOCS.items():
+            for token in tokenize(texts[pos]):
+                tf[token] = tf.get(token, 0.0) + WEIGHTS[field]
+        docs.append(tf)
+    avgdl = sum(sum(tf.values()) for tf in docs) / len(docs)
+    scores = np.zeros(len(docs))
+    for token in tokenize(query):
+        df = sum(token in tf for tf in docs)
+        idf = math.log1p((len(docs) - df + 0.5) / (df + 0.5))
+        for pos, tf in enumerate(docs):
+            if token in tf:
+                norm = K1 * (1 - B + B * sum(tf.values()) / avgdl)
+                scores[pos] += idf * tf[token] * (K1 + 1) / (tf[token] + norm)
+    return scores
+
+
+@pytest.mark.parametrize("query", ["space", "queen pirates", "the space pirates", "sea queen"])
+def test_scores_and_ranking_match_textbook_bm25(query):
+    index = BM25Index.build(DOCS, WEIGHTS)
+    expected = reference_scores(query)
+
+    positions, scores = index.score(query)
+    np.testing.assert_allclose(scores, expected[positions], rtol=1e-5)
+    assert sorted(positions.tolist()) == np.flatnonzero(expected).tolist()
+    best_first = sorted(np.flatnonzero(expected), key=lambda p: (-expected[p], p))
+    assert index.search(query).tolist() == best_first
+    assert index.search(query, top_n=2).tolist() == best_first[:2]
+
+
+def test_last_word_is_a_prefix_and_every_word_is_required():
+    index = BM25Index.build({"title": DOCS["title"]}, {})
+
+    assert sorted(index.search("spa", prefix_last=True).tolist()) == [0, 2, 4]  # space, spaceballs
+    assert index.search("spa").tolist() == []
+    assert sorted(index.search("space pir", prefix_last=True, require_all=True).tolist()) == [0]
+    assert sorted(index.search("queen", prefix_last=True, require_all=True).tolist()) == [1, 3]
+    assert index.search("queen zzz", prefix_last=True, require_all=True).tolist() == []
+
+
+def test_autocomplete_route_finds_titles_from_a_partial_last_word():
+    cat = get_catalog()
+    title = next(t for t in cat.movies_df["title"] if len(tokenize(t)) >= 3 and len(tokenize(t)[1]) > 3)
+    words = tokenize(title)[:2]
+    typed = f"{words[0]} {words[1][:3]}"
+
+    response = TestClient(app).get("/search/autocomplete", params={"q": typed, "limit": 50})
+    assert response.status_code == 200
+    suggestions = response.json()
+    assert title in [s["title"] for s in suggestions]
+    for s in suggestions:
+        tokens = tokenize(s["title"])
+        assert words[0] in tokens
+        assert any(t.startswith(words[1][:3]) for t in tokens)
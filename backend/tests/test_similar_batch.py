@@ -0,0 +1,66 @@
+import json
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+from utils.data_loader import get_catalog
+
+MISSING_ID = 999999999
+
+
+def exact_scores(cat, idx):
+    """Cosine of row idx against every other row, brute force."""
+    scores = (cat.tfidf_matrix @ cat.tfidf_matrix[idx].T).toarray().ravel()
+    scores[idx] = -np.inf
+    return scores
+
+
+def test_batch_matches_per_seed_similar_and_drops_duplicates(tmdb_stub):
+    cat = get_catalog()
+    a, b = cat.payloads.ids[[3, 8]].tolist()
+    client = TestClient(app)
+
+    response = client.post("/recommend/similar/batch", json={"movie_ids": [b, a, b, MISSING_ID], "top_n": 6})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["missing"] == [MISSING_ID]
+    assert [r["movie_id"] for r in body["results"]] == [b, a]
+    for result in body["results"]:
+        idx = cat.movie_index.position(result["movie_id"])
+        positions, scores = cat.retriever.similar(idx, 6)
+        assert [m["id"] for m in result["similar"]] == cat.payloads.ids[positions].tolist()
+        np.testing.assert_allclose([m["score"] for m in result["similar"]], scores, rtol=1e-6)
+        best = np.sort(exact_scores(cat, idx))[::-1][:6]
+        np.testing.assert_allclose(scores, best, rtol=1e-5, atol=1e-6)
+        assert all("poster_url" in m for m in result["similar"])
+
+    unique = {m["id"] for r in body["results"] for m in r["similar"]}
+    assert tmdb_stub.calls <= len(unique)
+
+
+def test_stream_sends_one_ndjson_line_per_seed(tmdb_stub):
+    cat = get_catalog()
+    ids = cat.payloads.ids[:4].tolist()
+    client = TestClient(app)
+    request = {"movie_ids": ids + [MISSING_ID], "top_n": 3, "posters": False}
+
+    batch = client.post("/recommend/similar/batch", json=request).json()
+    response = client.post("/recommend/similar/batch", json={**request, "stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+
+    assert lines[0] == {"movie_id": MISSING_ID, "error": "Movie not found"}
+    assert lines[1:] == batch["results"]
+    assert all("poster_url" not in m for line in lines[1:] for m in line["similar"])
+    assert tmdb_stub.calls == 0
+
+
+def test_explanations_are_added_per_pair(openai_stub, tmdb_stub):
+    cat = get_catalog()
+    seed = int(cat.payloads.ids[5])
+    response = TestClient(app).post("/recommend/similar/batch",
+                                    json={"movie_ids": [seed], "top_n": 3, "explain": True, "posters": False})
+    assert response.status_code == 200
+    similar = response.json()["results"][0]["similar"]
+    assert len(similar) == 3
+    assert all(m["similarity_explanation"] for m in similar)
@@ -0,0 +1,112 @@
+import asyncio
+import sqlite3
+import threading
+from utils.tmdb import PosterResolver
+
+IMAGE_BASE = "https://image.test/w500"
+
+
+def make_resolver(tmdb_stub, tmp_path):
+    return PosterResolver(api_key="test", api_base=tmdb_stub.url, image_base=IMAGE_BASE,
+                          cache_path=str(tmp_path / "posters.sqlite"))
+
+
+def fetches(tmdb_stub, movie_id):
+    return tmdb_stub.paths[f"/movie/{movie_id}"]
+
+
+def test_overlapping_batches_share_one_request_per_id(tmdb_stub, tmp_path):
+    tmdb_stub.latency = 0.1
+    resolver = make_resolver(tmdb_stub, tmp_path)
+    batches = [list(range(1, 31)), list(range(11, 41)), list(range(21, 51))]
+
+    async def concurrently():
+        return await asyncio.gather(*(resolver.resolve_many(batch) for batch in batches))
+
+    results = resolver.loop.run(concurrently(), timeout=30)
+
+    assert all(fetches(tmdb_stub, movie_id) == 1 for movie_id in range(1, 51))
+    assert tmdb_stub.calls == 50
+    # the later batches joined the first one's in-flight requests rather than reading its results
+    assert resolver.stats["lru_hits"] == 0
+    for batch, result in zip(batches, results):
+        assert list(result) == batch
+    assert results[0][1] == f"{IMAGE_BASE}/bench1.jpg"
+    assert results[2][22] is None       # the stub has no poster for multiples of 11
+
+
+def test_not_found_is_cached_and_not_fetched_again(tmdb_stub, tmp_path):
+    resolver = make_resolver(tmdb_stub, tmp_path)
+
+    assert resolver.resolve_many_sync([34]) == {34: None}     # the stub 404s multiples of 17
+    assert resolver.resolve_many_sync([34]) == {34: None}
+    assert fetches(tmdb_stub, 34) == 1
+    assert resolver.stats["lru_hits"] == 1
+    assert resolver.stats["errors"] == 0
+    assert resolver.store.get_many([34]) == {"34": None}
+
+
+def test_restart_reads_results_back_from_sqlite(tmdb_stub, tmp_path):
+    ids = [1, 2, 22, 34]
+    first = make_resolver(tmdb_stub, tmp_path).resolve_many_sync(ids)
+    assert tmdb_stub.calls == len(ids)
+
+    restarted = make_resolver(tmdb_stub, tmp_path)
+    assert restarted.resolve_many_sync(ids) == first
+    assert tmdb_stub.calls == len(ids)
+    assert restarted.stats["store_hits"] == len(ids)
+
+
+def test_unexpected_error_only_fails_its_own_id(tmdb_stub, tmp_path, monkeypatch):
+    resolver = make_resolver(tmdb_stub, tmp_path)
+    request = resolver._request
+
+    async def flaky(movie_id):
+        if movie_id == 2:
+            raise ValueError("malformed TMDb reply")
+        return await request(movie_id)
+
+    monkeypatch.setattr(resolver, "_request", flaky)
+
+    assert resolver.resolve_many_sync([1, 2, 3]) == {
+        1: f"{IMAGE_BASE}/bench1.jpg", 2: None, 3: f"{IMAGE_BASE}/bench3.jpg",
+    }
+    assert resolver.stats["errors"] == 1
+    # a failure is only remembered briefly in-process, never persisted
+    assert resolver.store.get_many([2]) == {}
+
+
+def test_sqlite_runs_off_the_event_loop(tmdb_stub, tmp_path, monkeypatch):
+    resolver = make_resolver(tmdb_stub, tmp_path)
+    threads = []
+
+    def recording(fn):
+        def call(*args):
+            threads.append(threading.current_thread())
+            return fn(*args)
+        return call
+
+    monkeypatch.setattr(resolver.store, "get_many", recording(resolver.store.get_many))
+    monkeypatch.setattr(resolver.store, "set_many", recording(resolver.store.set_many))
+    resolver.resolve_many_sync([1, 2])
+
+    loop_thread = resolver.loop.run(_current_thread())
+    assert len(threads) == 2
+    assert loop_thread not in threads
+
+
+def test_broken_store_does_not_fail_the_batch(tmdb_stub, tmp_path, monkeypatch):
+    resolver = make_resolver(tmdb_stub, tmp_path)
+
+    def broken(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(resolver.store, "get_many", broken)
+    monkeypatch.setattr(resolver.store, "set_many", broken)
+
+    assert resolver.resolve_many_sync([1]) == {1: f"{IMAGE_BASE}/bench1.jpg"}
+    assert resolver.stats["store_errors"] == 2
+
+
+async def _current_thread():
+    return threading.current_thread()
@@ -0,0 +1,117 @@
+import numpy as np
+from utils.cache import MISSING
+from utils.data_loader import get_catalog
+from utils.recommender import LIKE_WEIGHT
+from utils.user_profiles import DEFAULT_WATCH_WEIGHT, ProfileStore
+from utils.user_store import apply_action, empty_history
+
+
+def fresh_profiles(cat):
+    return ProfileStore(cat.tfidf_matrix, cat.movie_index, cat.retriever, cat.popularity)
+
+
+def history_of(*actions):
+    history = empty_history()
+    for action in actions:
+        history = apply_action(history, *action)
+    return history
+
+
+def brute_force(cat, history, top_n):
+    """Rank every movie against the weighted sum of the history's TF-IDF rows."""
+    weights = {m: history["ratings"].get(m, DEFAULT_WATCH_WEIGHT) for m in history["watched"]}
+    for m in history["likes"]:
+        weights[m] = weights.get(m, 0) + 1.0
+    for m in history["dislikes"]:
+        weights[m] = weights.get(m, 0) - 0.5
+    profile = np.zeros(cat.tfidf_matrix.shape[1])
+    for movie_id, weight in weights.items():
+        profile += weight * cat.tfidf_matrix[cat.movie_index.position(movie_id)].toarray().ravel()
+    scores = cat.tfidf_matrix @ profile
+    seen = {cat.movie_index.position(m) for key in ("watched", "likes", "dislikes", "watchlist") for m in history[key]}
+    ranked = [p for p in np.argsort(-scores, kind="stable") if p not in seen]
+    return scores, ranked[:top_n]
+
+
+def test_batch_scoring_matches_one_user_at_a_time_and_brute_force():
+    cat = get_catalog()
+    ids = cat.payloads.ids.tolist()
+    histories = {
+        "liker": history_of(("like", ids[0]), ("like", ids[1]), ("dislike", ids[2])),
+        "rater": history_of(("rate", ids[3], 5), ("watch", ids[4]), ("watchlist", ids[5])),
+        "hater": history_of(("dislike", ids[6])),
+        "new": empty_history(),
+    }
+    users = list(histories.items())
+
+    batched = fresh_profiles(cat).recommend_many(users, top_n=15)
+    single = fresh_profiles(cat)
+    for (user_id, history), ranked in zip(users, batched):
+        expected = single.recommend(user_id, history, top_n=15)
+        if expected is None:
+            assert ranked is None
+            continue
+        assert ranked[0].tolist() == expected[0].tolist()
+        np.testing.assert_array_equal(ranked[1], expected[1])
+
+    assert batched[3] is None                                      # no history, no signal
+    np.testing.assert_array_equal(batched[2][0], [p for p in cat.popularity.order
+                                                  if p != cat.movie_index.position(ids[6])][:15])
+    for (user_id, history), ranked in zip(users[:2], batched[:2]):
+        scores, best = brute_force(cat, history, 15)
+        # equal up to ties: same scores in the same order
+        np.testing.assert_allclose(scores[ranked[0]], scores[best], rtol=1e-5)
+        np.testing.assert_allclose(ranked[1], scores[best], rtol=1e-5)
+
+
+def test_batch_scoring_spans_several_chunks(monkeypatch):
+    cat = get_catalog()
+    ids = cat.payloads.ids.tolist()
+    users = [(f"u{i}", history_of(("like", ids[i]), ("watch", ids[i + 1]))) for i in range(10)]
+    monkeypatch.setattr("utils.retrieval.BATCH_BYTES", 8 * max(*cat.tfidf_matrix.shape) * 3)
+
+    batched = fresh_profiles(cat).recommend_many(users, top_n=5)
+    single = fresh_profiles(cat)
+    assert [r[0].tolist() for r in batched] == [single.recommend(u, h, 5)[0].tolist() for u, h in users]
+
+
+def test_incremental_sync_matches_a_fresh_rebuild_after_rerates_and_flips():
+    cat = get_catalog()
+    ids = cat.payloads.ids.tolist()
+    profiles = fresh_profiles(cat)
+    steps = [
+        ("rate", ids[0], 4),
+        ("like", ids[1]),
+        ("watch", ids[2]),
+        ("rate", ids[0], 1),        # re-rate
+        ("dislike", ids[1]),        # like -> dislike flip
+        ("rate", ids[2], 5),        # watched, now rated
+        ("like", ids[1]),           # and back
+        ("watchlist", ids[3]),
+    ]
+    history = empty_history()
+    for step in steps:
+        history = apply_action(history, *step)
+        synced = profiles.get("user", history)
+        rebuilt = fresh_profiles(cat).get("user", history)
+        assert synced.weights == rebuilt.weights
+        np.testing.assert_allclose(synced.vector, rebuilt.vector, atol=1e-6)
+
+    assert synced.weights == {ids[0]: 1, ids[1]: LIKE_WEIGHT, ids[2]: 5}
+    assert profiles.recommend("user", history, 10)[0].tolist() == \
+        fresh_profiles(cat).recommend("user", history, 10)[0].tolist()
+
+
+def test_update_only_touches_cached_profiles():
+    cat = get_catalog()
+    ids = cat.payloads.ids.tolist()
+    profiles = fresh_profiles(cat)
+    profiles.update("cold", history_of(("like", ids[0])))
+    assert profiles.cache.get("cold") is MISSING
+
+    before = history_of(("like", ids[0]))
+    profiles.get("warm", before)
+    after = apply_action(before, "dislike", ids[0])
+    profiles.update("warm", after)
+    np.testing.assert_allclose(profiles.cache.get("warm").vector, fresh_profiles(cat).get("warm", after).vector,
+                               atol=1e-6)
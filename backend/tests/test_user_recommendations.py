@@ -0,0 +1,61 @@
+from utils.data_loader import get_catalog
+from utils.user_recommendations import UserRecommendations
+from utils.user_store import user_store
+
+
+def test_refresh_all_stores_what_compute_returns(tmdb_stub, tmp_path):
+    cat = get_catalog()
+    ids = cat.payloads.ids.tolist()
+    users = [f"batch-{i}" for i in range(5)]
+    for i, user_id in enumerate(users[:4]):
+        user_store.record(user_id, "like", ids[i])
+        user_store.record(user_id, "rate", ids[i + 10], 4)
+    recs = UserRecommendations(size=20, cache_path=str(tmp_path / "recs.sqlite"))
+
+    assert recs.refresh_all(users, batch_size=2) == len(users)
+    for user_id in users[:4]:
+        assert recs.store.get(user_id) == recs.compute(user_id, cat)
+    assert recs.store.get(users[4]) is None           # no history, nothing stored
+    assert recs.stats["refreshes"] == len(users) and recs.stats["errors"] == 0
+
+
+def test_watchlist_add_drops_the_stored_row(tmdb_stub, tmp_path):
+    cat = get_catalog()
+    ids = cat.payloads.ids.tolist()
+    user_id = "watchlister"
+    user_store.record(user_id, "like", ids[0])
+    recs = UserRecommendations(size=20, debounce=3600, cache_path=str(tmp_path / "recs.sqlite"))
+    recs.refresh(user_id)
+    listed = recs.store.get(user_id)["ids"][0]
+
+    user_store.record(user_id, "watchlist", listed)
+    recs.invalidate(user_id, "watchlist")
+    assert recs.store.get(user_id) is None
+
+    positions, _, _ = recs.get(user_id, cat, top_n=10)
+    assert listed not in cat.payloads.ids[positions].tolist()
+    recs.refresh(user_id)
+    assert listed not in recs.store.get(user_id)["ids"]
+
+
+def test_refresh_running_across_an_invalidation_is_not_stored(tmdb_stub, tmp_path, monkeypatch):
+    cat = get_catalog()
+    ids = cat.payloads.ids.tolist()
+    user_id = "racer"
+    user_store.record(user_id, "like", ids[1])
+    recs = UserRecommendations(size=20, debounce=3600, cache_path=str(tmp_path / "recs.sqlite"))
+    compute_many = recs.compute_many
+
+    def action_lands_mid_refresh(user_ids, cat, top_n=None):
+        rows = compute_many(user_ids, cat, top_n)
+        user_store.record(user_id, "dislike", ids[1])
+        recs.invalidate(user_id, "dislike")
+        return rows
+
+    monkeypatch.setattr(recs, "compute_many", action_lands_mid_refresh)
+    recs.refresh(user_id)
+    assert recs.store.get(user_id) is None              # the stale row never lands
+
+    monkeypatch.undo()
+    recs.refresh(user_id)
+    assert recs.store.get(user_id) == recs.compute(user_id, cat)
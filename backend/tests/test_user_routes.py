@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from utils.data_loader import get_catalog
+
+
+def test_movies_by_ids_returns_each_movie_once_in_request_order(tmdb_stub):
+    a, b, c = get_catalog().payloads.ids[:3].tolist()
+    client = TestClient(app)
+
+    response = client.get("/movies/by_ids", params={"ids": f"{b},{a},{b},{c},{a},0{c},999999999"})
+    assert response.status_code == 200
+    movies = response.json()
+    assert [m["id"] for m in movies] == [b, a, c]
+    assert all("poster_url" in m for m in movies)
+    assert tmdb_stub.calls <= 3
@@ -1,8 +1,9 @@
 import openai
 from config import OPENAI_DEPLOYMENT_NAME
+from utils.metrics import EXTERNAL_ERRORS, EXTERNAL_SECONDS
 
-def explain_popularity(movie):
-    prompt = f"""
+def popularity_prompt(movie):
+    return f"""
 Movie:
 Title: {movie['title']}
 Genres: {movie['genres']}
@@ -10,22 +11,12 @@ Overview: {movie['overview']}
 
 Explain concisely why this movie is popular in its genre.
 """
-    try:
-        response = openai.ChatCompletion.create(
-            engine=OPENAI_DEPLOYMENT_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=80
-        )
-        return response['choices'][0]['message']['content'].strip()
-    except Exception as e:
-        return f"Explanation not available ({str(e)})"
-
-def explain_similarity(movie_main, movie_similar):
-    prompt = f"""
+
+def similarity_prompt(movie_main, movie_similar):
+    return f"""
 You are a movie recommendation assistant.
 
-Explain concisely why the movie "{movie_similar['title']}" is similar to "{movie_main['title']}". 
+Explain concisely why the movie "{movie_similar['title']}" is similar to "{movie_main['title']}".
 Use the following details:
 
 - "{movie_main['title']}" Overview: {movie_main['overview']}
@@ -38,13 +29,19 @@ Use the following details:
 
 Keep the explanation short and clear for a user.
 """
+
+def complete(prompt, max_tokens, timeout=None):
+    """Single chat completion; raises on failure."""
     try:
-        response = openai.ChatCompletion.create(
-            engine=OPENAI_DEPLOYMENT_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            max_tokens=120
-        )
-        return response['choices'][0]['message']['content'].strip()
-    except Exception as e:
-        return f"Explanation not available ({str(e)})"
+        with EXTERNAL_SECONDS.time("openai"):
+            response = openai.ChatCompletion.create(
+                engine=OPENAI_DEPLOYMENT_NAME,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.7,
+                max_tokens=max_tokens,
+                request_timeout=timeout,
+            )
+    except Exception:
+        EXTERNAL_ERRORS.inc("openai")
+        raise
+    return response['choices'][0]['message']['content'].strip()
@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+
+# ----------------------------
+# Reduced embeddings + IVF approximate nearest neighbours
+# ----------------------------
+# TruncatedSVD projects the sparse TF-IDF rows to a dense float32 embedding
+# (unit length, so dot == cosine). IVFIndex clusters the embeddings with
+# k-means and keeps the row positions grouped by cluster; a query scores the
+# centroids, probes the `nprobe` closest lists and ranks only those rows.
+# nprobe trades recall for speed: nprobe == nlist is exact search.
+
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", 16))
+
+
+def normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (matrix / norms).astype(np.float32)
+
+
+def build_embeddings(tfidf_matrix, dim):
+    """Return (embeddings (N, d), components (d, V)); project new rows with x @ components.T."""
+    from sklearn.decomposition import TruncatedSVD
+
+    dim = max(1, min(dim, tfidf_matrix.shape[1] - 1, tfidf_matrix.shape[0] - 1))
+    svd = TruncatedSVD(n_components=dim, algorithm="randomized", random_state=42)
+    embeddings = svd.fit_transform(tfidf_matrix)
+    return normalize_rows(embeddings), svd.components_.astype(np.float32)
+
+
+def project(vector, components):
+    """Map a dense or sparse TF-IDF-space vector into the embedding space (unit length)."""
+    if hasattr(vector, "toarray"):
+        out = np.asarray(vector @ components.T).ravel()
+    else:
+        out = components @ vector
+    norm = np.linalg.norm(out)
+    return (out / norm if norm else out).astype(np.float32)
+
+
+class IVFIndex:
+    def __init__(self, vectors, centroids, list_offsets, list_positions, nprobe=ANN_NPROBE):
+        self.vectors = vectors                  # (N, d) float32, unit rows
+        self.centroids = centroids              # (nlist, d) float32
+        self.list_offsets = list_offsets        # (nlist + 1,) int64
+        self.list_positions = list_positions    # (N,) int32 grouped by cluster
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, vectors, nlist=None, nprobe=ANN_NPROBE):
+        from sklearn.cluster import MiniBatchKMeans
+
+        n = vectors.shape[0]
+        nlist = nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+        kmeans = MiniBatchKMeans(n_clusters=nlist, random_state=42, batch_size=4096, n_init=3)
+        labels = kmeans.fit_predict(vectors)
+        return cls.from_labels(vectors, normalize_rows(kmeans.cluster_centers_), labels, nprobe)
+
+    @classmethod
+    def from_labels(cls, vectors, centroids, labels, nprobe=ANN_NPROBE):
+        nlist = centroids.shape[0]
+        order = np.argsort(labels, kind="stable").astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+        return cls(vectors, centroids, offsets, order, nprobe)
+
+    def labels(self):
+        """Cluster of every row, recovered from the inverted lists."""
+        labels = np.empty(len(self.list_positions), dtype=np.int64)
+        labels[self.list_positions] = np.repeat(np.arange(self.nlist), np.diff(self.list_offsets))
+        return labels
+
+    def assign(self, vectors):
+        """Nearest existing centroid for each row of `vectors`."""
+        return np.asarray(np.argmax(vectors @ self.centroids.T, axis=1), dtype=np.int64)
+
+    def candidates(self, query, nprobe=None):
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([
+            self.list_positions[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe
+        ])
+
+    def search(self, query, top_n, nprobe=None, exclude=None):
+        """(positions, scores) of the approximate top_n rows for a unit query vector."""
+        cand = self.candidates(query, nprobe)
+        if exclude is not None:
+            cand = cand[~exclude[cand]]
+        scores = self.vectors[cand] @ query
+        k = min(top_n, len(cand))
+        if k <= 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        part = np.argpartition(-scores, k - 1)[:k]
+        order = part[np.argsort(-scores[part], kind="stable")]
+        return cand[order], scores[order]
+
+    # -- persistence ---------------------------------------------------
+    def save(self, store, name):
+        store.save_array(f"{name}.centroids", self.centroids)
+        store.save_array(f"{name}.offsets", self.list_offsets)
+        store.save_array(f"{name}.positions", self.list_positions)
+
+    @classmethod
+    def load(cls, store, name, vectors, nprobe=ANN_NPROBE):
+        return cls(
+            vectors,
+            store.load_array(f"{name}.centroids"),
+            store.load_array(f"{name}.offsets"),
+            store.load_array(f"{name}.positions"),
+            nprobe,
+        )
+
+
+# ----------------------------
+# Recall vs latency report:  python -m utils.ann [n_queries] [top_n]
+# ----------------------------
+def recall_report(catalog, n_queries=200, top_n=10, nprobes=(1, 2, 4, 8, 16, 32, 64)):
+    """Compare ANN against exact search in the embedding space and in raw TF-IDF space."""
+    retriever = catalog.retriever
+    if retriever.ann_index is None:
+        raise RuntimeError("No ANN index in the artifacts; build with EMBEDDING_DIM > 0")
+    ann = retriever.ann_index
+    n = ann.vectors.shape[0]
+    rng = np.random.default_rng(0)
+    queries = rng.choice(n, size=min(n_queries, n), replace=False)
+
+    def timed(fn):
+        start = time.perf_counter()
+        results = [fn(q) for q in queries]
+        return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+    def emb_exact(q):
+        scores = ann.vectors @ ann.vectors[q]
+        scores[q] = -np.inf
+        return set(np.argpartition(-scores, top_n)[:top_n].tolist())
+
+    def tfidf_exact(q):
+        return set(catalog.neighbor_index.neighbors(q, top_n)[0].tolist())
+
+    emb_truth, emb_ms = timed(emb_exact)
+    tfidf_truth, _ = timed(tfidf_exact)
+    exclude = np.zeros(n, dtype=bool)
+    rows = []
+    for nprobe in sorted({min(p, ann.nlist) for p in nprobes}):
+        def approx(q):
+            exclude[q] = True
+            positions, _ = ann.search(ann.vectors[q], top_n, nprobe, exclude)
+            exclude[q] = False
+            return set(positions.tolist())
+        found, ms = timed(approx)
+        rows.append({
+            "nprobe": nprobe,
+            "recall_vs_embedding_exact": float(np.mean([len(f & t) / top_n for f, t in zip(found, emb_truth)])),
+            "recall_vs_tfidf_exact": float(np.mean([len(f & t) / top_n for f, t in zip(found, tfidf_truth)])),
+            "ms_per_query": round(ms, 4),
+        })
+    return {
+        "movies": int(n), "dim": int(ann.vectors.shape[1]), "nlist": int(ann.nlist), "top_n": top_n,
+        "embedding_exact_ms_per_query": round(emb_ms, 4), "ann": rows,
+    }
+
+
+if __name__ == "__main__":
+    from utils.data_loader import get_catalog
+
+    args = [int(a) for a in sys.argv[1:3]]
+    print(json.dumps(recall_report(get_catalog(), *args), indent=2))
@@ -0,0 +1,223 @@
+import os
+import json
+import fcntl
+import bisect
+import shutil
+import pickle
+import hashlib
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# ----------------------------
+# Versioned on-disk artifact store
+# ----------------------------
+# Every preprocessing output lives in <root>/<key>/ where key hashes the input
+# CSVs and the preprocessing parameters. Arrays are plain .npy files opened with
+# mmap_mode="r", so all workers share the same page-cache pages. A directory is
+# only visible once fully written (build in a temp dir, then rename), and an
+# flock makes sure a single worker builds while the others wait. Readers hold a
+# shared flock on <path>.ref while attached, so a snapshot is never deleted
+# under a process that may still open its files lazily.
+
+ARTIFACT_VERSION = 5
+MANIFEST = "manifest"
+
+
+def _file_digest(path, hash_cache):
+    stat = os.stat(path)
+    cache_key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    if cache_key in hash_cache:
+        return hash_cache[cache_key]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    hash_cache[cache_key] = h.hexdigest()
+    return hash_cache[cache_key]
+
+
+def fingerprint(root, paths, params):
+    """Hash of input files + params. File hashes are memoised by (size, mtime)."""
+    os.makedirs(root, exist_ok=True)
+    cache_path = os.path.join(root, "file_hashes.json")
+    try:
+        with open(cache_path) as f:
+            hash_cache = json.load(f)
+    except (OSError, ValueError):
+        hash_cache = {}
+
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(_file_digest(path, hash_cache).encode())
+    h.update(json.dumps({"version": ARTIFACT_VERSION, **params}, sort_keys=True).encode())
+
+    tmp_path = f"{cache_path}.{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(hash_cache, f)
+    os.replace(tmp_path, cache_path)
+    return h.hexdigest()[:16]
+
+
+class ArtifactStore:
+    def __init__(self, path):
+        self.path = path
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def exists(self):
+        return os.path.exists(self.file(f"{MANIFEST}.json"))
+
+    def has(self, name):
+        return os.path.exists(self.file(name))
+
+    # -- writers -------------------------------------------------------
+    def save_array(self, name, arr):
+        np.save(self.file(f"{name}.npy"), np.ascontiguousarray(arr), allow_pickle=False)
+
+    def save_csr(self, name, matrix):
+        matrix = matrix.tocsr()
+        self.save_array(f"{name}.data", matrix.data)
+        self.save_array(f"{name}.indices", matrix.indices)
+        self.save_array(f"{name}.indptr", matrix.indptr)
+        self.save_json(f"{name}.shape", list(matrix.shape))
+
+    def save_frame(self, name, df):
+        df.to_pickle(self.file(f"{name}.pkl"))
+
+    def save_object(self, name, obj):
+        with open(self.file(f"{name}.pkl"), "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def save_json(self, name, obj):
+        with open(self.file(f"{name}.json"), "w") as f:
+            json.dump(obj, f)
+
+    def save_blobs(self, name, items):
+        """A list of bytes (or str, stored as UTF-8) as one buffer plus offsets."""
+        items = [i.encode() if isinstance(i, str) else i for i in items]
+        offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum([len(i) for i in items], out=offsets[1:])
+        self.save_array(f"{name}.data", np.frombuffer(b"".join(items), dtype=np.uint8))
+        self.save_array(f"{name}.offsets", offsets)
+
+    # -- readers -------------------------------------------------------
+    def load_array(self, name, mmap=True):
+        return np.load(self.file(f"{name}.npy"), mmap_mode="r" if mmap else None, allow_pickle=False)
+
+    def load_csr(self, name, mmap=True):
+        shape = tuple(self.load_json(f"{name}.shape"))
+        parts = (
+            self.load_array(f"{name}.data", mmap),
+            self.load_array(f"{name}.indices", mmap),
+            self.load_array(f"{name}.indptr", mmap),
+        )
+        return sparse.csr_matrix(parts, shape=shape, copy=False)
+
+    def load_frame(self, name):
+        return pd.read_pickle(self.file(f"{name}.pkl"))
+
+    def load_object(self, name):
+        with open(self.file(f"{name}.pkl"), "rb") as f:
+            return pickle.load(f)
+
+    def load_json(self, name):
+        with open(self.file(f"{name}.json")) as f:
+            return json.load(f)
+
+    def load_blobs(self, name):
+        return BlobTable(self.load_array(f"{name}.data"), self.load_array(f"{name}.offsets"))
+
+    def load_strings(self, name):
+        return StringTable(self.load_array(f"{name}.data"), self.load_array(f"{name}.offsets"))
+
+    # -- readers -------------------------------------------------------
+    def attach(self):
+        """Open <path>.ref with a shared lock; close it once nothing reads this snapshot."""
+        ref = open(f"{self.path}.ref", "a")
+        fcntl.flock(ref, fcntl.LOCK_SH)
+        return ref
+
+    @contextmanager
+    def detached(self):
+        """Yield whether no process is attached; while True, nobody can attach."""
+        with open(f"{self.path}.ref", "a") as ref:
+            try:
+                fcntl.flock(ref, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(ref, fcntl.LOCK_UN)
+
+    # -- building ------------------------------------------------------
+    @contextmanager
+    def build(self):
+        """Yield a staging store; it is published atomically if the block succeeds.
+
+        Yields None when another process finished the same build while we waited
+        for the lock.
+        """
+        parent = os.path.dirname(self.path)
+        os.makedirs(parent, exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if self.exists():
+                    yield None
+                    return
+                staging = ArtifactStore(f"{self.path}.tmp-{os.getpid()}")
+                shutil.rmtree(staging.path, ignore_errors=True)
+                os.makedirs(staging.path)
+                try:
+                    yield staging
+                    staging.save_json(MANIFEST, {"version": ARTIFACT_VERSION})
+                    shutil.rmtree(self.path, ignore_errors=True)
+                    os.rename(staging.path, self.path)
+                finally:
+                    shutil.rmtree(staging.path, ignore_errors=True)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class BlobTable:
+    """Read-only sequence of bytes over a memory-mapped buffer (see save_blobs).
+
+    Nothing is copied at load time, so every worker shares the same pages.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+        self._view = memoryview(data) if len(data) else memoryview(b"")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return bytes(self._view[int(self.offsets[i]):int(self.offsets[i + 1])])
+
+
+class StringTable(BlobTable):
+    """BlobTable of UTF-8 strings; bisect works on it when the strings were saved sorted."""
+
+    def __getitem__(self, i):
+        return super().__getitem__(i).decode()
+
+    def index(self, value):
+        """Position of `value` in a sorted table, or None."""
+        i = bisect.bisect_left(self, value)
+        return i if i < len(self) and self[i] == value else None
+
+
+def open_store(root, inputs, params):
+    return ArtifactStore(os.path.join(root, fingerprint(root, inputs, params)))
@@ -0,0 +1,40 @@
+import os
+import asyncio
+import threading
+
+# ----------------------------
+# Dedicated asyncio loop for sync callers
+# ----------------------------
+# Our routes are plain `def` handlers that FastAPI runs in a threadpool. Async
+# clients (pooled HTTP connections, single-flight futures) live on one
+# long-running loop in a daemon thread and sync code submits coroutines to it.
+
+
+class BackgroundLoop:
+    def __init__(self, name):
+        self.name = name
+        self._loop = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        # restart after fork: the thread does not survive into the child
+        if self._loop is None or self._pid != os.getpid():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name=self.name, daemon=True).start()
+                    self._loop, self._pid = loop, os.getpid()
+        return self._loop
+
+    def submit(self, coro):
+        """Schedule a coroutine; returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        return self.submit(coro).result(timeout)
+
+    async def run_async(self, coro):
+        """Await a coroutine on this loop from a different running loop."""
+        return await asyncio.wrap_future(self.submit(coro))
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# ----------------------------
+# Small caching building blocks shared by the TMDb / OpenAI helpers
+# ----------------------------
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(BASE_DIR, "app/data/cache"))
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe bounded LRU where every entry carries its own expiry."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteKVStore:
+    """JSON key/value table in a WAL-mode SQLite file, safe to share between worker processes."""
+
+    def __init__(self, path, table="kv"):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT, expires REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get_many(self, keys):
+        """Return {key: value} for the keys that exist and have not expired."""
+        keys = [str(k) for k in keys]
+        found = {}
+        now = time.time()
+        conn = self._conn()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, value FROM {self.table} WHERE expires > ? AND key IN ({','.join('?' * len(chunk))})",
+                [now, *chunk],
+            )
+            for key, value in rows:
+                found[key] = json.loads(value)
+        return found
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(str(key), default)
+
+    def set_many(self, items):
+        """items: iterable of (key, value, ttl_seconds)."""
+        now = time.time()
+        rows = [(str(k), json.dumps(v), now + ttl) for k, v, ttl in items]
+        if not rows:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def set(self, key, value, ttl):
+        self.set_many([(key, value, ttl)])
+
+    def delete(self, key):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (str(key),))
+
+    def purge_expired(self):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE expires <= ?", (time.time(),))
@@ -0,0 +1,220 @@
+import os
+import re
+import json
+import time
+import openai
+from utils.inverted_index import parse_names
+from utils.metrics import EXTERNAL_ERRORS, EXTERNAL_FIRST_CHUNK_SECONDS, EXTERNAL_SECONDS
+
+# ----------------------------
+# Conversational search: prompt context and streamed replies
+# ----------------------------
+# The candidates go into the prompt as one compact line each, and the whole
+# list has to fit in CHAT_CONTEXT_TOKENS. Each movie gets an even share of what
+# is left, and its overview is cut at a sentence (or word) boundary to fit that
+# share, up to CHAT_OVERVIEW_TOKENS. Prompt size therefore no longer depends on
+# how verbose the matching overviews are. Tokens are estimated at ~4 chars each.
+#
+# ResultParser reads the model's JSON reply while it is streamed and returns
+# each entry of "results" as soon as its closing brace arrives.
+
+CHAT_DEPLOYMENT_NAME = os.getenv("CHAT_DEPLOYMENT_NAME", "gpt_35_turbo_16k_navicade")
+CHAT_CANDIDATES = int(os.getenv("CHAT_CANDIDATES", 20))
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 1500))
+CHAT_OVERVIEW_TOKENS = int(os.getenv("CHAT_OVERVIEW_TOKENS", 80))
+CHAT_MAX_TOKENS = int(os.getenv("CHAT_MAX_TOKENS", 1000))
+CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", 60))
+
+CHARS_PER_TOKEN = 4
+MIN_OVERVIEW_TOKENS = 8      # below this an overview is left out rather than cut to a stub
+
+SYSTEM_PROMPT = "You are a helpful movie recommendation assistant."
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def shorten(text, max_tokens):
+    """`text` cut to about max_tokens: whole sentences if any fit, else whole words + an ellipsis."""
+    text = " ".join(str(text).split())
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    head = text[:limit]
+    end = max(head.rfind(". "), head.rfind("! "), head.rfind("? "))
+    if end > 0:
+        return head[:end + 1]
+    head = head[:limit - 1].rsplit(" ", 1)[0] if " " in head else head[:limit - 1]
+    return head + "…"
+
+
+def movie_line(movie):
+    genres = ", ".join(parse_names(movie.get("genres") or "[]"))
+    return f"- {movie['title']} ({movie['year']}) | {genres} | rated {movie['vote_average']}"
+
+
+def build_context(movies, budget=CHAT_CONTEXT_TOKENS, overview_tokens=CHAT_OVERVIEW_TOKENS):
+    """Prompt lines for `movies` (best match first) within `budget` estimated tokens."""
+    lines, remaining = [], budget
+    for i, movie in enumerate(movies):
+        line = movie_line(movie)
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            break
+        share = min(overview_tokens, remaining // (len(movies) - i) - cost)
+        overview = movie.get("overview") or ""
+        if overview and share >= MIN_OVERVIEW_TOKENS:
+            line = f"{line} | {shorten(overview, share)}"
+        lines.append(line)
+        remaining -= estimate_tokens(line) + 1
+    return "\n".join(lines)
+
+
+def chat_prompt(query, top_n, context):
+    return f"""
+You are a movie recommendation assistant.
+
+Task:
+1. Pick the {top_n} most relevant movies from the dataset below based on the user's query.
+2. Include a short explanation why each movie matches the query.
+3. Respond ONLY in this JSON format:
+
+{{
+  "refined_query": "string",
+  "results": [
+    {{
+      "title": "string",
+      "year": "int",
+      "vote_average": "float",
+      "overview": "string",
+      "explanation": "string"
+    }}
+  ]
+}}
+
+User query: "{query}"
+
+Movies (title (year) | genres | rating | overview):
+{context}
+    """
+
+
+def _messages(prompt):
+    return [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": prompt}]
+
+
+async def acomplete_chat(prompt):
+    """Whole reply of one chat completion, without holding a worker thread."""
+    try:
+        with EXTERNAL_SECONDS.time("openai"):
+            response = await openai.ChatCompletion.acreate(
+                engine=CHAT_DEPLOYMENT_NAME, messages=_messages(prompt),
+                max_tokens=CHAT_MAX_TOKENS, temperature=0.7, request_timeout=CHAT_TIMEOUT,
+            )
+    except Exception:
+        EXTERNAL_ERRORS.inc("openai")
+        raise
+    return response["choices"][0]["message"]["content"]
+
+
+async def astream_chat(prompt):
+    """Yield the reply's text deltas as the model produces them.
+
+    external_request_duration_seconds gets only the time spent waiting on
+    OpenAI (the call plus each chunk), not the time the consumer holds a chunk.
+    """
+    start = time.perf_counter()
+    waited = 0.0
+    try:
+        try:
+            response = await openai.ChatCompletion.acreate(
+                engine=CHAT_DEPLOYMENT_NAME, messages=_messages(prompt),
+                max_tokens=CHAT_MAX_TOKENS, temperature=0.7, request_timeout=CHAT_TIMEOUT, stream=True,
+            )
+        finally:
+            waited = time.perf_counter() - start
+        chunks = response.__aiter__()
+        first = True
+        while True:
+            before = time.perf_counter()
+            try:
+                chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                waited += time.perf_counter() - before
+            if first:
+                EXTERNAL_FIRST_CHUNK_SECONDS.observe(time.perf_counter() - start, "openai")
+                first = False
+            choices = chunk.get("choices") or [{}]
+            text = choices[0].get("delta", {}).get("content")
+            if text:
+                yield text
+    except Exception:
+        EXTERNAL_ERRORS.inc("openai")
+        raise
+    finally:
+        EXTERNAL_SECONDS.observe(waited, "openai")
+
+
+class ResultParser:
+    """Incremental reader for {"refined_query": ..., "results": [{...}, ...]} replies."""
+
+    RESULTS_KEY = re.compile(r'"results"\s*:\s*\[')
+    REFINED_QUERY = re.compile(r'"refined_query"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+    def __init__(self):
+        self.buffer = ""
+        self.refined_query = None
+        self._pos = None         # scan position inside "results", None until the key is seen
+        self._depth = 0
+        self._start = 0
+        self._in_string = False
+        self._escaped = False
+        self._closed = False
+
+    def feed(self, text):
+        """Add reply text; returns the result objects completed by it."""
+        self.buffer += text
+        if self.refined_query is None:
+            match = self.REFINED_QUERY.search(self.buffer)
+            if match:
+                self.refined_query = json.loads(match.group(1))
+        if self._pos is None:
+            match = self.RESULTS_KEY.search(self.buffer)
+            if not match:
+                return []
+            self._pos = match.end()
+        return self._scan()
+
+    def _scan(self):
+        found, buffer = [], self.buffer
+        i = self._pos
+        while i < len(buffer) and not self._closed:
+            ch = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        found.append(json.loads(buffer[self._start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass
+            elif ch == "]" and self._depth == 0:
+                self._closed = True
+            i += 1
+        self._pos = i
+        return found
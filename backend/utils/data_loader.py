@@ -1,39 +1,137 @@
 import os
+import json
+import time
+import weakref
+import threading
 import pandas as pd
-from ast import literal_eval
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from utils.artifacts import ArtifactStore, open_store
+from utils.id_index import MovieIdIndex
+from utils.inverted_index import TermIndex, parse_names
+from utils.neighbors import NEIGHBOR_K, NeighborIndex, build_neighbor_index
+from utils.popularity import PopularityIndex
+from utils.search import SearchIndex
+from utils.payloads import MoviePayloads
+from utils.form_filter import FormFilter, RangeFilterIndex
+from utils.user_profiles import ProfileStore
+from utils.ann import IVFIndex, build_embeddings
+from utils.retrieval import EMBEDDING_DIM, RETRIEVAL_MODE, Retriever
+from utils.preprocess import PREPROCESS_WORKERS, clean_names, compact_frame, read_credits, read_movies
 
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))  
-DATA_DIR = os.path.join(BASE_DIR, "app/data")              
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+DATA_DIR = os.getenv("MOVIES_DATA_DIR", os.path.join(BASE_DIR, "app/data"))
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(DATA_DIR, "artifacts"))
 
 MOVIES_CSV = os.path.join(DATA_DIR, "tmdb_5000_movies.csv")
 CREDITS_CSV = os.path.join(DATA_DIR, "tmdb_5000_credits.csv")
+# movies added or updated after the CSVs were exported (see utils.ingest)
+INGEST_LOG = os.getenv("INGEST_LOG", os.path.join(DATA_DIR, "ingested.jsonl"))
+INGEST_REJECTED = os.getenv("INGEST_REJECTED", INGEST_LOG + ".rejected")
+CATALOG_POLL_INTERVAL = float(os.getenv("CATALOG_POLL_INTERVAL", 2))
+
+TFIDF_PARAMS = {"stop_words": "english", "min_df": 1}
+
+def read_ingest_log(start=0):
+    """(records appended to INGEST_LOG after byte offset start, offset after the last full line).
+
+    Lines that are not valid movies are skipped and copied to INGEST_REJECTED
+    instead of failing the replay.
+    """
+    from utils.ingest import normalize_record
+
+    if not os.path.exists(INGEST_LOG):
+        return [], start
+    with open(INGEST_LOG, "rb") as f:
+        f.seek(start)
+        data = f.read()
+    data = data[:data.rfind(b"\n") + 1]     # a line still being appended is left for later
+    records, rejected, offset = [], [], start
+    for line in data.splitlines(keepends=True):
+        if line.strip():
+            try:
+                records.append(normalize_record(json.loads(line)))
+            except ValueError as e:
+                rejected.append({"offset": offset, "error": str(e), "line": line.decode(errors="replace").rstrip()})
+        offset += len(line)
+    if rejected:
+        quarantine_ingest_lines(rejected)
+    return records, start + len(data)
+
+def quarantine_ingest_lines(rejected):
+    """Append rejected INGEST_LOG lines to INGEST_REJECTED, once per log offset."""
+    seen = set()
+    if os.path.exists(INGEST_REJECTED):
+        with open(INGEST_REJECTED) as f:
+            seen = {json.loads(line)["offset"] for line in f if line.strip()}
+    new = [r for r in rejected if r["offset"] not in seen]
+    if new:
+        with open(INGEST_REJECTED, "a") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in new))
+        for r in new:
+            print(f"Skipped ingest log line at offset {r['offset']}: {r['error']}")
+
+def ingest_log_size():
+    try:
+        return os.path.getsize(INGEST_LOG)
+    except OSError:
+        return 0
+
+def upsert_rows(movies_df, new_rows):
+    """Replace rows whose id already exists (in place) and append the rest.
+
+    Returns (frame, changed positions, replaced positions, order) where new_rows
+    are deduplicated by id (last wins) and row i of the new frame came from row
+    order[i] of movies_df followed by new_rows.
+    """
+    new_rows = new_rows.drop_duplicates("id", keep="last").reset_index(drop=True)
+    existing = MovieIdIndex.build(movies_df["id"].to_numpy())
+    n = len(movies_df)
+    order = list(range(n))
+    updated, changed = [], []
+    for i, movie_id in enumerate(new_rows["id"].tolist()):
+        pos = existing.position(int(movie_id))
+        if pos is None:
+            changed.append(len(order))
+            order.append(n + i)
+        else:
+            order[pos] = n + i
+            updated.append(pos)
+            changed.append(pos)
+    combined = pd.concat([movies_df, new_rows[movies_df.columns.intersection(new_rows.columns)]],
+                         ignore_index=True)
+    return combined.iloc[order].reset_index(drop=True), changed, updated, order
 
 def load_data():
-    movies = pd.read_csv(MOVIES_CSV)
-    credits = pd.read_csv(CREDITS_CSV)
-    credits.rename(columns={"movie_id": "id"}, inplace=True)
+    """CSVs merged, with INGEST_LOG applied. Returns (frame, log offset consumed).
+
+    Only the columns the app reads are loaded; cast/crew arrive already reduced
+    to cast_clean/crew_clean (see utils.preprocess).
+    """
+    movies = read_movies(MOVIES_CSV)
+    credits = read_credits(CREDITS_CSV)
     merged = movies.merge(credits, on="id")
-    merged.rename(columns={"title_x": "title"}, inplace=True)
-    return merged
+    records, log_offset = read_ingest_log()
+    if records:
+        merged = upsert_rows(merged, prepare_frame(pd.DataFrame(records)))[0]
+    return merged, log_offset
 
-def preprocess_movies(movies_df):
-    for col in ['overview', 'genres', 'cast', 'crew']:
-        movies_df[col] = movies_df[col].fillna("")
+def prepare_frame(movies_df, workers=PREPROCESS_WORKERS):
+    """Add the derived columns (year, *_clean, text_features) the indexes are built from.
+
+    Raw cast/crew blobs, where present, are replaced by their *_clean names
+    (parsed by up to `workers` processes).
+    """
+    for col in ['overview', 'genres']:
+        movies_df[col] = movies_df[col].astype(object).fillna("")
     movies_df['year'] = pd.to_datetime(
         movies_df['release_date'], errors='coerce'
     ).dt.year.fillna(0).astype(int)
 
-    def clean_text(x):
-        try:
-            return " ".join([i['name'] for i in literal_eval(x)]) if x else ""
-        except:
-            return ""
-
-    movies_df['cast_clean'] = movies_df['cast'].apply(clean_text)
-    movies_df['crew_clean'] = movies_df['crew'].apply(clean_text)
-    movies_df['genres_clean'] = movies_df['genres'].apply(clean_text)
+    for col in ['cast', 'crew']:
+        if col in movies_df:
+            movies_df[f'{col}_clean'] = clean_names(movies_df.pop(col).tolist(), workers)
+        else:
+            movies_df[f'{col}_clean'] = movies_df[f'{col}_clean'].fillna("")
+    movies_df['genres_clean'] = [" ".join(parse_names(g)) for g in movies_df['genres']]
 
     movies_df['text_features'] = (
         movies_df['overview'] + " " +
@@ -41,12 +139,196 @@ def preprocess_movies(movies_df):
         movies_df['cast_clean'] + " " +
         movies_df['crew_clean']
     )
+    return movies_df
+
+def preprocess_movies(movies_df):
+    # sklearn is only needed when (re)building artifacts; keep it off the cold-start path
+    from sklearn.feature_extraction.text import TfidfVectorizer
 
-    tfidf = TfidfVectorizer(stop_words='english', min_df=1)
+    movies_df = prepare_frame(movies_df)
+    tfidf = TfidfVectorizer(**TFIDF_PARAMS)
     tfidf_matrix = tfidf.fit_transform(movies_df['text_features'])
-    cosine_sim = cosine_similarity(tfidf_matrix, tfidf_matrix)
+    neighbor_index = build_neighbor_index(tfidf_matrix)
+
+    return movies_df, tfidf, tfidf_matrix, neighbor_index
+
+# ----------------------------
+# Artifact cache and catalog snapshots
+# ----------------------------
+# The CSVs (plus INGEST_LOG at build time) produce the base snapshot
+# <ARTIFACT_DIR>/<key>/. utils.ingest derives later generations <key>.g<N>/
+# from it and points <key>.current at the newest one. Every worker polls that
+# pointer and swaps the new Catalog in; requests hold on to the Catalog they
+# started with, so nothing is dropped mid-swap.
+
+def artifact_store():
+    params = {"tfidf": TFIDF_PARAMS, "neighbor_k": NEIGHBOR_K, "embedding_dim": EMBEDDING_DIM}
+    return open_store(ARTIFACT_DIR, [MOVIES_CSV, CREDITS_CSV], params)
+
+def pointer_path(base):
+    return f"{base.path}.current"
+
+def current_store(base=None):
+    """The newest published snapshot for the current CSVs (the base one if nothing was ingested)."""
+    base = base or artifact_store()
+    try:
+        with open(pointer_path(base)) as f:
+            store = ArtifactStore(os.path.join(os.path.dirname(base.path), f.read().strip()))
+        if store.exists():
+            return store
+    except OSError:
+        pass
+    return base
+
+def write_snapshot(staging, movies_df, tfidf, tfidf_matrix, neighbor_index, meta,
+                   embeddings=None, components=None, ann_index=None):
+    """Save a snapshot: the frame plus every index the routes read, as flat mmap-able files."""
+    movies_df = compact_frame(movies_df.drop(columns=["text_features", "genres_clean"], errors="ignore"))
+    staging.save_frame("movies", movies_df)
+    staging.save_object("tfidf_vectorizer", tfidf)
+    staging.save_csr("tfidf_matrix", tfidf_matrix)
+    staging.save_array("neighbor_indices", neighbor_index.indices)
+    staging.save_array("neighbor_scores", neighbor_index.scores)
+    genre_index = TermIndex.from_column(movies_df["genres"])
+    genre_index.save(staging, "genre_index")
+    TermIndex.from_column(movies_df["keywords"].fillna("")).save(staging, "keyword_index")
+    SearchIndex.from_frame(movies_df).save(staging, "search_index")
+    MovieIdIndex.from_frame(movies_df).save(staging, "id_index")
+    PopularityIndex.from_frame(movies_df, genre_index).save(staging, "popularity")
+    RangeFilterIndex.from_frame(movies_df).save(staging, "filter_index")
+    MoviePayloads.build(movies_df).save(staging, "payloads")
+    if embeddings is None and EMBEDDING_DIM > 0:
+        embeddings, components = build_embeddings(tfidf_matrix, EMBEDDING_DIM)
+        ann_index = IVFIndex.build(embeddings)
+    if embeddings is not None:
+        staging.save_array("embeddings", embeddings)
+        staging.save_array("svd_components", components)
+        ann_index.save(staging, "ann_index")
+    staging.save_json("snapshot", meta)
+
+def fresh_meta(n_rows, log_offset, generation=0):
+    return {"generation": generation, "log_offset": log_offset, "fit_rows": n_rows,
+            "rows_since_fit": 0, "oov_tokens": 0, "total_tokens": 0}
+
+def build_artifacts(store):
+    with store.build() as staging:
+        if staging is None:
+            return
+        movies_df, log_offset = load_data()
+        movies_df, tfidf, tfidf_matrix, neighbor_index = preprocess_movies(movies_df)
+        write_snapshot(staging, movies_df, tfidf, tfidf_matrix, neighbor_index,
+                       fresh_meta(len(movies_df), log_offset))
+
+class Catalog:
+    """Everything the routes read, attached to one artifact snapshot.
+
+    Apart from small vocabularies every structure is a view over the snapshot's
+    memory-mapped files, so any number of workers share one copy of the catalog
+    through the page cache. The frame itself is only read if something asks
+    for movies_df, so the catalog stays attached to its snapshot (see
+    ArtifactStore.attach) until it is garbage collected.
+    """
+
+    def __init__(self, store, meta, tfidf_matrix, neighbor_index, genre_index, keyword_index, search_index,
+                 retriever, movie_index, popularity, ranges, payloads):
+        self.store = store
+        self.meta = meta
+        self.tfidf_matrix = tfidf_matrix
+        self.neighbor_index = neighbor_index
+        self.genre_index = genre_index
+        self.keyword_index = keyword_index
+        self.search_index = search_index
+        self.retriever = retriever
+        self.movie_index = movie_index
+        self.popularity = popularity
+        self.payloads = payloads
+        self.n_rows = len(payloads)
+        self.form_filter = FormFilter(ranges, genre_index, popularity, retriever)
+        self.user_profiles = ProfileStore(tfidf_matrix, movie_index, retriever, popularity)
+        self._movies_df = None
+        weakref.finalize(self, store.attach().close)
+
+    @property
+    def movies_df(self):
+        if self._movies_df is None:
+            self._movies_df = self.store.load_frame("movies")
+        return self._movies_df
+
+def load_catalog(store=None):
+    """Attach to a snapshot (default: the newest one for the current CSVs), building it first if needed."""
+    if store is None:
+        base = artifact_store()
+        if not base.exists():
+            build_artifacts(base)
+        store = current_store(base)
+    n_rows = len(store.load_array("payloads.ids"))
+    tfidf_matrix = store.load_csr("tfidf_matrix")
+    neighbor_index = NeighborIndex(
+        store.load_array("neighbor_indices"), store.load_array("neighbor_scores"), tfidf_matrix
+    )
+    genre_index = TermIndex.load(store, "genre_index", n_rows)
+    keyword_index = TermIndex.load(store, "keyword_index", n_rows)
+    search_index = SearchIndex.load(store, "search_index", n_rows)
+
+    embeddings = components = ann_index = None
+    if store.has("embeddings.npy"):
+        embeddings = store.load_array("embeddings")
+        components = store.load_array("svd_components")
+        ann_index = IVFIndex.load(store, "ann_index", embeddings)
+    retriever = Retriever(RETRIEVAL_MODE, tfidf_matrix, neighbor_index, embeddings, components, ann_index)
+    meta = store.load_json("snapshot") if store.has("snapshot.json") else fresh_meta(n_rows, 0)
+    return Catalog(store, meta, tfidf_matrix, neighbor_index, genre_index, keyword_index, search_index,
+                   retriever, MovieIdIndex.load(store, "id_index"), PopularityIndex.load(store, "popularity"),
+                   RangeFilterIndex.load(store, "filter_index"), MoviePayloads.load(store, "payloads"))
+
+def load_vectorizer(store=None):
+    return (store or current_store()).load_object("tfidf_vectorizer")
+
+# ----------------------------
+# The live catalog
+# ----------------------------
+_catalog = None
+_catalog_lock = threading.Lock()
+_watcher_pid = None
+
+def set_catalog(catalog):
+    """Publish a catalog to this process; in-flight requests keep the one they hold."""
+    global _catalog
+    _catalog = catalog
+
+def get_catalog():
+    """The catalog to use for one request: read it once and keep using that object."""
+    if _watcher_pid != os.getpid():
+        _start_watcher()
+    return _catalog
+
+def _start_watcher():
+    global _watcher_pid
+    with _catalog_lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+    if CATALOG_POLL_INTERVAL > 0:
+        threading.Thread(target=_watch, name="catalog-watcher", daemon=True).start()
+
+def _watch():
+    while True:
+        time.sleep(CATALOG_POLL_INTERVAL)
+        try:
+            store = current_store()
+            if store.path != _catalog.store.path:
+                set_catalog(load_catalog(store))
+                print(f"Catalog swapped to {os.path.basename(store.path)}")
+        except Exception as e:
+            print(f"Failed to reload catalog: {e}")
 
-    return movies_df, tfidf_matrix, cosine_sim
+def _initial_catalog():
+    catalog = load_catalog()
+    if ingest_log_size() > catalog.meta.get("log_offset", 0):
+        # another process appended movies since this snapshot was written
+        from utils.ingest import ingest_pending
+        catalog = ingest_pending(catalog) or catalog
+    return catalog
 
 
-movies_df, tfidf_matrix, cosine_sim = preprocess_movies(load_data())
+set_catalog(_initial_catalog())
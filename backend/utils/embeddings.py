@@ -0,0 +1,354 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import asyncio
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import openai
+
+from config import OPENAI_API_EMBEDDING
+from utils.ann import normalize_rows
+from utils.cache import CACHE_DIR, MISSING, TTLCache
+from utils.inverted_index import parse_names
+from utils.metrics import EXTERNAL_ERRORS, EXTERNAL_SECONDS, registry, stage
+from utils.recommender import top_n_positions
+
+# ----------------------------
+# Semantic search over embedding-deployment vectors
+# ----------------------------
+# Every movie's text (title, year, genres, keywords, overview) is embedded once,
+# offline, in batches of EMBED_BATCH_SIZE with EMBED_CONCURRENCY requests in
+# flight. The vectors are kept per deployment under EMBED_DIR as append-only
+# flat files that every worker memory-maps:
+#   ids.i64, hashes.u64, vectors.f32 (unit length) and meta.json (dim, count).
+# A top-up embeds only movies that have no row yet or whose text hash changed,
+# and appends them; the newest row of an id wins. Readers only look at the
+# first meta["count"] rows, so an append is published by replacing meta.json.
+#
+# A search embeds the query (LRU-cached per process), scores all rows with one
+# mat-vec and keeps the top K rows that belong to the current catalog snapshot.
+# Routes fall back to BM25 when no deployment or no vectors are configured.
+#
+#   python -m utils.embeddings            # embed new / changed movies
+#   python -m utils.embeddings --rebuild  # re-embed everything
+
+EMBED_DIR = os.getenv("EMBED_DIR", os.path.join(CACHE_DIR, "embeddings"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", 4))
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", 30))
+EMBED_QUERY_CACHE_SIZE = int(os.getenv("EMBED_QUERY_CACHE_SIZE", 10000))
+EMBED_MAX_CHARS = 2000
+QUERY_TTL = 7 * 24 * 3600
+
+
+def movie_text(movie):
+    """What gets embedded for one movie (a row of movies_df)."""
+    parts = [f"{movie['title']} ({movie['year']})"]
+    genres = parse_names(movie.get("genres") or "")
+    if genres:
+        parts.append("Genres: " + ", ".join(genres))
+    keywords = parse_names(movie.get("keywords") or "")
+    if keywords:
+        parts.append("Keywords: " + ", ".join(keywords))
+    overview = " ".join(str(movie.get("overview") or "").split())
+    if overview:
+        parts.append(overview)
+    return ". ".join(parts)[:EMBED_MAX_CHARS]
+
+
+def text_hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+def _vectors(response):
+    data = sorted(response["data"], key=lambda d: d["index"])
+    return normalize_rows(np.asarray([d["embedding"] for d in data], dtype=np.float32))
+
+
+def embed_texts(texts, deployment=OPENAI_API_EMBEDDING, timeout=EMBED_TIMEOUT):
+    """(len(texts), dim) unit vectors from one embeddings request; raises on failure."""
+    try:
+        with EXTERNAL_SECONDS.time("openai"):
+            response = openai.Embedding.create(input=list(texts), engine=deployment, request_timeout=timeout)
+    except Exception:
+        EXTERNAL_ERRORS.inc("openai")
+        raise
+    return _vectors(response)
+
+
+async def aembed_texts(texts, deployment=OPENAI_API_EMBEDDING, timeout=EMBED_TIMEOUT):
+    try:
+        with EXTERNAL_SECONDS.time("openai"):
+            response = await openai.Embedding.acreate(input=list(texts), engine=deployment, request_timeout=timeout)
+    except Exception:
+        EXTERNAL_ERRORS.inc("openai")
+        raise
+    return _vectors(response)
+
+
+# ----------------------------
+# Append-only vector files
+# ----------------------------
+class EmbeddingStore:
+    FILES = {"ids": np.int64, "hashes": np.uint64, "vectors": np.float32}
+    SUFFIX = {"ids": "i64", "hashes": "u64", "vectors": "f32"}
+
+    def __init__(self, path):
+        self.path = path
+        self._view = None
+        self._view_key = None
+        self._lock = threading.Lock()
+
+    def file(self, name):
+        return os.path.join(self.path, f"{name}.{self.SUFFIX[name]}" if name in self.SUFFIX else name)
+
+    def meta(self):
+        try:
+            with open(self.file("meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"dim": 0, "count": 0}
+
+    def view(self):
+        """(ids, hashes, vectors, meta) memory-mapped up to meta["count"]; re-opened after an append."""
+        try:
+            stat = os.stat(self.file("meta.json"))
+        except OSError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if self._view_key != key:
+                meta = self.meta()
+                count, dim = meta["count"], meta["dim"]
+                if not count:
+                    return None
+                self._view = (
+                    np.memmap(self.file("ids"), dtype=np.int64, mode="r", shape=(count,)),
+                    np.memmap(self.file("hashes"), dtype=np.uint64, mode="r", shape=(count,)),
+                    np.memmap(self.file("vectors"), dtype=np.float32, mode="r", shape=(count, dim)),
+                    meta,
+                )
+                self._view_key = key
+            return self._view
+
+    def latest_hashes(self):
+        """{movie_id: text hash of its newest row}."""
+        view = self.view()
+        if view is None:
+            return {}
+        ids, hashes = np.asarray(view[0]), np.asarray(view[1])
+        return dict(zip(ids.tolist(), hashes.tolist()))
+
+    def lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        return _FileLock(os.path.join(self.path, "lock"))
+
+    def append(self, ids, hashes, vectors):
+        """Append rows and publish them; call with lock() held."""
+        meta = self.meta()
+        count, dim = meta["count"], meta["dim"] or vectors.shape[1]
+        if vectors.shape[1] != dim:
+            raise ValueError(f"Embedding size changed from {dim} to {vectors.shape[1]}; run with --rebuild")
+        columns = {"ids": np.asarray(ids, dtype=np.int64), "hashes": np.asarray(hashes, dtype=np.uint64),
+                   "vectors": np.asarray(vectors, dtype=np.float32)}
+        for name, values in columns.items():
+            width = np.dtype(self.FILES[name]).itemsize * (dim if name == "vectors" else 1)
+            with open(self.file(name), "ab") as f:
+                f.truncate(count * width)       # drop rows of an append that never got published
+                f.write(values.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        tmp = self.file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"dim": dim, "count": count + len(columns["ids"])}, f)
+        os.replace(tmp, self.file("meta.json"))
+
+    def clear(self):
+        """Forget every row; call with lock() held."""
+        # unlink rather than truncate: workers still mapping the old files keep them
+        for name in self.FILES:
+            try:
+                os.remove(self.file(name))
+            except FileNotFoundError:
+                pass
+        tmp = self.file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"dim": 0, "count": 0}, f)
+        os.replace(tmp, self.file("meta.json"))
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.f = open(self.path, "w")
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+
+# ----------------------------
+# Search
+# ----------------------------
+class SemanticIndex:
+    def __init__(self, deployment=OPENAI_API_EMBEDDING, root=EMBED_DIR, cache_size=EMBED_QUERY_CACHE_SIZE):
+        self.deployment = deployment
+        self.store = EmbeddingStore(os.path.join(root, deployment or "default"))
+        self.queries = TTLCache(cache_size)
+        self.stats = {"query_hits": 0, "query_misses": 0, "errors": 0}
+        self._rows = None
+        self._rows_key = None
+        self._lock = threading.Lock()
+        self._top_up_running = False
+
+    def available(self):
+        return bool(self.deployment) and self.store.view() is not None
+
+    def row_positions(self, cat, view):
+        """Catalog position of every stored row; -1 for superseded rows and ids not in the catalog."""
+        key = (cat.store.path, view[3]["count"])
+        with self._lock:
+            if self._rows_key != key:
+                ids = np.asarray(view[0])
+                # newest row per id: first occurrence in the reversed array
+                _, last = np.unique(ids[::-1], return_index=True)
+                last = len(ids) - 1 - last
+                rows = np.full(len(ids), -1, dtype=np.int32)
+                rows[last] = cat.movie_index.position_array(ids[last])
+                self._rows, self._rows_key = rows, key
+            return self._rows
+
+    def _cached_query(self, text):
+        key = " ".join(text.split()).casefold()
+        vector = self.queries.get(key)
+        if vector is MISSING:
+            self.stats["query_misses"] += 1
+        else:
+            self.stats["query_hits"] += 1
+        return key, vector
+
+    def embed_query(self, text):
+        key, vector = self._cached_query(text)
+        if vector is MISSING:
+            vector = embed_texts([key], self.deployment)[0]
+            self.queries.set(key, vector, QUERY_TTL)
+        return vector
+
+    async def aembed_query(self, text):
+        key, vector = self._cached_query(text)
+        if vector is MISSING:
+            vector = (await aembed_texts([key], self.deployment))[0]
+            self.queries.set(key, vector, QUERY_TTL)
+        return vector
+
+    def search_vector(self, cat, vector, top_n):
+        """Catalog positions of the top_n rows closest to a unit query vector, best first."""
+        view = self.store.view()
+        rows = self.row_positions(cat, view)
+        with stage("similarity_scoring"):
+            scores = view[2] @ np.asarray(vector, dtype=np.float32)
+        with stage("ranking"):
+            best, _ = top_n_positions(scores, top_n, rows < 0)
+        return rows[best]
+
+    def search(self, cat, query, top_n):
+        """Positions for a free-text query, or None when semantic search is unavailable."""
+        if not self.available():
+            return None
+        try:
+            return self.search_vector(cat, self.embed_query(query), top_n)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Semantic search failed, falling back to keyword search: {e}")
+            return None
+
+    async def asearch(self, cat, query, top_n):
+        if not self.available():
+            return None
+        try:
+            vector = await self.aembed_query(query)
+            return await asyncio.to_thread(self.search_vector, cat, vector, top_n)
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"Semantic search failed, falling back to keyword search: {e}")
+            return None
+
+    # -- offline embedding ---------------------------------------------
+    def top_up(self, cat, rebuild=False, batch_size=EMBED_BATCH_SIZE, concurrency=EMBED_CONCURRENCY):
+        """Embed catalog movies without a current vector. Returns (embedded, unchanged)."""
+        if not self.deployment:
+            raise ValueError("OPENAI_API_EMBEDDING is not set")
+        movies = cat.movies_df[["id", "title", "year", "genres", "keywords", "overview"]]
+        texts = [movie_text(m) for m in movies.to_dict(orient="records")]
+        hashes = [text_hash(t) for t in texts]
+        ids = movies["id"].tolist()
+
+        with self.store.lock():
+            if rebuild:
+                self.store.clear()
+            known = self.store.latest_hashes()
+            todo = [i for i, (movie_id, h) in enumerate(zip(ids, hashes)) if known.get(movie_id) != h]
+            batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+
+            def embed(batch):
+                return embed_texts([texts[i] for i in batch], self.deployment)
+
+            # results come back in order, so every appended batch is a durable checkpoint
+            with ThreadPoolExecutor(max(1, concurrency), thread_name_prefix="embed") as pool:
+                for batch, vectors in zip(batches, pool.map(embed, batches)):
+                    self.store.append([ids[i] for i in batch], [hashes[i] for i in batch], vectors)
+        return len(todo), len(ids) - len(todo)
+
+    def schedule_top_up(self):
+        """Run top_up() for the current catalog on a background thread unless one is running."""
+        from utils.data_loader import get_catalog
+
+        with self._lock:
+            if self._top_up_running or not self.deployment:
+                return False
+            self._top_up_running = True
+
+        def run():
+            try:
+                self.top_up(get_catalog())
+            except Exception as e:
+                print(f"Embedding top-up failed: {e}")
+            finally:
+                self._top_up_running = False
+
+        threading.Thread(target=run, name="embedding-top-up", daemon=True).start()
+        return True
+
+
+semantic_index = SemanticIndex()
+
+registry.callback(
+    "embedding_query_cache_lookups_total", "Query embedding lookups by outcome", "counter", ("result",),
+    lambda: {("hit",): semantic_index.stats["query_hits"], ("miss",): semantic_index.stats["query_misses"]},
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed the catalog with the OPENAI_API_EMBEDDING deployment")
+    parser.add_argument("--rebuild", action="store_true", help="re-embed every movie, not only new/changed ones")
+    args = parser.parse_args()
+    from utils.data_loader import get_catalog
+
+    start = time.perf_counter()
+    embedded, unchanged = semantic_index.top_up(get_catalog(), rebuild=args.rebuild)
+    print(f"Embedded {embedded} movies ({unchanged} unchanged) in {time.perf_counter() - start:.1f}s "
+          f"-> {semantic_index.store.path}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
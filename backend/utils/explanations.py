@@ -0,0 +1,172 @@
+import os
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from utils.ai_helpers import complete, popularity_prompt, similarity_prompt
+from utils.cache import CACHE_DIR, MISSING, SQLiteKVStore, TTLCache
+from utils.metrics import registry, stage
+
+# ----------------------------
+# LLM explanation service
+# ----------------------------
+# Explanations are cached per (movie_id, similar_id, prompt version) or
+# (movie_id, prompt version) in an LRU backed by SQLite. Misses are dispatched
+# to a bounded thread pool (or one batched prompt) and the endpoint waits at
+# most EXPLAIN_DEADLINE seconds: anything still running keeps going in the
+# background and lands in the cache for the next request.
+
+PROMPT_VERSION = "v1"
+EXPLAIN_CONCURRENCY = int(os.getenv("EXPLAIN_CONCURRENCY", 8))
+EXPLAIN_TIMEOUT = float(os.getenv("EXPLAIN_TIMEOUT", 15))
+EXPLAIN_DEADLINE = float(os.getenv("EXPLAIN_DEADLINE", 6))
+EXPLAIN_BATCHED = os.getenv("EXPLAIN_BATCHED", "0") == "1"
+EXPLAIN_CACHE_PATH = os.getenv("EXPLAIN_CACHE_PATH", os.path.join(CACHE_DIR, "explanations.sqlite"))
+EXPLAIN_TTL = 30 * 24 * 3600
+
+PENDING = "Explanation is being generated, check back shortly."
+
+
+def batch_prompt(prompts):
+    numbered = "\n\n".join(f"### Item {i + 1}\n{p.strip()}" for i, p in enumerate(prompts))
+    return f"""
+Answer each of the {len(prompts)} items below.
+Respond ONLY with a JSON array of {len(prompts)} strings, one short answer per item, in order.
+
+{numbered}
+"""
+
+
+class ExplanationService:
+    def __init__(self, concurrency=EXPLAIN_CONCURRENCY, timeout=EXPLAIN_TIMEOUT,
+                 batched=EXPLAIN_BATCHED, cache_path=EXPLAIN_CACHE_PATH, completer=complete):
+        self.timeout = timeout
+        self.batched = batched
+        self.complete = completer
+        self.cache = TTLCache(20000)
+        self.store = SQLiteKVStore(cache_path, "explanations") if cache_path else None
+        self.executor = ThreadPoolExecutor(concurrency, thread_name_prefix="explain")
+        self.stats = {"hits": 0, "misses": 0, "errors": 0}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    # -- cache ---------------------------------------------------------
+    def _cached(self, keys):
+        found = {}
+        for key in keys:
+            value = self.cache.get(key)
+            if value is not MISSING:
+                found[key] = value
+        rest = [k for k in keys if k not in found]
+        if rest and self.store is not None:
+            for key, value in self.store.get_many(rest).items():
+                self.cache.set(key, value, EXPLAIN_TTL)
+                found[key] = value
+        return found
+
+    def _remember(self, items):
+        for key, value in items:
+            self.cache.set(key, value, EXPLAIN_TTL)
+        if self.store is not None:
+            try:
+                self.store.set_many([(k, v, EXPLAIN_TTL) for k, v in items])
+            except Exception as e:
+                print(f"Failed to persist explanations: {e}")
+
+    # -- dispatch ------------------------------------------------------
+    def _run_one(self, key, prompt, max_tokens):
+        try:
+            text = self.complete(prompt, max_tokens=max_tokens, timeout=self.timeout)
+        except Exception as e:
+            self.stats["errors"] += 1
+            return f"Explanation not available ({str(e)})"
+        self._remember([(key, text)])
+        return text
+
+    def _run_batch(self, keys, prompts, max_tokens):
+        try:
+            reply = self.complete(batch_prompt(prompts), max_tokens=max_tokens * len(prompts), timeout=self.timeout)
+            texts = json.loads(reply[reply.find("["):reply.rfind("]") + 1])
+            if len(texts) != len(keys):
+                raise ValueError(f"expected {len(keys)} answers, got {len(texts)}")
+        except Exception as e:
+            self.stats["errors"] += 1
+            return {key: f"Explanation not available ({str(e)})" for key in keys}
+        texts = [str(t).strip() for t in texts]
+        self._remember(list(zip(keys, texts)))
+        return dict(zip(keys, texts))
+
+    def _submit(self, jobs, max_tokens):
+        """jobs: {key: prompt} -> {key: Future resolving to the text}. In-flight keys are shared."""
+        futures, fresh = {}, {}
+        with self._lock:
+            for key, prompt in jobs.items():
+                if key in self._inflight:
+                    futures[key] = self._inflight[key]
+                else:
+                    fresh[key] = prompt
+
+            if self.batched and len(fresh) > 1:
+                keys = list(fresh)
+                targets = {key: Future() for key in keys}
+                for key in keys:
+                    futures[key] = self._inflight[key] = targets[key]
+                batch = self.executor.submit(self._run_batch, keys, list(fresh.values()), max_tokens)
+                batch.add_done_callback(lambda done: _fan_out(done, targets))
+            else:
+                for key, prompt in fresh.items():
+                    futures[key] = self._inflight[key] = self.executor.submit(self._run_one, key, prompt, max_tokens)
+
+        for key in fresh:
+            futures[key].add_done_callback(lambda _, key=key: self._forget(key))
+        return futures
+
+    def _forget(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def explain(self, jobs, max_tokens, deadline=EXPLAIN_DEADLINE):
+        """jobs: {cache_key: prompt}. Returns {cache_key: text}, never waiting past `deadline`."""
+        found = self._cached(list(jobs))
+        self.stats["hits"] += len(found)
+        missing = {k: p for k, p in jobs.items() if k not in found}
+        if not missing:
+            return found
+        self.stats["misses"] += len(missing)
+
+        futures = self._submit(missing, max_tokens)
+        with stage("llm_explanations"):
+            wait(list(futures.values()), timeout=deadline)
+        for key, future in futures.items():
+            found[key] = future.result() if future.done() else PENDING
+        return found
+
+    # -- public helpers ------------------------------------------------
+    def explain_similar(self, movie_main, similar_movies, deadline=EXPLAIN_DEADLINE):
+        keys = [f"sim:{movie_main['id']}:{m['id']}:{PROMPT_VERSION}" for m in similar_movies]
+        jobs = {key: similarity_prompt(movie_main, m) for key, m in zip(keys, similar_movies)}
+        found = self.explain(jobs, max_tokens=120, deadline=deadline)
+        return [found[key] for key in keys]
+
+    def explain_popular(self, movies, deadline=EXPLAIN_DEADLINE):
+        keys = [f"pop:{m['id']}:{PROMPT_VERSION}" for m in movies]
+        jobs = {key: popularity_prompt(m) for key, m in zip(keys, movies)}
+        found = self.explain(jobs, max_tokens=80, deadline=deadline)
+        return [found[key] for key in keys]
+
+
+def _fan_out(batch_future, targets):
+    """Resolve the per-key futures of a batched request."""
+    try:
+        texts = batch_future.result()
+    except Exception as e:
+        texts = {key: f"Explanation not available ({str(e)})" for key in targets}
+    for key, target in targets.items():
+        target.set_result(texts[key])
+
+
+explanation_service = ExplanationService()
+
+registry.callback(
+    "explanation_cache_lookups_total", "Explanation lookups by outcome", "counter", ("result",),
+    lambda: {(name,): value for name, value in explanation_service.stats.items()},
+)
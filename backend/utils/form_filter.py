@@ -0,0 +1,160 @@
+import os
+import numpy as np
+from utils.cache import MISSING, TTLCache
+from utils.inverted_index import split_terms
+from utils.metrics import stage
+
+# ----------------------------
+# Columnar range filters for /recommend/by_form_v2
+# ----------------------------
+# Each numeric filter field is kept as a contiguous float64 array plus the row
+# positions sorted by that field, so a range predicate is two searchsorted calls
+# and a slice. A query estimates every predicate's selectivity from those slice
+# lengths (the genre predicate from its posting list), starts from the most
+# selective one and checks the remaining predicates only on the rows that are
+# still alive. Hybrid scoring then touches just the survivors.
+
+FORM_CACHE_SIZE = int(os.getenv("FORM_CACHE_SIZE", 256))
+FORM_CACHE_TTL = 600
+FILTER_FIELDS = ("vote_average", "year", "budget")
+SIMILARITY_WEIGHT, POPULARITY_WEIGHT = 0.6, 0.4
+
+
+class SortedColumn:
+    def __init__(self, values, order, sorted_values):
+        self.values = values                # (N,) float64
+        self.order = order                  # (M,) int32 non-NaN positions sorted by value
+        self.sorted_values = sorted_values  # (M,) float64
+
+    @classmethod
+    def build(cls, values):
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(values))     # NaN never satisfies a range
+        order = valid[np.argsort(values[valid], kind="stable")].astype(np.int32)
+        return cls(values, order, values[order])
+
+    def bounds(self, lo, hi):
+        return (np.searchsorted(self.sorted_values, lo, side="left"),
+                np.searchsorted(self.sorted_values, hi, side="right"))
+
+    def range(self, lo, hi):
+        """Sorted positions with lo <= value <= hi."""
+        start, end = self.bounds(lo, hi)
+        return np.sort(self.order[start:end])
+
+    def contains(self, positions, lo, hi):
+        values = self.values[positions]
+        return (values >= lo) & (values <= hi)
+
+
+class RangeFilterIndex:
+    def __init__(self, columns):
+        self.columns = columns              # {field: SortedColumn}
+        self.n_rows = len(next(iter(self.columns.values())).values) if self.columns else 0
+
+    @classmethod
+    def from_frame(cls, movies_df, fields=FILTER_FIELDS):
+        return cls({name: SortedColumn.build(movies_df[name].to_numpy(dtype=np.float64)) for name in fields})
+
+    def select(self, ranges, candidates=None):
+        """Sorted positions matching every (lo, hi) range in `ranges` and, if given,
+        also in the sorted `candidates` array."""
+        plan = []
+        for name, (lo, hi) in ranges.items():
+            column = self.columns[name]
+            start, end = column.bounds(lo, hi)
+            if end - start < self.n_rows:       # a range covering every row filters nothing
+                plan.append((end - start, name, lo, hi))
+        plan.sort(key=lambda step: step[0])
+
+        if candidates is not None and (not plan or len(candidates) <= plan[0][0]):
+            positions = np.asarray(candidates, dtype=np.int32)
+        elif plan:
+            _, name, lo, hi = plan.pop(0)
+            positions = self.columns[name].range(lo, hi)
+            if candidates is not None:
+                positions = np.intersect1d(positions, candidates, assume_unique=True)
+        else:
+            positions = np.arange(self.n_rows, dtype=np.int32)
+
+        for _, name, lo, hi in plan:
+            if not len(positions):
+                break
+            positions = positions[self.columns[name].contains(positions, lo, hi)]
+        return positions
+
+    # -- persistence ---------------------------------------------------
+    def save(self, store, name):
+        store.save_json(f"{name}.fields", list(self.columns))
+        for field, column in self.columns.items():
+            store.save_array(f"{name}.{field}.values", column.values)
+            store.save_array(f"{name}.{field}.order", column.order)
+            store.save_array(f"{name}.{field}.sorted", column.sorted_values)
+
+    @classmethod
+    def load(cls, store, name):
+        return cls({
+            field: SortedColumn(
+                store.load_array(f"{name}.{field}.values"),
+                store.load_array(f"{name}.{field}.order"),
+                store.load_array(f"{name}.{field}.sorted"),
+            )
+            for field in store.load_json(f"{name}.fields")
+        })
+
+
+class FormFilter:
+    """Form query -> (positions, popularity scores), best hybrid score first."""
+
+    def __init__(self, ranges, genre_index, popularity, retriever, cache_size=FORM_CACHE_SIZE):
+        self.ranges = ranges
+        self.genre_index = genre_index
+        self.popularity = popularity
+        self.retriever = retriever
+        self.cache = TTLCache(cache_size)
+
+    @staticmethod
+    def cache_key(form, top_n):
+        genres = tuple(sorted(g.casefold() for g in split_terms(form.genre)))
+        return (form.min_rating, genres, form.genre_match, form.year_from, form.year_to,
+                form.budget_min, form.budget_max, top_n)
+
+    def select(self, form):
+        genres = split_terms(form.genre)
+        candidates = self.genre_index.select(genres, form.genre_match) if genres else None
+        return self.ranges.select({
+            "vote_average": (form.min_rating, np.inf),
+            "year": (form.year_from, form.year_to),
+            "budget": (form.budget_min, form.budget_max),
+        }, candidates)
+
+    def rank(self, positions, top_n):
+        if not len(positions):
+            return positions, np.empty(0, dtype=np.float64)
+        # anchor on the best-rated survivor (first one on ties, like idxmax)
+        top_idx = positions[np.argmax(self.ranges.columns["vote_average"].values[positions])]
+        with stage("similarity_scoring"):
+            sim_scores = self.retriever.similarity_to(top_idx, positions)
+        with stage("ranking"):
+            pop_scores = self.popularity.scores[positions]
+            pop_max = pop_scores.max()
+            hybrid = SIMILARITY_WEIGHT * sim_scores
+            if pop_max > 0:
+                hybrid = hybrid + POPULARITY_WEIGHT * (pop_scores / pop_max)
+            if top_n < len(positions):
+                part = np.argpartition(-hybrid, top_n - 1)[:top_n]
+            else:
+                part = np.arange(len(positions))
+            order = part[np.lexsort((positions[part], -hybrid[part]))]
+        return positions[order], pop_scores[order]
+
+    def recommend(self, form, top_n=20):
+        key = self.cache_key(form, top_n)
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            return cached
+        with stage("candidate_filtering"):
+            positions = self.select(form)
+        result = self.rank(positions, top_n)
+        self.cache.set(key, result, FORM_CACHE_TTL)
+        return result
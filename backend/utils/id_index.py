@@ -0,0 +1,111 @@
+import re
+import hashlib
+import numpy as np
+
+# ----------------------------
+# movie id -> row position
+# ----------------------------
+# Plain sorted arrays (no per-movie Python objects), so a snapshot's index can
+# be memory-mapped and shared by every worker. (title, year) lookups go through
+# a 64-bit hash of the normalized pair.
+
+def normalize_title(title):
+    return re.sub(r"\s+", " ", str(title)).strip().casefold()
+
+
+def title_key(title, year):
+    digest = hashlib.blake2b(f"{normalize_title(title)}\x00{int(year)}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class MovieIdIndex:
+    def __init__(self, sorted_ids, sorted_positions, title_keys=None, title_ids=None):
+        self.sorted_ids = sorted_ids                # (N,) int64
+        self.sorted_positions = sorted_positions    # (N,) int32
+        self.title_keys = title_keys                # (M,) uint64 sorted title_key()s
+        self.title_ids = title_ids                  # (M,) int64
+
+    @classmethod
+    def build(cls, ids, titles=None, years=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        # first occurrence wins, same as the old `movies_df['id'] == movie_id` scans
+        sorted_ids, first = np.unique(ids, return_index=True)
+        title_keys = title_ids = None
+        if titles is not None:
+            keys = np.fromiter((title_key(t, y) for t, y in zip(titles, years)), dtype=np.uint64, count=len(ids))
+            title_keys, first_title = np.unique(keys, return_index=True)
+            title_ids = ids[first_title]
+        return cls(sorted_ids, first.astype(np.int32), title_keys, title_ids)
+
+    @classmethod
+    def from_frame(cls, movies_df):
+        return cls.build(movies_df["id"].to_numpy(), movies_df["title"].to_numpy(), movies_df["year"].to_numpy())
+
+    def _slot(self, movie_id):
+        try:
+            movie_id = int(movie_id)
+        except (TypeError, ValueError):
+            return None
+        i = int(np.searchsorted(self.sorted_ids, movie_id))
+        return i if i < len(self.sorted_ids) and self.sorted_ids[i] == movie_id else None
+
+    def __contains__(self, movie_id):
+        return self._slot(movie_id) is not None
+
+    def position(self, movie_id):
+        """Row position of a movie id, or None."""
+        slot = self._slot(movie_id)
+        return None if slot is None else int(self.sorted_positions[slot])
+
+    def positions(self, movie_ids):
+        """Vectorised lookup; unknown ids are dropped, request order is kept."""
+        if not isinstance(movie_ids, np.ndarray):
+            movie_ids = np.fromiter(movie_ids, dtype=np.int64)
+        ids = movie_ids.astype(np.int64, copy=False)
+        if not len(ids) or not len(self.sorted_ids):
+            return np.empty(0, dtype=np.int32)
+        slots = np.searchsorted(self.sorted_ids, ids)
+        slots[slots == len(self.sorted_ids)] = 0
+        found = self.sorted_ids[slots] == ids
+        return self.sorted_positions[slots[found]]
+
+    def position_array(self, movie_ids):
+        """Like positions(), but aligned with movie_ids: -1 where an id is unknown."""
+        ids = np.asarray(movie_ids, dtype=np.int64)
+        out = np.full(len(ids), -1, dtype=np.int32)
+        if not len(ids) or not len(self.sorted_ids):
+            return out
+        slots = np.searchsorted(self.sorted_ids, ids)
+        slots[slots == len(self.sorted_ids)] = 0
+        found = self.sorted_ids[slots] == ids
+        out[found] = self.sorted_positions[slots[found]]
+        return out
+
+    def id_for_title(self, title, year):
+        """Movie id for a (title, year) pair, case- and whitespace-insensitive."""
+        if self.title_keys is None:
+            return None
+        try:
+            key = title_key(title, year)
+        except (TypeError, ValueError):
+            return None
+        i = int(np.searchsorted(self.title_keys, np.uint64(key)))
+        if i < len(self.title_keys) and int(self.title_keys[i]) == key:
+            return int(self.title_ids[i])
+        return None
+
+    # -- persistence ---------------------------------------------------
+    def save(self, store, name):
+        store.save_array(f"{name}.ids", self.sorted_ids)
+        store.save_array(f"{name}.positions", self.sorted_positions)
+        store.save_array(f"{name}.title_keys", self.title_keys)
+        store.save_array(f"{name}.title_ids", self.title_ids)
+
+    @classmethod
+    def load(cls, store, name):
+        return cls(
+            store.load_array(f"{name}.ids"),
+            store.load_array(f"{name}.positions"),
+            store.load_array(f"{name}.title_keys"),
+            store.load_array(f"{name}.title_ids"),
+        )
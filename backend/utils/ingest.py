@@ -0,0 +1,353 @@
+import os
+import sys
+import json
+import math
+import time
+import fcntl
+import shutil
+import argparse
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from utils.ann import normalize_rows
+from utils.artifacts import ArtifactStore
+from utils.neighbors import patch_neighbor_index
+
+# ----------------------------
+# Incremental catalog ingestion
+# ----------------------------
+# New or updated movies are appended to INGEST_LOG (the durable record, replayed
+# whenever the CSVs change and the base snapshot is rebuilt) and then applied
+# to the newest snapshot without refitting TF-IDF:
+#   * the rows are transformed with the existing vocabulary,
+#   * only the changed rows get fresh neighbor lists, and the other lists are
+#     patched (see utils.neighbors.patch_neighbor_index),
+#   * SVD embeddings are projected and assigned to the existing IVF centroids,
+#   * genre/keyword/BM25 indexes are rebuilt from the frame (linear, no fit).
+# The result is published as the next generation and every worker swaps to it.
+# Superseded generations are deleted once no process is attached to them (see
+# ArtifactStore.attach) and SNAPSHOT_GRACE seconds have passed.
+# Words the vocabulary does not know are counted; once that share or the number
+# of ingested rows gets too large, a full refit runs in the background.
+#
+# data_loader imports this module lazily and vice versa, so either can be the
+# entry point (`python -m utils.ingest` or the app).
+#
+#   python -m utils.ingest new_movies.jsonl     # or .json / .csv
+#   python -m utils.ingest --refit
+
+INGEST_TOKEN = os.getenv("INGEST_TOKEN", "")
+DRIFT_THRESHOLD = float(os.getenv("DRIFT_THRESHOLD", 0.1))     # share of out-of-vocabulary tokens
+REFIT_FRACTION = float(os.getenv("REFIT_FRACTION", 0.25))      # ingested rows / rows at last fit
+MIN_DRIFT_TOKENS = 1000
+KEEP_SNAPSHOTS = 3                                              # newest generations never pruned
+SNAPSHOT_GRACE = float(os.getenv("SNAPSHOT_GRACE", 60))         # seconds a superseded generation is kept
+
+JSON_COLUMNS = ("genres", "keywords", "cast", "crew")
+TEXT_COLUMNS = ("title", "overview", "release_date")
+NUMERIC_COLUMNS = {"id": int, "vote_count": int, "budget": int, "vote_average": float, "popularity": float,
+                   "runtime": float}
+DEFAULTS = {"overview": "", "release_date": "", "vote_average": 0.0, "vote_count": 0, "budget": 0,
+            "popularity": 0.0, **{col: "[]" for col in JSON_COLUMNS}}
+
+
+def _number(record, col, kind):
+    value = record[col]
+    try:
+        number = float(value)
+        if isinstance(value, bool) or not math.isfinite(number) or (kind is int and not number.is_integer()):
+            raise ValueError
+    except (TypeError, ValueError):
+        raise ValueError(f"{col} must be a number, got {value!r}") from None
+    return kind(number)
+
+
+def normalize_record(record):
+    """A movie in the merged CSV layout; list/dict fields are stored as JSON strings.
+
+    Raises ValueError for anything the catalog build could not use, so a bad
+    record never reaches INGEST_LOG.
+    """
+    if not isinstance(record, dict) or "id" not in record or not str(record.get("title", "")).strip():
+        raise ValueError(f"A movie needs an id and a title: {record!r}")
+    movie = {**DEFAULTS, **{k: v for k, v in record.items() if v is not None}}
+    for col, kind in NUMERIC_COLUMNS.items():
+        if col in movie:
+            movie[col] = _number(movie, col, kind)
+    for col in TEXT_COLUMNS:
+        movie[col] = str(movie[col])
+    for col in JSON_COLUMNS:
+        if isinstance(movie[col], (list, dict)):
+            movie[col] = json.dumps(movie[col])
+        elif not isinstance(movie[col], str):
+            raise ValueError(f"{col} must be a list or a JSON string, got {movie[col]!r}")
+    return movie
+
+
+@contextmanager
+def ingest_lock(base):
+    os.makedirs(os.path.dirname(base.path), exist_ok=True)
+    with open(f"{base.path}.ingest.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _ensure_base(base):
+    from utils import data_loader
+    if not base.exists():
+        data_loader.build_artifacts(base)
+
+
+def _next_store(base, meta):
+    store = ArtifactStore(f"{base.path}.g{meta['generation'] + 1}")
+    shutil.rmtree(store.path, ignore_errors=True)     # leftover of a crashed run, never published
+    return store
+
+
+def _publish(base, store):
+    from utils import data_loader
+    pointer = data_loader.pointer_path(base)
+    with open(f"{pointer}.tmp", "w") as f:
+        f.write(os.path.basename(store.path))
+    os.replace(f"{pointer}.tmp", pointer)
+    _prune(base)
+
+
+def _prune(base):
+    """Delete old generations nobody is attached to.
+
+    Mapped files would survive the delete, but the frame and the vectorizer are
+    opened lazily, so a generation stays while any catalog still uses it.
+    """
+    prefix = os.path.basename(base.path) + ".g"
+    root = os.path.dirname(base.path)
+    generations = sorted(
+        int(name[len(prefix):]) for name in os.listdir(root)
+        if name.startswith(prefix) and name[len(prefix):].isdigit()
+    )
+    for generation, successor in zip(generations[:-KEEP_SNAPSHOTS], generations[1:]):
+        try:
+            superseded = os.path.getmtime(os.path.join(root, f"{prefix}{successor}"))
+        except OSError:
+            continue
+        if time.time() - superseded < SNAPSHOT_GRACE:
+            continue
+        path = os.path.join(root, f"{prefix}{generation}")
+        with ArtifactStore(path).detached() as unused:
+            if not unused:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            for suffix in (".lock", ".ref"):
+                try:
+                    os.remove(path + suffix)
+                except OSError:
+                    pass
+
+
+def vocabulary_drift(tfidf, texts):
+    """(out-of-vocabulary tokens, total tokens) in `texts`."""
+    analyzer = tfidf.build_analyzer()
+    vocabulary = tfidf.vocabulary_
+    oov = total = 0
+    for text in texts:
+        tokens = analyzer(text)
+        total += len(tokens)
+        oov += sum(1 for t in tokens if t not in vocabulary)
+    return oov, total
+
+
+def needs_refit(meta):
+    drifted = meta["total_tokens"] >= MIN_DRIFT_TOKENS and \
+        meta["oov_tokens"] / meta["total_tokens"] > DRIFT_THRESHOLD
+    grown = meta["rows_since_fit"] > REFIT_FRACTION * max(meta["fit_rows"], 1)
+    return drifted or grown
+
+
+def apply_records(store, staging, records, meta):
+    """Write `store` + `records` into `staging` without refitting. Returns the new meta."""
+    from utils import data_loader
+
+    new_rows = pd.DataFrame([normalize_record(r) for r in records])
+    # serial: this runs on the admin route, and forking a pool from a threaded server is unsafe
+    new_rows = data_loader.prepare_frame(new_rows.drop_duplicates("id", keep="last").reset_index(drop=True),
+                                         workers=1)
+    movies_df = store.load_frame("movies")
+    movies_df, changed, updated, order = data_loader.upsert_rows(movies_df, new_rows)
+
+    tfidf = store.load_object("tfidf_vectorizer")
+    new_matrix = tfidf.transform(new_rows["text_features"])
+    tfidf_matrix = sparse.vstack([store.load_csr("tfidf_matrix"), new_matrix]).tocsr()[order]
+    tfidf_matrix.sort_indices()
+
+    neighbor_index = data_loader.NeighborIndex(
+        store.load_array("neighbor_indices", mmap=False), store.load_array("neighbor_scores", mmap=False), None
+    )
+    neighbor_index = patch_neighbor_index(neighbor_index, tfidf_matrix, changed, updated)
+
+    embeddings = components = ann_index = None
+    if store.has("embeddings.npy"):
+        old = store.load_array("embeddings", mmap=False)
+        components = store.load_array("svd_components", mmap=False)
+        new_embeddings = normalize_rows(np.asarray(new_matrix @ components.T))
+        embeddings = np.vstack([old, new_embeddings])[order]
+        ivf = data_loader.IVFIndex.load(store, "ann_index", old)
+        labels = np.concatenate([ivf.labels(), ivf.assign(new_embeddings)])[order]
+        ann_index = data_loader.IVFIndex.from_labels(embeddings, np.asarray(ivf.centroids), labels)
+
+    oov, total = vocabulary_drift(tfidf, new_rows["text_features"])
+    new_meta = {
+        **meta,
+        "generation": meta["generation"] + 1,
+        "rows_since_fit": meta["rows_since_fit"] + len(new_rows),
+        "oov_tokens": meta["oov_tokens"] + oov,
+        "total_tokens": meta["total_tokens"] + total,
+    }
+    data_loader.write_snapshot(staging, movies_df, tfidf, tfidf_matrix, neighbor_index, new_meta,
+                               embeddings, components, ann_index)
+    return new_meta
+
+
+def _apply_pending(base):
+    """Apply whatever INGEST_LOG holds beyond the newest snapshot. Call with the ingest lock held."""
+    from utils import data_loader
+
+    _ensure_base(base)
+    store = data_loader.current_store(base)
+    meta = store.load_json("snapshot") if store.has("snapshot.json") else data_loader.fresh_meta(0, 0)
+    records, log_offset = data_loader.read_ingest_log(meta["log_offset"])
+    if not records:
+        return data_loader.load_catalog(store)
+    target = _next_store(base, meta)
+    with target.build() as staging:
+        apply_records(store, staging, records, {**meta, "log_offset": log_offset})
+    _publish(base, target)
+    return data_loader.load_catalog(target)
+
+
+def ingest(records):
+    """Append movies to INGEST_LOG, publish a new snapshot and swap it into this process."""
+    from utils import data_loader
+
+    lines = "".join(json.dumps(normalize_record(r)) + "\n" for r in records)
+    base = data_loader.artifact_store()
+    with ingest_lock(base):
+        with open(data_loader.INGEST_LOG, "a") as f:
+            end = f.tell()
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            catalog = _apply_pending(base)
+        except Exception:
+            # nothing was published: take the records back out so replays never see them
+            with open(data_loader.INGEST_LOG, "r+") as f:
+                f.truncate(end)
+            raise
+    data_loader.set_catalog(catalog)
+    if needs_refit(catalog.meta):
+        schedule_refit()
+    return catalog
+
+
+def ingest_pending(catalog=None):
+    """Catch up with records another process appended; returns the new catalog or None."""
+    from utils import data_loader
+
+    base = data_loader.artifact_store()
+    with ingest_lock(base):
+        latest = _apply_pending(base)
+    if catalog is not None and latest.store.path == catalog.store.path:
+        return None
+    if needs_refit(latest.meta):
+        schedule_refit()
+    return latest
+
+
+# ----------------------------
+# Full refit
+# ----------------------------
+_refit_lock = threading.Lock()
+_refit_running = False
+
+
+def refit():
+    """Refit TF-IDF and rebuild every index from the newest snapshot's movies."""
+    from utils import data_loader
+
+    base = data_loader.artifact_store()
+    with ingest_lock(base):
+        _ensure_base(base)
+        store = data_loader.current_store(base)
+        meta = store.load_json("snapshot")
+        movies_df = store.load_frame("movies")
+        movies_df, tfidf, tfidf_matrix, neighbor_index = data_loader.preprocess_movies(movies_df)
+        target = _next_store(base, meta)
+        with target.build() as staging:
+            data_loader.write_snapshot(
+                staging, movies_df, tfidf, tfidf_matrix, neighbor_index,
+                data_loader.fresh_meta(len(movies_df), meta["log_offset"], meta["generation"] + 1),
+            )
+        _publish(base, target)
+        catalog = data_loader.load_catalog(target)
+    data_loader.set_catalog(catalog)
+    return catalog
+
+
+def schedule_refit():
+    """Run refit() on a background thread unless one is already running."""
+    global _refit_running
+    with _refit_lock:
+        if _refit_running:
+            return False
+        _refit_running = True
+
+    def run():
+        global _refit_running
+        try:
+            refit()
+        except Exception as e:
+            print(f"Background refit failed: {e}")
+        finally:
+            _refit_running = False
+
+    threading.Thread(target=run, name="catalog-refit", daemon=True).start()
+    return True
+
+
+def read_records(path):
+    if path.endswith(".csv"):
+        df = pd.read_csv(path)
+        return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    with open(path) as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    return data if isinstance(data, list) else [data]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add or update movies in the live catalog")
+    parser.add_argument("path", nargs="?", help=".jsonl, .json or .csv file of movies (merged CSV layout)")
+    parser.add_argument("--refit", action="store_true", help="refit TF-IDF and rebuild all indexes")
+    args = parser.parse_args()
+    if not args.path and not args.refit:
+        parser.error("nothing to do")
+    if args.path:
+        catalog = ingest(read_records(args.path))
+        print(f"Published generation {catalog.meta['generation']} ({catalog.n_rows} movies)")
+        if needs_refit(catalog.meta):
+            args.refit = True
+    if args.refit:
+        catalog = refit()
+        print(f"Refit published generation {catalog.meta['generation']} ({catalog.n_rows} movies)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
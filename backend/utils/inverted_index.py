@@ -0,0 +1,122 @@
+import orjson
+import numpy as np
+from ast import literal_eval
+
+# ----------------------------
+# Term -> rows inverted index (genres, keywords)
+# ----------------------------
+# Postings are stored CSR-style: positions[offsets[t]:offsets[t + 1]] are the
+# sorted row positions carrying term t. Terms are matched by exact,
+# case-insensitive name, so "Action" no longer matches every genre containing it.
+
+
+def parse_names(raw):
+    """'[{"id": 28, "name": "Action"}, ...]' -> ["Action", ...]"""
+    if not raw:
+        return []
+    try:
+        items = orjson.loads(raw)
+    except ValueError:
+        try:
+            items = literal_eval(raw)
+        except Exception:
+            return []
+    return [item['name'] for item in items if isinstance(item, dict) and 'name' in item]
+
+
+class TermIndex:
+    def __init__(self, names, offsets, positions, n_rows):
+        self.names = list(names)            # display names, term id order
+        self.offsets = offsets              # (V + 1,) int64
+        self.positions = positions          # (nnz,) int32, sorted within each term
+        self.n_rows = n_rows
+        self.term_ids = {name.casefold(): t for t, name in enumerate(self.names)}
+
+    @classmethod
+    def build(cls, term_lists):
+        names, term_ids, rows, cols = [], {}, [], []
+        for pos, terms in enumerate(term_lists):
+            for name in terms:
+                key = name.casefold()
+                if key not in term_ids:
+                    term_ids[key] = len(names)
+                    names.append(name)
+                rows.append(term_ids[key])
+                cols.append(pos)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int32)
+        order = np.lexsort((cols, rows))
+        rows, cols = rows[order], cols[order]
+        # a movie listing the same term twice should only be posted once
+        keep = np.ones(len(rows), dtype=bool)
+        keep[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        rows, cols = rows[keep], cols[keep]
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(names)), out=offsets[1:])
+        return cls(names, offsets, cols, len(term_lists))
+
+    @classmethod
+    def from_column(cls, column):
+        return cls.build([parse_names(raw) for raw in column])
+
+    @property
+    def vocabulary(self):
+        return sorted(self.names)
+
+    def __contains__(self, term):
+        return term.strip().casefold() in self.term_ids
+
+    def postings(self, term):
+        """Sorted row positions carrying `term` (empty if unknown)."""
+        t = self.term_ids.get(term.strip().casefold())
+        if t is None:
+            return np.empty(0, dtype=np.int32)
+        return self.positions[self.offsets[t]:self.offsets[t + 1]]
+
+    def select(self, terms, match="any"):
+        """Sorted positions having any / all of `terms`."""
+        lists = [self.postings(t) for t in terms]
+        if not lists:
+            return np.arange(self.n_rows, dtype=np.int32)
+        if match == "all":
+            lists.sort(key=len)  # intersect smallest first
+            out = lists[0]
+            for other in lists[1:]:
+                if not len(out):
+                    break
+                out = np.intersect1d(out, other, assume_unique=True)
+            return out
+        return np.flatnonzero(self.mask(terms, "any")).astype(np.int32)
+
+    def mask(self, terms, match="any"):
+        """Boolean row bitset for the same predicate as `select`."""
+        if not terms:
+            return np.ones(self.n_rows, dtype=bool)
+        if match == "all":
+            out = np.zeros(self.n_rows, dtype=bool)
+            out[self.select(terms, "all")] = True
+            return out
+        out = np.zeros(self.n_rows, dtype=bool)
+        for t in terms:
+            out[self.postings(t)] = True
+        return out
+
+    # -- persistence ---------------------------------------------------
+    def save(self, store, name):
+        store.save_json(f"{name}.names", self.names)
+        store.save_array(f"{name}.offsets", self.offsets)
+        store.save_array(f"{name}.positions", self.positions)
+
+    @classmethod
+    def load(cls, store, name, n_rows):
+        return cls(
+            store.load_json(f"{name}.names"),
+            store.load_array(f"{name}.offsets"),
+            store.load_array(f"{name}.positions"),
+            n_rows,
+        )
+
+
+def split_terms(value):
+    """'Action, Drama' -> ['Action', 'Drama']"""
+    return [t.strip() for t in (value or "").split(",") if t.strip()]
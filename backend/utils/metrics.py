@@ -0,0 +1,214 @@
+import os
+import time
+import bisect
+import threading
+from contextlib import nullcontext
+
+# ----------------------------
+# In-process metrics, exposed in Prometheus text format at /metrics
+# ----------------------------
+# Counters and histograms are plain dicts behind a lock; components that
+# already keep their own counters (poster / explanation caches) are read at
+# scrape time through callbacks, so they cost nothing per request. With
+# METRICS_ENABLED=0 every timer is a shared nullcontext and observe/inc return
+# immediately.
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_NULL_TIMER = nullcontext()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, help, labels=()):
+        self.registry = registry
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.registry = registry
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}      # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self.values.get(labels)
+            if row is None:
+                row = self.values[labels] = [0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def time(self, *labels):
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self.values.items())
+        lines = []
+        for key, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {row[-1]!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class CallbackMetric:
+    """Values read from `fn() -> {label_tuple: value}` at scrape time."""
+
+    def __init__(self, registry, name, help, kind, labels, fn):
+        self.registry = registry
+        self.name, self.help, self.kind, self.labels = name, help, kind, tuple(labels)
+        self.fn = fn
+
+    def render(self):
+        try:
+            items = sorted(self.fn().items())
+        except Exception as e:
+            print(f"Failed to collect metric {self.name}: {e}")
+            return []
+        return [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+
+class Registry:
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.metrics = {}
+
+    def _add(self, metric):
+        # modules may be reloaded; keep the first registration
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(self, name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(self, name, help, labels, buckets))
+
+    def callback(self, name, help, kind, labels, fn):
+        metric = CallbackMetric(self, name, help, kind, labels, fn)
+        self.metrics[name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+STAGE_SECONDS = registry.histogram("stage_seconds", "Time spent in named request stages", ("stage",))
+EXTERNAL_SECONDS = registry.histogram(
+    "external_request_duration_seconds", "Latency of calls to external services", ("service",)
+)
+EXTERNAL_FIRST_CHUNK_SECONDS = registry.histogram(
+    "external_first_chunk_seconds", "Time from sending a streamed external call to its first chunk", ("service",)
+)
+EXTERNAL_ERRORS = registry.counter(
+    "external_request_errors_total", "Failed calls to external services", ("service",)
+)
+
+
+def stage(name):
+    """with stage("ranking"): ... -- records into stage_seconds{stage=name}."""
+    return STAGE_SECONDS.time(name)
+
+
+# ----------------------------
+# Request timing middleware
+# ----------------------------
+class TimingMiddleware:
+    """Pure ASGI middleware; labels requests by route template, not raw path."""
+
+    def __init__(self, app, routes=()):
+        self.app = app
+        self.routes = routes
+        self._paths = None
+
+    def _route_label(self, scope):
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._paths is None or endpoint not in self._paths:
+            self._paths = {getattr(r, "endpoint", None): getattr(r, "path", "") for r in self.routes}
+        return self._paths.get(endpoint, getattr(endpoint, "__name__", "unknown"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not registry.enabled:
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start, scope["method"], self._route_label(scope), str(status[0])
+            )
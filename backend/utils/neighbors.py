@@ -0,0 +1,118 @@
+import os
+import numpy as np
+
+# ----------------------------
+# Top-K neighbor index
+# ----------------------------
+# Instead of a dense N x N cosine matrix we keep only the K most similar
+# movies per row. Memory is N * K * 8 bytes (int32 + float32) and the build
+# never holds more than CHUNK_BYTES of similarity scores at once.
+
+NEIGHBOR_K = int(os.getenv("NEIGHBOR_K", 50))
+CHUNK_BYTES = int(os.getenv("NEIGHBOR_CHUNK_BYTES", 64 * 1024 * 1024))
+
+
+class NeighborIndex:
+    def __init__(self, indices, scores, tfidf_matrix):
+        self.indices = indices   # (N, K) int32 positions, best first
+        self.scores = scores     # (N, K) float32 cosine scores
+        self.tfidf_matrix = tfidf_matrix
+
+    @property
+    def k(self):
+        return self.indices.shape[1]
+
+    def __len__(self):
+        return self.indices.shape[0]
+
+    def neighbors(self, idx: int, top_n: int = None):
+        """Return (positions, scores) of the nearest movies, self excluded."""
+        top_n = self.k if top_n is None else min(top_n, self.k)
+        return self.indices[idx, :top_n], self.scores[idx, :top_n]
+
+    def similarity_to(self, idx: int, positions):
+        """Exact cosine between one movie and a set of rows (TF-IDF rows are L2-normalised)."""
+        row = self.tfidf_matrix[idx]
+        sims = self.tfidf_matrix[np.asarray(positions)] @ row.T
+        return np.asarray(sims.todense(), dtype=np.float32).ravel()
+
+
+def _similarity_block(rows, matrix_t):
+    """rows @ matrix_t as a dense float32 array.
+
+    The sparse product is cast before densifying, so a chunk never exists as a
+    float64 dense block and stays within the 4 bytes per cell it was sized for.
+    """
+    return (rows @ matrix_t).astype(np.float32).toarray()
+
+
+def build_neighbor_index(tfidf_matrix, k=NEIGHBOR_K, chunk_bytes=CHUNK_BYTES):
+    n = tfidf_matrix.shape[0]
+    k = max(1, min(k, n - 1))
+    indices = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+    chunk = max(1, chunk_bytes // (4 * max(n, 1)))
+    matrix_t = tfidf_matrix.T.tocsc()
+
+    for start in range(0, n, chunk):
+        end = min(start + chunk, n)
+        block = _similarity_block(tfidf_matrix[start:end], matrix_t)
+        rows = np.arange(end - start)
+        block[rows, rows + start] = -np.inf  # never recommend a movie as its own neighbor
+
+        top = np.argpartition(block, -k, axis=1)[:, -k:]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        indices[start:end] = np.take_along_axis(top, order, axis=1)
+        scores[start:end] = np.take_along_axis(top_scores, order, axis=1)
+
+    return NeighborIndex(indices, scores, tfidf_matrix)
+
+
+def patch_neighbor_index(neighbor_index, tfidf_matrix, changed, updated, chunk_bytes=CHUNK_BYTES):
+    """Neighbor index for tfidf_matrix after rows were replaced (`updated`) or appended.
+
+    `changed` lists every replaced or new row. Their own lists are recomputed
+    exactly; every other row only merges the changed rows into its current
+    top-K. Replaced rows are first dropped from the lists that held them, so a
+    list can miss a neighbor that used to rank just below K until the next refit.
+    """
+    n, k = tfidf_matrix.shape[0], neighbor_index.k
+    n_old = len(neighbor_index)
+    changed = np.asarray(changed, dtype=np.int64)
+    indices = np.zeros((n, k), dtype=np.int32)
+    scores = np.full((n, k), -np.inf, dtype=np.float32)
+    indices[:n_old] = neighbor_index.indices
+    scores[:n_old] = neighbor_index.scores
+    if len(updated):
+        scores[np.isin(indices, np.asarray(updated))] = -np.inf
+
+    others = np.ones(n, dtype=bool)
+    others[changed] = False
+    chunk = max(1, chunk_bytes // (4 * max(n, 1)))
+    matrix_t = tfidf_matrix.T.tocsc()
+
+    for start in range(0, len(changed), chunk):
+        rows = changed[start:start + chunk]
+        block = _similarity_block(tfidf_matrix[rows], matrix_t)
+        block[np.arange(len(rows)), rows] = -np.inf
+
+        # merge the changed rows into every unchanged list they would enter
+        affected = np.flatnonzero(others & (block.max(axis=0) > scores.min(axis=1)))
+        if len(affected):
+            cand_idx = np.hstack([indices[affected], np.broadcast_to(rows.astype(np.int32), (len(affected), len(rows)))])
+            cand_scores = np.hstack([scores[affected], block[:, affected].T])
+            top = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(cand_scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            indices[affected] = np.take_along_axis(np.take_along_axis(cand_idx, top, axis=1), order, axis=1)
+            scores[affected] = np.take_along_axis(top_scores, order, axis=1)
+
+        # the changed rows' own lists, exactly as build_neighbor_index would
+        top = np.argpartition(block, -k, axis=1)[:, -k:]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        indices[rows] = np.take_along_axis(top, order, axis=1)
+        scores[rows] = np.take_along_axis(top_scores, order, axis=1)
+
+    return NeighborIndex(indices, scores, tfidf_matrix)
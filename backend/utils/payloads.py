@@ -0,0 +1,98 @@
+import orjson
+import numpy as np
+from fastapi.responses import JSONResponse, Response
+from utils.helpers import sanitize_for_json
+from utils.metrics import stage
+
+# ----------------------------
+# Pre-serialized movie payloads
+# ----------------------------
+# Every endpoint returns one of a few fixed column projections of a movie.
+# Each projection is sanitized (same rules as sanitize_for_json) and encoded to
+# a JSON object once, when the snapshot is written; a response is then the
+# selected fragments joined with commas, with per-request fields (scores,
+# poster_url, ...) spliced in before the closing brace. Per-request cost depends
+# only on rows returned.
+#
+# The fragments live in the snapshot as one memory-mapped buffer per projection,
+# so workers share them instead of each holding its own copy; records() decodes
+# the few rows an endpoint needs as dicts.
+
+CARD_COLUMNS = ["id", "title", "genres", "vote_average", "overview", "year"]
+PROJECTIONS = {
+    "card": CARD_COLUMNS,
+    "similar": CARD_COLUMNS + ["cast_clean", "crew_clean"],
+    "detail": CARD_COLUMNS + ["popularity"],
+    "by_ids": ["id", "title", "overview", "vote_average", "year", "genres"],
+    "suggest": ["id", "title", "year"],
+    "chat": ["title", "overview", "genres", "year", "vote_average"],
+    "full": None,       # every stored column, for /catalog
+}
+ENCODE_CHUNK_ROWS = 10000
+
+
+def dumps(content):
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: orjson instead of json.dumps."""
+
+    def render(self, content):
+        return dumps(content)
+
+
+class MoviePayloads:
+    def __init__(self, ids, fragments):
+        self.ids = ids                  # (N,) movie ids in row order
+        self.fragments = fragments      # {projection: sequence of JSON object bytes, one per row}
+
+    @classmethod
+    def build(cls, movies_df, projections=PROJECTIONS):
+        fragments = {}
+        for name, columns in projections.items():
+            encoded = []
+            for start in range(0, len(movies_df), ENCODE_CHUNK_ROWS):
+                df = movies_df.iloc[start:start + ENCODE_CHUNK_ROWS]
+                rows = sanitize_for_json(df if columns is None else df[columns]).to_dict(orient="records")
+                encoded.extend(orjson.dumps(row) for row in rows)
+            fragments[name] = encoded
+        return cls(movies_df["id"].to_numpy(), fragments)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def records(self, name, positions):
+        """Fresh dicts for the given rows, safe to mutate."""
+        fragments = self.fragments[name]
+        return [orjson.loads(fragments[p]) for p in np.asarray(positions, dtype=np.int64).tolist()]
+
+    def render(self, name, positions, extras=None):
+        """JSON array bytes for the rows; extras maps field -> per-row values."""
+        fragments = self.fragments[name]
+        parts = [fragments[p] for p in np.asarray(positions, dtype=np.int64).tolist()]
+        if extras:
+            columns = {k: v.tolist() if hasattr(v, "tolist") else list(v) for k, v in extras.items()}
+            for i, part in enumerate(parts):
+                tail = dumps({k: values[i] for k, values in columns.items()})
+                parts[i] = part[:-1] + b"," + tail[1:]
+        return b"[" + b",".join(parts) + b"]"
+
+    def response(self, name, positions, extras=None):
+        with stage("serialization"):
+            body = self.render(name, positions, extras)
+        return Response(body, media_type="application/json")
+
+    # -- persistence ---------------------------------------------------
+    def save(self, store, name):
+        store.save_array(f"{name}.ids", self.ids)
+        store.save_json(f"{name}.projections", list(self.fragments))
+        for projection, fragments in self.fragments.items():
+            store.save_blobs(f"{name}.{projection}", fragments)
+
+    @classmethod
+    def load(cls, store, name):
+        return cls(
+            store.load_array(f"{name}.ids"),
+            {p: store.load_blobs(f"{name}.{p}") for p in store.load_json(f"{name}.projections")},
+        )
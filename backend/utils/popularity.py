@@ -0,0 +1,82 @@
+import numpy as np
+
+# ----------------------------
+# Precomputed popularity rankings
+# ----------------------------
+# popularity_score = vote_average * log1p(vote_count) is computed once. Movies
+# are ranked once globally; each genre keeps the sorted *ranks* of its movies,
+# so top-N is a slice and merging/intersecting genres is a sorted-array union
+# or intersection that stays in popularity order.
+
+def popularity_scores(movies_df):
+    return (movies_df['vote_average'] * np.log1p(movies_df['vote_count'])).to_numpy(dtype=np.float64)
+
+class PopularityIndex:
+    def __init__(self, scores, order, genre_names, genre_offsets, genre_ranks):
+        self.scores = scores                # (N,) float64
+        self.order = order                  # (N,) int32, most popular first
+        self.genre_offsets = genre_offsets  # (G + 1,) int64
+        self.genre_ranks = genre_ranks      # sorted ranks of genre g at [offsets[g]:offsets[g + 1]]
+        self.genre_ids = {name.casefold(): g for g, name in enumerate(genre_names)}
+        self.genre_names = list(genre_names)
+
+    @classmethod
+    def build(cls, scores, genre_index):
+        scores = np.asarray(scores, dtype=np.float64)
+        order = np.argsort(-scores, kind="stable").astype(np.int32)
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        ranks = [np.sort(rank[genre_index.postings(name)]) for name in genre_index.names]
+        offsets = np.zeros(len(ranks) + 1, dtype=np.int64)
+        np.cumsum([len(r) for r in ranks], out=offsets[1:])
+        genre_ranks = np.concatenate(ranks) if ranks else np.empty(0, dtype=np.int32)
+        return cls(scores, order, genre_index.names, offsets, genre_ranks.astype(np.int32))
+
+    @classmethod
+    def from_frame(cls, movies_df, genre_index):
+        return cls.build(popularity_scores(movies_df), genre_index)
+
+    def _ranks(self, genre):
+        g = self.genre_ids.get(genre.strip().casefold())
+        if g is None:
+            return np.empty(0, dtype=np.int32)
+        return self.genre_ranks[self.genre_offsets[g]:self.genre_offsets[g + 1]]
+
+    def top(self, top_n, genre=None):
+        """Row positions of the top_n most popular movies, optionally within one genre."""
+        if not genre:
+            return self.order[:top_n]
+        return self.order[self._ranks(genre)[:top_n]]
+
+    def top_any(self, genres, top_n):
+        """Most popular movies in at least one of the genres."""
+        ranks = [self._ranks(g) for g in genres]
+        merged = np.unique(np.concatenate(ranks)) if ranks else np.empty(0, dtype=np.int32)
+        return self.order[merged[:top_n]]
+
+    def top_all(self, genres, top_n):
+        """Most popular movies that belong to every one of the genres."""
+        if not genres:
+            return self.order[:top_n]
+        ranks = self._ranks(genres[0])
+        for g in genres[1:]:
+            ranks = np.intersect1d(ranks, self._ranks(g), assume_unique=True)
+        return self.order[ranks[:top_n]]
+
+    # -- persistence ---------------------------------------------------
+    def save(self, store, name):
+        store.save_array(f"{name}.scores", self.scores)
+        store.save_array(f"{name}.order", self.order)
+        store.save_json(f"{name}.genres", self.genre_names)
+        store.save_array(f"{name}.genre_offsets", self.genre_offsets)
+        store.save_array(f"{name}.genre_ranks", self.genre_ranks)
+
+    @classmethod
+    def load(cls, store, name):
+        return cls(
+            store.load_array(f"{name}.scores"),
+            store.load_array(f"{name}.order"),
+            store.load_json(f"{name}.genres"),
+            store.load_array(f"{name}.genre_offsets"),
+            store.load_array(f"{name}.genre_ranks"),
+        )
@@ -0,0 +1,108 @@
+import os
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.inverted_index import parse_names
+
+# ----------------------------
+# CSV parsing for large credits files
+# ----------------------------
+# The credits CSV is mostly cast/crew JSON blobs, of which only the names are
+# used. It is read in chunks of PARSE_CHUNK_ROWS rows; each chunk's blobs are
+# parsed (orjson) in a pool of PREPROCESS_WORKERS processes and only the joined
+# names come back, so the raw blobs of at most a few chunks are alive at once
+# and never reach movies_df. Only the columns the app reads are loaded, and
+# snapshots store them with compact dtypes (see compact_frame).
+#
+# This module has no import-time side effects so pool workers stay cheap. Pools
+# use fork; where fork is unavailable parsing runs in-process.
+
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", os.cpu_count() or 1))
+PARSE_CHUNK_ROWS = int(os.getenv("PARSE_CHUNK_ROWS", 500))
+
+MOVIE_DTYPES = {
+    "id": "int32", "title": "object", "overview": "object", "genres": "object", "keywords": "object",
+    "release_date": "object", "vote_average": "float64", "vote_count": "int32", "popularity": "float64",
+    "budget": "int64",
+}
+CREDIT_DTYPES = {"movie_id": "int32", "cast": "object", "crew": "object"}
+
+# vote_average/popularity stay float64: they are served and scored, and float32
+# would change both their JSON representation and popularity tie-breaks
+COMPACT_DTYPES = {"id": "int32", "vote_count": "int32", "budget": "int64", "year": "int16", "genres": "category"}
+
+
+def join_names(values):
+    """['[{"name": "A"}, {"name": "B"}]', ...] -> ["A B", ...]"""
+    return [" ".join(parse_names(v)) if isinstance(v, str) else "" for v in values]
+
+
+def _join_columns(columns):
+    return [join_names(values) for values in columns]
+
+
+def _pool_workers(workers):
+    if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+        return workers
+    return 1
+
+
+def map_chunks(fn, chunks, workers=PREPROCESS_WORKERS):
+    """fn(chunk) for every chunk, in order, with at most 2 * workers chunks in flight."""
+    workers = _pool_workers(workers)
+    if workers == 1:
+        for chunk in chunks:
+            yield fn(chunk)
+        return
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork")) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(fn, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def clean_names(values, workers=PREPROCESS_WORKERS, chunk_rows=PARSE_CHUNK_ROWS):
+    """join_names over a list, fanned out across processes when it is long enough to pay off."""
+    if len(values) <= chunk_rows:
+        return join_names(values)
+    chunks = ((values[i:i + chunk_rows],) for i in range(0, len(values), chunk_rows))
+    out = []
+    for (names,) in map_chunks(_join_columns, chunks, workers):
+        out.extend(names)
+    return out
+
+
+def read_movies(path):
+    return pd.read_csv(path, usecols=list(MOVIE_DTYPES), dtype=MOVIE_DTYPES)
+
+
+def read_credits(path, workers=PREPROCESS_WORKERS, chunk_rows=PARSE_CHUNK_ROWS):
+    """Frame of id, cast_clean, crew_clean; the cast/crew blobs are parsed chunk by chunk."""
+    ids = []
+
+    def chunks():
+        for chunk in pd.read_csv(path, usecols=list(CREDIT_DTYPES), dtype=CREDIT_DTYPES, chunksize=chunk_rows):
+            ids.append(chunk["movie_id"].to_numpy())
+            yield chunk["cast"].tolist(), chunk["crew"].tolist()
+
+    cast, crew = [], []
+    for cast_names, crew_names in map_chunks(_join_columns, chunks(), workers):
+        cast.extend(cast_names)
+        crew.extend(crew_names)
+    id_column = np.concatenate(ids) if ids else np.empty(0, dtype=np.int32)
+    return pd.DataFrame({"id": id_column, "cast_clean": cast, "crew_clean": crew})
+
+
+def compact_frame(movies_df):
+    """Narrow dtypes for a snapshot frame (columns it does not have are skipped)."""
+    dtypes = {col: dtype for col, dtype in COMPACT_DTYPES.items() if col in movies_df}
+    if "genres" in dtypes:
+        movies_df["genres"] = movies_df["genres"].astype(object).fillna("")
+    return movies_df.astype(dtypes)
@@ -0,0 +1,121 @@
+import os
+import re
+import sys
+import time
+import atexit
+import asyncio
+import functools
+import threading
+from collections import Counter, defaultdict
+
+# ----------------------------
+# Opt-in sampling profiler
+# ----------------------------
+# Set PROFILE_DIR to turn it on. Every route's endpoint is wrapped so the
+# handling thread is tagged with the route; a daemon thread samples the stacks
+# of tagged threads every PROFILE_INTERVAL seconds and writes one folded-stack
+# file per route (PROFILE_DIR/<METHOD>_<route>.folded, the input format of
+# flamegraph.pl and speedscope). Async endpoints share the event loop thread, so
+# their samples are attributed to whichever coroutine last entered.
+# When PROFILE_DIR is unset nothing is wrapped and no thread is started.
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+PROFILE_DUMP_INTERVAL = float(os.getenv("PROFILE_DUMP_INTERVAL", 30))
+
+
+def _folded(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    def __init__(self, out_dir, interval=PROFILE_INTERVAL, dump_interval=PROFILE_DUMP_INTERVAL):
+        self.out_dir = out_dir
+        self.interval = interval
+        self.dump_interval = dump_interval
+        self.samples = defaultdict(Counter)   # route label -> folded stack -> count
+        self._active = {}                      # thread id -> route label
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # -- tagging -------------------------------------------------------
+    def _wrap(self, fn, label):
+        active = self._active
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                tid = threading.get_ident()
+                active[tid] = label
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    active.pop(tid, None)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                tid = threading.get_ident()
+                active[tid] = label
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    active.pop(tid, None)
+        return wrapper
+
+    def install(self, app):
+        """Tag every API route of `app` and start sampling."""
+        for route in app.router.routes:
+            dependant = getattr(route, "dependant", None)
+            if dependant is None or dependant.call is None:
+                continue
+            label = f"{','.join(sorted(route.methods or []))} {route.path}"
+            dependant.call = self._wrap(dependant.call, label)
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        atexit.register(self.dump)
+
+    # -- sampling ------------------------------------------------------
+    def _run(self):
+        own = threading.get_ident()
+        last_dump = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            if self._active:
+                frames = sys._current_frames()
+                with self._lock:
+                    for tid, label in list(self._active.items()):
+                        frame = frames.get(tid)
+                        if frame is not None and tid != own:
+                            self.samples[label][_folded(frame)] += 1
+                del frames
+            if time.monotonic() - last_dump >= self.dump_interval:
+                self.dump()
+                last_dump = time.monotonic()
+
+    def dump(self):
+        with self._lock:
+            snapshot = {label: dict(stacks) for label, stacks in self.samples.items()}
+        for label, stacks in snapshot.items():
+            name = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_")
+            path = os.path.join(self.out_dir, f"{name}.folded")
+            try:
+                with open(path + ".tmp", "w") as f:
+                    for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+                        f.write(f"{stack} {count}\n")
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                print(f"Failed to write profile {path}: {e}")
+
+
+def install_profiler(app, out_dir=PROFILE_DIR):
+    if not out_dir:
+        return None
+    profiler = SamplingProfiler(out_dir)
+    profiler.install(app)
+    return profiler
@@ -1,39 +1,31 @@
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
-def build_user_profile(user_data, movies_df, tfidf_matrix):
+LIKE_WEIGHT, DISLIKE_WEIGHT = 1.0, -0.5  # tunable
+BATCH_BYTES = 256 * 1024 * 1024          # cap on the dense (movies x users) score block
+
+def top_n_positions(scores, top_n, exclude=None):
+    """Positions and scores of the top_n best entries, best first, skipping `exclude`."""
+    candidates = np.flatnonzero(~exclude) if exclude is not None else np.arange(len(scores))
+    cand_scores = scores[candidates]
+    k = min(top_n, len(candidates))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+    part = np.argpartition(-cand_scores, k - 1)[:k]
+    order = part[np.argsort(-cand_scores[part], kind="stable")]
+    return candidates[order], cand_scores[order]
+
+def similar_for_movies(movie_ids, retriever, id_index, top_n=10):
     """
-    user_data = { "likes": [id1, id2], "dislikes": [id3, id4] }
+    Batch similar-movies for offline jobs and carousel pages.
+    Returns ([(movie_id, row position, neighbor positions, scores), ...] in request
+    order with duplicates dropped, [unknown movie ids]).
     """
-    profile_vector = np.zeros((1, tfidf_matrix.shape[1]))
-    
-    like_weight, dislike_weight = 1.0, -0.5  # tunable
-    
-    for movie_id in user_data.get("likes", []):
-        idx = movies_df.index[movies_df["id"] == movie_id].tolist()
-        if idx: profile_vector += like_weight * tfidf_matrix[idx[0]]
-    
-    for movie_id in user_data.get("dislikes", []):
-        idx = movies_df.index[movies_df["id"] == movie_id].tolist()
-        if idx: profile_vector += dislike_weight * tfidf_matrix[idx[0]]
-    
-    return profile_vector
-
-def recommend_for_user(user_data, movies_df, tfidf_matrix, top_n=10):
-    profile = build_user_profile(user_data, movies_df, tfidf_matrix)
-    sims = cosine_similarity(profile, tfidf_matrix).flatten()
-    
-    # Exclude already seen (likes, dislikes, watchlist)
-    exclude_ids = set(user_data.get("likes", []) + 
-                      user_data.get("dislikes", []) + 
-                      user_data.get("watchlist", []))
-    
-    movie_scores = [
-        (movies_df.iloc[i]["id"], sims[i]) 
-        for i in range(len(sims)) if movies_df.iloc[i]["id"] not in exclude_ids
-    ]
-    
-    movie_scores.sort(key=lambda x: x[1], reverse=True)
-    top_ids = [m[0] for m in movie_scores[:top_n]]
-    
-    return movies_df[movies_df["id"].isin(top_ids)].to_dict(orient="records")
+    seeds, missing = [], []
+    for movie_id in dict.fromkeys(int(m) for m in movie_ids):
+        idx = id_index.position(movie_id)
+        if idx is None:
+            missing.append(movie_id)
+        else:
+            seeds.append((movie_id, idx))
+    lists = retriever.similar_many([idx for _, idx in seeds], top_n) if seeds else []
+    return [(movie_id, idx, positions, scores) for (movie_id, idx), (positions, scores) in zip(seeds, lists)], missing
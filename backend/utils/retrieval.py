@@ -0,0 +1,111 @@
+import os
+import numpy as np
+from utils.ann import project
+from utils.metrics import stage
+from utils.recommender import BATCH_BYTES, top_n_positions
+
+# ----------------------------
+# Exact vs approximate retrieval
+# ----------------------------
+# RETRIEVAL_MODE=exact   top-K neighbor index / sparse TF-IDF products (default);
+#                        asking for more than K neighbors scores every row
+# RETRIEVAL_MODE=ann     SVD embeddings + IVF index (needs EMBEDDING_DIM > 0)
+
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "exact")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 128 if RETRIEVAL_MODE == "ann" else 0))
+
+
+class Retriever:
+    def __init__(self, mode, tfidf_matrix, neighbor_index, embeddings=None, components=None, ann_index=None):
+        if mode not in ("exact", "ann"):
+            raise ValueError(f"Unknown RETRIEVAL_MODE {mode!r}")
+        if mode == "ann" and ann_index is None:
+            raise ValueError("RETRIEVAL_MODE=ann needs artifacts built with EMBEDDING_DIM > 0")
+        self.mode = mode
+        self.tfidf_matrix = tfidf_matrix
+        self.neighbor_index = neighbor_index
+        self.embeddings = embeddings
+        self.components = components
+        self.ann_index = ann_index
+
+    def _exclude_self(self, idx):
+        exclude = np.zeros(self.tfidf_matrix.shape[0], dtype=bool)
+        exclude[idx] = True
+        return exclude
+
+    def similar(self, idx, top_n):
+        """(positions, scores) of the movies most similar to row `idx`, itself excluded."""
+        with stage("similarity_scoring"):
+            if self.mode == "ann":
+                return self.ann_index.search(self.embeddings[idx], top_n, exclude=self._exclude_self(idx))
+            if top_n > self.neighbor_index.k:
+                return self._scan(idx, top_n)
+            return self.neighbor_index.neighbors(idx, top_n)
+
+    def _scan(self, idx, top_n):
+        """Exact neighbors past the index's K: score every row against row `idx`."""
+        row = self.tfidf_matrix[idx]
+        scores = np.asarray((self.tfidf_matrix @ row.T).todense(), dtype=np.float32).ravel()
+        return top_n_positions(scores, top_n, self._exclude_self(idx))
+
+    def similar_many(self, positions, top_n):
+        """similar() for many rows at once: one (positions, scores) pair per row.
+
+        Exact lists come from a single gather over the neighbor index (a full
+        scan per row when top_n is past its K); ANN runs one IVF probe per row.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        with stage("similarity_scoring"):
+            if self.mode == "ann":
+                exclude = np.zeros(self.tfidf_matrix.shape[0], dtype=bool)
+                results = []
+                for idx in positions.tolist():
+                    exclude[idx] = True
+                    results.append(self.ann_index.search(self.embeddings[idx], top_n, exclude=exclude))
+                    exclude[idx] = False
+                return results
+            if top_n > self.neighbor_index.k:
+                return [self._scan(idx, top_n) for idx in positions.tolist()]
+            indices = self.neighbor_index.indices[positions, :top_n]
+            scores = self.neighbor_index.scores[positions, :top_n]
+            return list(zip(indices, scores))
+
+    def similarity_to(self, idx, positions):
+        """Similarity between row `idx` and each of `positions`."""
+        if self.mode == "ann":
+            return self.embeddings[np.asarray(positions)] @ self.embeddings[idx]
+        return self.neighbor_index.similarity_to(idx, positions)
+
+    def score_profile(self, vector, top_n, exclude=None):
+        """Best rows for a TF-IDF-space profile vector.
+
+        Exact scores are raw dot products with the profile; ANN scores are
+        cosines in the embedding space.
+        """
+        if self.mode == "ann":
+            with stage("similarity_scoring"):
+                return self.ann_index.search(project(vector, self.components), top_n, exclude=exclude)
+        with stage("similarity_scoring"):
+            scores = self.tfidf_matrix @ vector
+        with stage("ranking"):
+            return top_n_positions(scores, top_n, exclude)
+
+    def score_profiles(self, vectors, top_n, excludes):
+        """score_profile() for many profiles: one (positions, scores) pair per vector.
+
+        Exact mode scores a chunk of profiles with one sparse x dense product,
+        the chunk sized so its score block stays within BATCH_BYTES; ANN runs one
+        probe per profile.
+        """
+        if self.mode == "ann":
+            return [self.score_profile(v, top_n, e) for v, e in zip(vectors, excludes)]
+        chunk = max(1, BATCH_BYTES // (8 * max(*self.tfidf_matrix.shape, 1)))
+        results = []
+        for start in range(0, len(vectors), chunk):
+            block = np.stack(vectors[start:start + chunk], axis=1)
+            with stage("similarity_scoring"):
+                scores = self.tfidf_matrix @ block
+            with stage("ranking"):
+                for j, exclude in enumerate(excludes[start:start + chunk]):
+                    results.append(top_n_positions(scores[:, j], top_n, exclude))
+        return results
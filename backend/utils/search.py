@@ -0,0 +1,181 @@
+import re
+import bisect
+from collections import Counter
+import numpy as np
+from utils.inverted_index import parse_names
+
+# ----------------------------
+# BM25 full-text search
+# ----------------------------
+# Documents are title + keywords + overview with per-field weights (BM25F-lite:
+# weighted term frequencies, one length normalisation). The BM25 contribution
+# of every (term, doc) pair is precomputed at build time, so a query is just a
+# weighted bincount over a handful of posting lists plus an argpartition.
+# Prefix search over the sorted vocabulary powers title autocomplete.
+
+K1, B = 1.2, 0.75
+FIELD_WEIGHTS = {"title": 3.0, "keywords": 2.0, "overview": 1.0}
+MAX_PREFIX_EXPANSIONS = 64
+
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(str(text).casefold()) if t not in STOP_WORDS]
+
+
+class BM25Index:
+    def __init__(self, terms, offsets, docs, impacts, n_docs):
+        self.terms = terms              # sorted vocabulary (list or mmap'd StringTable), term id == position
+        self.offsets = offsets          # (V + 1,) int64
+        self.docs = docs                # (nnz,) int32
+        self.impacts = impacts          # (nnz,) float32 precomputed BM25 weights
+        self.n_docs = n_docs
+
+    @classmethod
+    def build(cls, field_texts, field_weights):
+        """field_texts: {field: list of strings}, all lists aligned to row positions."""
+        n_docs = len(next(iter(field_texts.values())))
+        doc_tfs, doc_lens = [], np.zeros(n_docs, dtype=np.float32)
+        for pos in range(n_docs):
+            tf = Counter()
+            for field, texts in field_texts.items():
+                weight = field_weights.get(field, 1.0)
+                for token in tokenize(texts[pos]):
+                    tf[token] += weight
+            doc_tfs.append(tf)
+            doc_lens[pos] = sum(tf.values())
+
+        terms = sorted({t for tf in doc_tfs for t in tf})
+        term_ids = {t: i for i, t in enumerate(terms)}
+        rows, cols, tfs = [], [], []
+        for pos, tf in enumerate(doc_tfs):
+            for token, count in tf.items():
+                rows.append(term_ids[token])
+                cols.append(pos)
+                tfs.append(count)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        order = np.argsort(rows, kind="stable")
+        rows, cols, tfs = rows[order], cols[order], tfs[order]
+
+        df = np.bincount(rows, minlength=len(terms)).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        avgdl = max(float(doc_lens.mean()) if n_docs else 0.0, 1e-9)
+        norm = K1 * (1 - B + B * doc_lens[cols] / avgdl)
+        impacts = (idf[rows] * tfs * (K1 + 1) / (tfs + norm)).astype(np.float32)
+
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(df.astype(np.int64), out=offsets[1:])
+        return cls(terms, offsets, cols, impacts, n_docs)
+
+    def term_id(self, term):
+        i = bisect.bisect_left(self.terms, term)
+        return i if i < len(self.terms) and self.terms[i] == term else None
+
+    def expand_prefix(self, prefix, limit=MAX_PREFIX_EXPANSIONS):
+        """Term ids of vocabulary entries starting with `prefix`."""
+        lo = bisect.bisect_left(self.terms, prefix)
+        hi = bisect.bisect_left(self.terms, prefix + "\U0010ffff", lo)
+        return list(range(lo, min(hi, lo + limit)))
+
+    def _postings(self, term_id):
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.docs[start:end], self.impacts[start:end]
+
+    def score(self, query, prefix_last=False, require_all=False):
+        """(positions, scores) of matching documents, unsorted."""
+        tokens = tokenize(query)
+        if not tokens:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        term_ids = [self.term_id(t) for t in tokens]
+        groups = [[] if t is None else [t] for t in term_ids]
+        if prefix_last:
+            groups[-1] = sorted(set(groups[-1]) | set(self.expand_prefix(tokens[-1])))
+
+        doc_lists, weight_lists = [], []
+        matched = np.zeros(self.n_docs, dtype=np.int16) if require_all else None
+        for group in groups:
+            group_docs = [self._postings(term_id) for term_id in group]
+            for docs, impacts in group_docs:
+                doc_lists.append(docs)
+                weight_lists.append(impacts)
+            if require_all:
+                hit = np.zeros(self.n_docs, dtype=bool)
+                for docs, _ in group_docs:
+                    hit[docs] = True
+                matched += hit
+        if not doc_lists:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        # impacts are strictly positive, so a non-zero total means "matched"
+        totals = np.bincount(np.concatenate(doc_lists), weights=np.concatenate(weight_lists), minlength=self.n_docs)
+        if require_all:
+            totals[matched < len(groups)] = 0
+        positions = np.flatnonzero(totals).astype(np.int32)
+        return positions, totals[positions].astype(np.float32)
+
+    def search(self, query, top_n=None, prefix_last=False, require_all=False):
+        """Row positions ranked by BM25, best first."""
+        positions, scores = self.score(query, prefix_last, require_all)
+        if top_n is not None and top_n < len(positions):
+            part = np.argpartition(-scores, top_n - 1)[:top_n]
+            positions, scores = positions[part], scores[part]
+        order = np.lexsort((positions, -scores))
+        return positions[order]
+
+    # -- persistence ---------------------------------------------------
+    def save(self, store, name):
+        store.save_blobs(f"{name}.terms", self.terms)
+        store.save_array(f"{name}.offsets", self.offsets)
+        store.save_array(f"{name}.docs", self.docs)
+        store.save_array(f"{name}.impacts", self.impacts)
+
+    @classmethod
+    def load(cls, store, name, n_docs):
+        return cls(
+            store.load_strings(f"{name}.terms"),
+            store.load_array(f"{name}.offsets"),
+            store.load_array(f"{name}.docs"),
+            store.load_array(f"{name}.impacts"),
+            n_docs,
+        )
+
+
+class SearchIndex:
+    """Full-text index over title/keywords/overview plus a title-only index for autocomplete."""
+
+    def __init__(self, text, titles):
+        self.text = text
+        self.titles = titles
+
+    @classmethod
+    def from_frame(cls, movies_df):
+        keywords = [" ".join(parse_names(k)) for k in movies_df["keywords"].fillna("")]
+        text = BM25Index.build({
+            "title": movies_df["title"].fillna("").tolist(),
+            "keywords": keywords,
+            "overview": movies_df["overview"].fillna("").tolist(),
+        }, FIELD_WEIGHTS)
+        titles = BM25Index.build({"title": movies_df["title"].fillna("").tolist()}, {})
+        return cls(text, titles)
+
+    def search(self, query, top_n=None):
+        """Ranked positions for free text; the last word may be a partial word."""
+        return self.text.search(query, top_n, prefix_last=True)
+
+    def autocomplete(self, query, top_n=10):
+        """Titles containing every typed word, the last one as a prefix."""
+        return self.titles.search(query, top_n, prefix_last=True, require_all=True)
+
+    def save(self, store, name):
+        self.text.save(store, f"{name}.text")
+        self.titles.save(store, f"{name}.titles")
+
+    @classmethod
+    def load(cls, store, name, n_docs):
+        return cls(BM25Index.load(store, f"{name}.text", n_docs), BM25Index.load(store, f"{name}.titles", n_docs))
@@ -1,36 +1,205 @@
-import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+import os
+import time
+import asyncio
+import logging
+import httpx
+from utils.background import BackgroundLoop
+from utils.cache import CACHE_DIR, MISSING, SQLiteKVStore, TTLCache
+from utils.metrics import EXTERNAL_ERRORS, EXTERNAL_SECONDS, registry, stage
 
-# Configure retry-enabled session
-TMDB_API_KEY = ""
+# ----------------------------
+# TMDb poster resolution
+# ----------------------------
+# Lookups go: in-process LRU -> SQLite file shared by all workers -> TMDb.
+# Missing posters are cached too (negative caching) and transient failures are
+# remembered for a short while so a TMDb outage does not get hammered.
+# Concurrent requests for the same id share one HTTP call (single-flight).
+# SQLite reads and writes run on the loop's executor so they never stall the
+# fetches in flight. Failures are counted in `stats` (and /metrics) and logged.
+
+TMDB_API_KEY = os.getenv("TMDB_API_KEY", "")
+TMDB_API_BASE = os.getenv("TMDB_API_BASE", "https://api.themoviedb.org/3")
+TMDB_IMAGE_BASE = os.getenv("TMDB_IMAGE_BASE", "https://image.tmdb.org/t/p/w500")
+
+POSTER_CONCURRENCY = int(os.getenv("POSTER_CONCURRENCY", 16))
+POSTER_TIMEOUT = float(os.getenv("POSTER_TIMEOUT", 5))
+POSTER_BATCH_TIMEOUT = float(os.getenv("POSTER_BATCH_TIMEOUT", 8))
+POSTER_CACHE_SIZE = int(os.getenv("POSTER_CACHE_SIZE", 50000))
+POSTER_CACHE_PATH = os.getenv("POSTER_CACHE_PATH", os.path.join(CACHE_DIR, "posters.sqlite"))
+
+log = logging.getLogger(__name__)
+
+POSITIVE_TTL = 7 * 24 * 3600
+NEGATIVE_TTL = 24 * 3600     # TMDb has no poster / unknown id
+FAILURE_TTL = 60             # network errors, 5xx after retries, bad key
+PROMOTED_TTL = 3600          # how long a SQLite hit stays in the in-process LRU
+RETRIES = 3
+BACKOFF = 0.3
+
+
+class PosterResolver:
+    def __init__(self, api_key=TMDB_API_KEY, api_base=TMDB_API_BASE, image_base=TMDB_IMAGE_BASE,
+                 concurrency=POSTER_CONCURRENCY, timeout=POSTER_TIMEOUT,
+                 cache_size=POSTER_CACHE_SIZE, cache_path=POSTER_CACHE_PATH):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip("/")
+        self.image_base = image_base
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache = TTLCache(cache_size)
+        self.store = SQLiteKVStore(cache_path, "posters") if cache_path else None
+        self.loop = BackgroundLoop("poster-resolver")
+        self.stats = {"lru_hits": 0, "store_hits": 0, "misses": 0, "fetches": 0, "errors": 0, "store_errors": 0}
+        self._client = None
+        self._client_pid = None
+        self._semaphore = None
+        self._inflight = {}
+        self._pending_writes = []
+
+    # -- HTTP ----------------------------------------------------------
+    def _ensure_client(self):
+        # the client and in-flight futures belong to the loop of the process that made them
+        if self._client is None or self._client_pid != os.getpid():
+            self._client_pid = os.getpid()
+            self._inflight = {}
+            self._pending_writes = []
+            limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def _fetch(self, movie_id):
+        """Return (poster_url_or_None, ttl). Never raises, so one bad id cannot fail a whole batch."""
+        try:
+            return await self._request(movie_id)
+        except Exception as e:
+            self.stats["errors"] += 1
+            EXTERNAL_ERRORS.inc("tmdb")
+            log.warning("Failed to fetch poster for %s: %r", movie_id, e)
+            return None, FAILURE_TTL
+
+    async def _request(self, movie_id):
+        url = f"{self.api_base}/movie/{movie_id}"
+        params = {"api_key": self.api_key, "language": "en-US"}
+        async with self._semaphore:
+            for attempt in range(RETRIES + 1):
+                self.stats["fetches"] += 1
+                start = time.perf_counter()
+                try:
+                    response = await self._client.get(url, params=params)
+                except httpx.HTTPError as e:
+                    error = e
+                    EXTERNAL_ERRORS.inc("tmdb")
+                else:
+                    EXTERNAL_SECONDS.observe(time.perf_counter() - start, "tmdb")
+                    if response.status_code == 200:
+                        poster_path = response.json().get("poster_path")
+                        if poster_path:
+                            return f"{self.image_base}{poster_path}", POSITIVE_TTL
+                        return None, NEGATIVE_TTL
+                    if response.status_code == 404:
+                        return None, NEGATIVE_TTL
+                    error = f"HTTP {response.status_code}"
+                    EXTERNAL_ERRORS.inc("tmdb")
+                    if response.status_code not in (429, 500, 502, 503, 504):
+                        break
+                if attempt < RETRIES:
+                    await asyncio.sleep(BACKOFF * (2 ** attempt))
+        self.stats["errors"] += 1
+        log.warning("Failed to fetch poster for %s: %s", movie_id, error)
+        return None, FAILURE_TTL
+
+    async def _fetch_and_cache(self, movie_id):
+        try:
+            url, ttl = await self._fetch(movie_id)
+            self.cache.set(movie_id, url, ttl)
+            if ttl != FAILURE_TTL:
+                self._pending_writes.append((movie_id, url, ttl))
+            return url
+        finally:
+            self._inflight.pop(movie_id, None)
+
+    # -- batch resolution -----------------------------------------------
+    async def resolve_many(self, movie_ids, timeout=POSTER_BATCH_TIMEOUT):
+        """Map each id to its poster url (or None). Never waits longer than `timeout`."""
+        self._ensure_client()
+        result, missing = {}, []
+        for movie_id in dict.fromkeys(movie_ids):
+            if movie_id is None:
+                continue
+            cached = self.cache.get(movie_id)
+            if cached is MISSING:
+                missing.append(movie_id)
+            else:
+                self.stats["lru_hits"] += 1
+                result[movie_id] = cached
+
+        if missing and self.store is not None:
+            stored = await self._in_executor(self.store.get_many, missing, default={})
+            still_missing = []
+            for movie_id in missing:
+                if str(movie_id) in stored:
+                    self.stats["store_hits"] += 1
+                    result[movie_id] = stored[str(movie_id)]
+                    self.cache.set(movie_id, result[movie_id], PROMOTED_TTL)
+                else:
+                    still_missing.append(movie_id)
+            missing = still_missing
+
+        self.stats["misses"] += len(missing)
+        tasks = {}
+        for movie_id in missing:
+            task = self._inflight.get(movie_id)
+            if task is None:
+                task = asyncio.ensure_future(self._fetch_and_cache(movie_id))
+                self._inflight[movie_id] = task
+            tasks[movie_id] = task
+
+        if tasks:
+            # shield: a caller timing out must not cancel a fetch other callers share
+            await asyncio.wait([asyncio.shield(t) for t in tasks.values()], timeout=timeout)
+            for movie_id, task in tasks.items():
+                result[movie_id] = task.result() if task.done() and not task.cancelled() else None
+            await self._flush_writes()
+        return result
+
+    async def _flush_writes(self):
+        writes, self._pending_writes = self._pending_writes, []
+        if writes and self.store is not None:
+            await self._in_executor(self.store.set_many, writes)
+
+    async def _in_executor(self, fn, *args, default=None):
+        """Run a blocking SQLite call off the event loop; failures are counted, logged and give `default`."""
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        except Exception as e:
+            self.stats["store_errors"] += 1
+            log.warning("Poster cache %s failed: %r", fn.__name__, e)
+            return default
+
+    def resolve_many_sync(self, movie_ids, timeout=POSTER_BATCH_TIMEOUT):
+        with stage("poster_enrichment"):
+            return self.loop.run(self.resolve_many(movie_ids, timeout), timeout + 1)
+
+    async def resolve_many_async(self, movie_ids, timeout=POSTER_BATCH_TIMEOUT):
+        """For async routes running on another event loop."""
+        with stage("poster_enrichment"):
+            return await self.loop.run_async(self.resolve_many(movie_ids, timeout))
+
+
+poster_resolver = PosterResolver()
+
+registry.callback(
+    "poster_cache_lookups_total", "Poster lookups by where they were answered", "counter", ("result",),
+    lambda: {("lru_hit",): poster_resolver.stats["lru_hits"], ("store_hit",): poster_resolver.stats["store_hits"],
+             ("miss",): poster_resolver.stats["misses"]},
+)
 
-session = requests.Session()
-retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504])
-session.mount("https://", HTTPAdapter(max_retries=retries))
-poster_cache = {}
 
 def get_poster_url(movie_id):
-    if movie_id in poster_cache:
-        return poster_cache[movie_id]
-    
-    try:
-        url = f"https://api.themoviedb.org/3/movie/{movie_id}?api_key={TMDB_API_KEY}&language=en-US"
-        response = session.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            poster_path = data.get("poster_path")
-            if poster_path:
-                full_url = f"https://image.tmdb.org/t/p/w500{poster_path}"
-                poster_cache[movie_id] = full_url
-                return full_url
-    except Exception as e:
-        print(f"Failed to fetch poster for {movie_id}: {e}")
-    
-    return None
-
-def enrich_with_poster_urls(movie_list):
-    for movie in movie_list:
-        movie_id = movie.get("id")
-        movie["poster_url"] = get_poster_url(movie_id)
-    return movie_list
+    return poster_resolver.resolve_many_sync([movie_id]).get(movie_id)
+
+def poster_urls(movie_ids):
+    """Poster URLs aligned with movie_ids (None where unknown)."""
+    movie_ids = [int(m) for m in movie_ids]
+    posters = poster_resolver.resolve_many_sync(movie_ids)
+    return [posters.get(m) for m in movie_ids]
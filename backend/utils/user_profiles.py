@@ -0,0 +1,135 @@
+import os
+import threading
+import numpy as np
+from utils.cache import MISSING, TTLCache
+from utils.recommender import LIKE_WEIGHT, DISLIKE_WEIGHT
+
+# ----------------------------
+# Incrementally maintained user profile vectors
+# ----------------------------
+# A user's profile is sum(weight(movie) * tfidf_row(movie)) over their history,
+# kept as a dense float32 vector in TF-IDF space. Since TF-IDF rows are unit
+# length, tfidf_matrix @ profile equals the old sum of cosine_sim rows, so a
+# recommendation is one sparse mat-vec (or one ANN query, see utils.retrieval)
+# however long the history is.
+#
+# Each cached profile remembers the per-movie weights it was built from. Syncing
+# against the latest history only touches movies whose weight changed (O(nnz)
+# of those rows), which covers new actions, re-ratings and like/dislike flips,
+# and also picks up writes made by other workers.
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 1000))
+PROFILE_TTL = 3600
+DEFAULT_WATCH_WEIGHT = 3
+EXCLUDE_KEYS = ("watched", "likes", "dislikes", "watchlist")     # never recommend these back
+
+
+def movie_weights(history):
+    """{movie_id: weight} for everything in the history that shapes the profile."""
+    weights = {}
+    for movie_id in history["watched"]:
+        weights[movie_id] = history["ratings"].get(movie_id, DEFAULT_WATCH_WEIGHT)
+    for movie_id in history["likes"]:
+        weights[movie_id] = weights.get(movie_id, 0) + LIKE_WEIGHT
+    for movie_id in history["dislikes"]:
+        weights[movie_id] = weights.get(movie_id, 0) + DISLIKE_WEIGHT
+    return weights
+
+
+class UserProfile:
+    def __init__(self, n_terms):
+        self.vector = np.zeros(n_terms, dtype=np.float32)
+        self.weights = {}
+        self.lock = threading.Lock()
+
+
+class ProfileStore:
+    def __init__(self, tfidf_matrix, movie_index, retriever, popularity=None, cache_size=PROFILE_CACHE_SIZE):
+        self.tfidf_matrix = tfidf_matrix
+        self.movie_index = movie_index
+        self.retriever = retriever
+        self.popularity = popularity
+        self.cache = TTLCache(cache_size)
+        self._lock = threading.Lock()
+
+    def _add_row(self, vector, movie_id, delta):
+        idx = self.movie_index.position(movie_id)
+        if idx is None or not delta:
+            return
+        start, end = self.tfidf_matrix.indptr[idx], self.tfidf_matrix.indptr[idx + 1]
+        vector[self.tfidf_matrix.indices[start:end]] += delta * self.tfidf_matrix.data[start:end]
+
+    def _sync(self, profile, history):
+        target = movie_weights(history)
+        with profile.lock:
+            for movie_id in profile.weights.keys() | target.keys():
+                delta = target.get(movie_id, 0) - profile.weights.get(movie_id, 0)
+                if delta:
+                    self._add_row(profile.vector, movie_id, delta)
+            profile.weights = target
+        return profile
+
+    def get(self, user_id, history):
+        """Profile for `history`, creating it or applying only what changed since last time."""
+        with self._lock:
+            profile = self.cache.get(user_id)
+            if profile is MISSING:
+                profile = UserProfile(self.tfidf_matrix.shape[1])
+            self.cache.set(user_id, profile, PROFILE_TTL)
+        return self._sync(profile, history)
+
+    def update(self, user_id, history):
+        """Called after a user action; a no-op for users whose profile is not cached."""
+        profile = self.cache.get(user_id)
+        if profile is not MISSING:
+            self._sync(profile, history)
+
+    def _exclusion(self, history, exclude_keys):
+        exclude = np.zeros(self.tfidf_matrix.shape[0], dtype=bool)
+        for key in exclude_keys:
+            exclude[self.movie_index.positions(history[key])] = True
+        return exclude
+
+    def _popular(self, profile, exclude, top_n):
+        """The most popular movies for a profile without any positive weight, else None."""
+        if self.popularity is None or any(w > 0 for w in profile.weights.values()):
+            return None
+        order = self.popularity.order
+        positions = order[~exclude[order]][:max(top_n, 0)]
+        return positions, self.popularity.scores[positions]
+
+    def recommend(self, user_id, history, top_n=10, exclude_keys=EXCLUDE_KEYS):
+        """(positions, scores) best first, or None when the history carries no signal.
+
+        Movies already in the history are never recommended. A profile without
+        any positive weight (only dislikes) gets the most popular movies, with
+        their popularity scores.
+        """
+        profile = self.get(user_id, history)
+        if not profile.weights:
+            return None
+        exclude = self._exclusion(history, exclude_keys)
+        popular = self._popular(profile, exclude, top_n)
+        if popular is not None:
+            return popular
+        with profile.lock:
+            return self.retriever.score_profile(profile.vector, top_n, exclude)
+
+    def recommend_many(self, users, top_n=10, exclude_keys=EXCLUDE_KEYS):
+        """recommend() for a list of (user_id, history) pairs, scoring their profiles together."""
+        results = [None] * len(users)
+        slots, vectors, excludes = [], [], []
+        for slot, (user_id, history) in enumerate(users):
+            profile = self.get(user_id, history)
+            if not profile.weights:
+                continue
+            exclude = self._exclusion(history, exclude_keys)
+            results[slot] = self._popular(profile, exclude, top_n)
+            if results[slot] is None:
+                with profile.lock:
+                    vectors.append(profile.vector.copy())
+                slots.append(slot)
+                excludes.append(exclude)
+        for slot, ranked in zip(slots, self.retriever.score_profiles(vectors, top_n, excludes)):
+            results[slot] = ranked
+        return results
@@ -0,0 +1,221 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from utils.cache import CACHE_DIR, SQLiteKVStore
+from utils.data_loader import get_catalog
+from utils.metrics import registry
+from utils.tmdb import poster_urls
+from utils.user_store import user_store
+
+# ----------------------------
+# Materialized per-user recommendations
+# ----------------------------
+# Each user's top REC_TABLE_SIZE movies (ids, scores and resolved poster URLs)
+# are stored in a SQLite table shared by every worker. /recommend/user serves
+# the stored list with one keyed read. A miss computes only the requested top_n
+# on demand and queues the full row to be stored for the next request.
+#
+# A like/dislike/rate/watch/watchlist deletes the user's row and schedules a
+# refresh REC_DEBOUNCE seconds later. Each further action pushes that back, so a
+# burst of clicks costs one recompute. A refresh that was already running when
+# the row was deleted does not store what it computed. Due refreshes run on REC_WORKERS threads. A row
+# computed against an older catalog snapshot is still served, and a refresh is
+# queued for it at once.
+#
+# A full precompute scores REC_BATCH_SIZE users per sparse x dense product and
+# resolves each batch's posters in one call.
+#
+#   python -m utils.user_recommendations      # precompute every known user
+
+REC_TABLE_SIZE = int(os.getenv("REC_TABLE_SIZE", 50))
+REC_DEBOUNCE = float(os.getenv("REC_DEBOUNCE", 2))
+REC_WORKERS = int(os.getenv("REC_WORKERS", 2))
+REC_TTL = float(os.getenv("REC_TTL", 24 * 3600))
+REC_BATCH_SIZE = int(os.getenv("REC_BATCH_SIZE", 64))
+REC_CACHE_PATH = os.getenv("REC_CACHE_PATH", os.path.join(CACHE_DIR, "user_recommendations.sqlite"))
+
+REFRESH_ACTIONS = {"like", "dislike", "rate", "watch", "watchlist"}
+
+
+class UserRecommendations:
+    def __init__(self, size=REC_TABLE_SIZE, debounce=REC_DEBOUNCE, workers=REC_WORKERS,
+                 ttl=REC_TTL, cache_path=REC_CACHE_PATH):
+        self.size = size
+        self.debounce = debounce
+        self.workers = workers
+        self.ttl = ttl
+        self.store = SQLiteKVStore(cache_path, "user_recommendations")
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "refreshes": 0, "errors": 0}
+        self._pending = {}      # user_id -> monotonic time the refresh is due
+        self._versions = {}     # user_id -> number of invalidations, so late refreshes can tell
+        self._running = set()
+        self._cond = threading.Condition()
+        self._executor = None
+        self._pid = None
+
+    # -- computing -----------------------------------------------------
+    def compute(self, user_id, cat, top_n=None):
+        """Fresh row for a user ({"ids", "scores", "posters", "snapshot"}), or None without history."""
+        return self.compute_many([user_id], cat, top_n)[0]
+
+    def compute_many(self, user_ids, cat, top_n=None):
+        """compute() for many users: profiles scored together, posters resolved in one batch."""
+        histories = user_store.get_many(user_ids)
+        users = [(user_id, histories[user_id]) for user_id in user_ids]
+        ranked = cat.user_profiles.recommend_many(users, top_n or self.size)
+        ids = [None if r is None else cat.payloads.ids[r[0]].tolist() for r in ranked]
+        unique = list(dict.fromkeys(movie_id for row in ids if row for movie_id in row))
+        posters = dict(zip(unique, poster_urls(unique)))
+        return [
+            None if r is None else {"ids": row, "scores": r[1].tolist(), "posters": [posters[m] for m in row],
+                                    "snapshot": cat.store.path}
+            for row, r in zip(ids, ranked)
+        ]
+
+    def refresh(self, user_id):
+        return self.refresh_many([user_id])[0]
+
+    def refresh_many(self, user_ids):
+        with self._cond:
+            versions = [self._versions.get(u, 0) for u in user_ids]
+        rows = self.compute_many(user_ids, get_catalog())
+        with self._cond:
+            # skip users invalidated meanwhile: their rows may predate the action
+            current = [(u, row) for u, row, version in zip(user_ids, rows, versions)
+                       if self._versions.get(u, 0) == version]
+            self.store.set_many([(u, row, self.ttl) for u, row in current if row is not None])
+            for user_id, row in current:
+                if row is None:
+                    self.store.delete(user_id)
+            self.stats["refreshes"] += len(user_ids)
+        return rows
+
+    # -- serving -------------------------------------------------------
+    def get(self, user_id, cat, top_n=10):
+        """(positions, scores, posters) for the user's best top_n movies, or None without history."""
+        if top_n > self.size:
+            row = self.compute(user_id, cat, top_n)
+        else:
+            row = self.store.get(user_id)
+            if row is None:
+                # answer with just top_n now; the full row is stored in the background
+                self._count("misses")
+                self.schedule(user_id, delay=0)
+                row = self.compute(user_id, cat, top_n)
+            elif row["snapshot"] != cat.store.path:
+                self._count("stale")
+                self.schedule(user_id, delay=0)
+            else:
+                self._count("hits")
+        if row is None:
+            return None
+
+        positions, scores, posters = [], [], []
+        for movie_id, score, poster in zip(row["ids"], row["scores"], row["posters"]):
+            if len(positions) >= top_n:
+                break
+            idx = cat.movie_index.position(movie_id)
+            if idx is not None:
+                positions.append(idx)
+                scores.append(score)
+                posters.append(poster)
+        return positions, scores, posters
+
+    def invalidate(self, user_id, action):
+        """Drop the user's stored row after an action and schedule a debounced refresh."""
+        if action not in REFRESH_ACTIONS:
+            return
+        with self._cond:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self.store.delete(user_id)
+        self.schedule(user_id)
+
+    def _count(self, stat, n=1):
+        # updated from request threads, the scheduler pool and refresh_all's pool
+        with self._cond:
+            self.stats[stat] += n
+
+    # -- scheduling ----------------------------------------------------
+    def _ensure_scheduler(self):
+        # the thread and pool do not survive a fork; each worker starts its own
+        if self._pid != os.getpid():
+            with self._cond:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._pending, self._running = {}, set()
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="user-recs")
+                    threading.Thread(target=self._schedule_loop, name="user-recs-scheduler", daemon=True).start()
+
+    def schedule(self, user_id, delay=None):
+        """Refresh `user_id` after `delay` seconds (default REC_DEBOUNCE) without further calls."""
+        self._ensure_scheduler()
+        with self._cond:
+            self._pending[user_id] = time.monotonic() + (self.debounce if delay is None else delay)
+            self._cond.notify()
+
+    def _schedule_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    due = [u for u, at in self._pending.items() if at <= now and u not in self._running]
+                    if due:
+                        break
+                    waiting = [at for u, at in self._pending.items() if u not in self._running]
+                    self._cond.wait(max(min(waiting) - now, 0.01) if waiting else None)
+                for user_id in due:
+                    del self._pending[user_id]
+                    self._running.add(user_id)
+            for user_id in due:
+                self._executor.submit(self._run_refresh, user_id)
+
+    def _run_refresh(self, user_id):
+        try:
+            self.refresh(user_id)
+        except Exception as e:
+            self._count("errors")
+            print(f"Failed to refresh recommendations for {user_id}: {e}")
+        finally:
+            with self._cond:
+                self._running.discard(user_id)
+                self._cond.notify()
+
+    def _run_refresh_many(self, user_ids):
+        try:
+            self.refresh_many(user_ids)
+        except Exception as e:
+            self._count("errors", len(user_ids))
+            print(f"Failed to refresh recommendations for {len(user_ids)} users: {e}")
+
+    def refresh_all(self, user_ids, batch_size=REC_BATCH_SIZE):
+        """Recompute every user in `user_ids`, batch_size users per scoring pass, on the worker pool."""
+        user_ids = list(user_ids)
+        batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="user-recs") as pool:
+            wait([pool.submit(self._run_refresh_many, batch) for batch in batches])
+        return len(user_ids)
+
+
+user_recommendations = UserRecommendations()
+
+registry.callback(
+    "user_recommendation_lookups_total", "Stored per-user recommendation lookups by outcome", "counter", ("result",),
+    lambda: {("hit",): user_recommendations.stats["hits"], ("stale",): user_recommendations.stats["stale"],
+             ("miss",): user_recommendations.stats["misses"]},
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute stored recommendations for every known user")
+    parser.parse_args()
+    start = time.perf_counter()
+    count = user_recommendations.refresh_all(user_store.user_ids())
+    print(f"Refreshed {count} users in {time.perf_counter() - start:.1f}s "
+          f"({user_recommendations.stats['errors']} errors)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+import os
+import time
+import atexit
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from utils.cache import MISSING, TTLCache
+
+# ----------------------------
+# User history storage
+# ----------------------------
+# history = {"watched": set(), "ratings": {movie_id: rating}, "likes": set(),
+#            "dislikes": set(), "watchlist": set()}
+#
+# Stores hand out read-only snapshots; every write replaces the cached snapshot
+# (copy-on-write), so readers never see a set change under them.
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+USER_STORE = os.getenv("USER_STORE", "sqlite")       # "sqlite" or "memory"
+USER_DB_PATH = os.getenv("USER_DB_PATH", os.path.join(BASE_DIR, "app/data/users.sqlite"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 2))    # bounds staleness across workers
+FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", 0.05))
+FLUSH_SIZE = 256
+
+def empty_history():
+    return {"watched": set(), "ratings": {}, "likes": set(), "dislikes": set(), "watchlist": set()}
+
+
+def apply_action(history, action, movie_id, rating=None):
+    """Return a new history with one user action applied."""
+    history = {**history}
+    def edit(key, add=None, discard=None):
+        history[key] = set(history[key])
+        if add is not None:
+            history[key].add(add)
+        if discard is not None:
+            history[key].discard(discard)
+
+    if action == "like":
+        edit("likes", add=movie_id)
+        edit("dislikes", discard=movie_id)
+    elif action == "dislike":
+        edit("dislikes", add=movie_id)
+        edit("likes", discard=movie_id)
+    elif action == "watch":
+        edit("watched", add=movie_id)
+    elif action == "watchlist":
+        edit("watchlist", add=movie_id)
+    elif action == "rate":
+        history["ratings"] = {**history["ratings"], movie_id: rating}
+        edit("watched", add=movie_id)
+    else:
+        raise ValueError(f"Unknown action {action!r}")
+    return history
+
+
+class UserHistoryStore(ABC):
+    """Interface shared by the in-memory and SQLite stores."""
+
+    def get(self, user_id):
+        return self.get_many([user_id])[user_id]
+
+    @abstractmethod
+    def get_many(self, user_ids):
+        ...
+
+    @abstractmethod
+    def record(self, user_id, action, movie_id, rating=None):
+        ...
+
+    @abstractmethod
+    def user_ids(self):
+        ...
+
+    def flush(self):
+        pass
+
+
+class InMemoryUserStore(UserHistoryStore):
+    """Single-process store, handy for tests and one-worker development."""
+
+    def __init__(self):
+        self._histories = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, user_ids):
+        return {u: self._histories.get(u) or empty_history() for u in user_ids}
+
+    def record(self, user_id, action, movie_id, rating=None):
+        with self._lock:
+            self._histories[user_id] = apply_action(
+                self._histories.get(user_id) or empty_history(), action, movie_id, rating
+            )
+
+    def user_ids(self):
+        return list(self._histories)
+
+
+class SQLiteUserStore(UserHistoryStore):
+    """WAL-mode SQLite store shared by every worker on the box.
+
+    Writes are buffered and flushed in one transaction every FLUSH_INTERVAL
+    seconds (or FLUSH_SIZE actions). Reads go through a per-worker LRU whose
+    short TTL bounds how stale another worker's writes can look.
+    """
+
+    def __init__(self, path=USER_DB_PATH, cache_size=USER_CACHE_SIZE, cache_ttl=USER_CACHE_TTL,
+                 flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.cache = TTLCache(cache_size)
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._flusher_pid = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS user_movies (
+                user_id TEXT NOT NULL, movie_id INTEGER NOT NULL, kind TEXT NOT NULL,
+                PRIMARY KEY (user_id, kind, movie_id)
+            );
+            CREATE TABLE IF NOT EXISTS user_ratings (
+                user_id TEXT NOT NULL, movie_id INTEGER NOT NULL, rating REAL NOT NULL,
+                PRIMARY KEY (user_id, movie_id)
+            );
+        """)
+        atexit.register(self.flush)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    # -- writes --------------------------------------------------------
+    def _ensure_flusher(self):
+        if self._flusher_pid != os.getpid():
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_loop, name="user-store-flush", daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._buffer:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Failed to flush user history: {e}")
+
+    def record(self, user_id, action, movie_id, rating=None):
+        apply_action(empty_history(), action, movie_id, rating)  # validate before buffering
+        self._ensure_flusher()
+        with self._lock:
+            self._buffer.append((user_id, action, movie_id, rating))
+            cached = self.cache.get(user_id)
+            if cached is not MISSING:
+                self.cache.set(user_id, apply_action(cached, action, movie_id, rating), self.cache_ttl)
+            full = len(self._buffer) >= FLUSH_SIZE
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        with self._lock:
+            ops, self._buffer = self._buffer, []
+        if not ops:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for user_id, action, movie_id, rating in ops:
+                self._write(conn, user_id, action, movie_id, rating)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            with self._lock:
+                self._buffer = ops + self._buffer
+            raise
+
+    @staticmethod
+    def _write(conn, user_id, action, movie_id, rating):
+        add = "INSERT OR IGNORE INTO user_movies VALUES (?, ?, ?)"
+        remove = "DELETE FROM user_movies WHERE user_id = ? AND movie_id = ? AND kind = ?"
+        if action == "like":
+            conn.execute(add, (user_id, movie_id, "likes"))
+            conn.execute(remove, (user_id, movie_id, "dislikes"))
+        elif action == "dislike":
+            conn.execute(add, (user_id, movie_id, "dislikes"))
+            conn.execute(remove, (user_id, movie_id, "likes"))
+        elif action == "watch":
+            conn.execute(add, (user_id, movie_id, "watched"))
+        elif action == "watchlist":
+            conn.execute(add, (user_id, movie_id, "watchlist"))
+        elif action == "rate":
+            conn.execute("INSERT OR REPLACE INTO user_ratings VALUES (?, ?, ?)", (user_id, movie_id, rating))
+            conn.execute(add, (user_id, movie_id, "watched"))
+
+    # -- reads ---------------------------------------------------------
+    def get_many(self, user_ids):
+        """Bulk load; cache misses are read from SQLite in one query per table."""
+        result, missing = {}, []
+        for user_id in dict.fromkeys(user_ids):
+            cached = self.cache.get(user_id)
+            if cached is MISSING:
+                missing.append(user_id)
+            else:
+                result[user_id] = cached
+        if not missing:
+            return result
+
+        # hold the flush lock so no buffered action is "in flight" between buffer and table
+        with self._flush_lock:
+            self._flush_locked()
+            loaded = self._load(missing)
+        with self._lock:
+            # actions recorded while we were reading are not in SQLite yet
+            for user_id, action, movie_id, rating in self._buffer:
+                if user_id in loaded:
+                    loaded[user_id] = apply_action(loaded[user_id], action, movie_id, rating)
+            for user_id, history in loaded.items():
+                self.cache.set(user_id, history, self.cache_ttl)
+        result.update(loaded)
+        return result
+
+    def _load(self, user_ids):
+        loaded = {u: empty_history() for u in user_ids}
+        conn = self._conn()
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            for user_id, movie_id, kind in conn.execute(
+                f"SELECT user_id, movie_id, kind FROM user_movies WHERE user_id IN ({marks})", chunk
+            ):
+                loaded[user_id][kind].add(movie_id)
+            for user_id, movie_id, rating in conn.execute(
+                f"SELECT user_id, movie_id, rating FROM user_ratings WHERE user_id IN ({marks})", chunk
+            ):
+                loaded[user_id]["ratings"][movie_id] = rating
+        return loaded
+
+    def user_ids(self):
+        self.flush()
+        rows = self._conn().execute(
+            "SELECT user_id FROM user_movies UNION SELECT user_id FROM user_ratings"
+        )
+        return [r[0] for r in rows]
+
+
+def create_user_store(kind=USER_STORE):
+    if kind == "memory":
+        return InMemoryUserStore()
+    if kind == "sqlite":
+        return SQLiteUserStore()
+    raise ValueError(f"Unknown USER_STORE {kind!r}")
+
+
+user_store = create_user_store()